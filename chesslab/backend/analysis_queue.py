@@ -0,0 +1,412 @@
+"""Shared RQ queue and in-flight registry for server-side analysis jobs.
+
+Jobs get deterministic IDs derived from (normalized FEN, depth, multipv), so an
+identical request made while a job is queued or running attaches to it
+instead of enqueuing duplicate engine work.  Whether a job is still active is
+read from its RQ status, so jobs that wait long in the queue keep coalescing
+and a job whose worker died stops blocking new requests once RQ marks it
+failed.  Each attached node is recorded in a Redis set that the worker drains
+when the job finishes.
+
+Work is split into priority classes, each with its own RQ queue:
+``interactive`` (the node a user is looking at), ``prefetch`` (nodes likely
+to be looked at next) and ``bulk`` (whole-line batches).  Workers drain them
+by weight, every client has a cap on active jobs per class, and an
+interactive request promotes a matching job already waiting in a lower
+class.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+
+from flask import Flask, current_app, request
+from redis import ConnectionPool, Redis
+from redis.exceptions import WatchError
+from rq import Queue, Worker
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from rq.worker import WorkerStatus
+
+from .metrics import Gauge, registry
+from .positions import normalize_fen
+
+QUEUE_NAME = "analysis"
+PRIORITIES = ("interactive", "prefetch", "bulk")
+# Interactive work keeps the original queue name so jobs queued before priorities existed still run.
+QUEUE_NAMES = {"interactive": QUEUE_NAME, "prefetch": f"{QUEUE_NAME}-prefetch", "bulk": f"{QUEUE_NAME}-bulk"}
+PRIORITY_WEIGHTS = {"interactive": 6, "prefetch": 3, "bulk": 1}
+CLIENT_QUOTAS = {
+    priority: int(os.getenv(f"ANALYSIS_QUOTA_{priority.upper()}", default))
+    for priority, default in (("interactive", 8), ("prefetch", 32), ("bulk", 2))
+}
+IMPORT_QUEUE_NAME = "imports"
+MAINTENANCE_QUEUE_NAME = "maintenance"
+COMPACTION_JOB_ID = "maintenance-compact-evals"
+WAITERS_PREFIX = "chesslab:analysis:waiters:"
+CANCEL_PREFIX = "chesslab:analysis:cancel:"
+CLIENT_PREFIX = "chesslab:analysis:client:"
+BATCH_PREFIX = "chesslab:analysis:batch:"
+BATCH_JOB_TIMEOUT = 6 * 3600
+ACTIVE_STATUSES = ("queued", "started", "deferred", "scheduled")
+
+
+class AnalysisQuotaExceeded(RuntimeError):
+    """Raised when a client already has its maximum of active jobs in a class."""
+
+
+def init_app(app: Flask) -> None:
+    """Create the app-lifetime connection pool and queues."""
+    pool = ConnectionPool.from_url(app.config["REDIS_URL"])
+    connection = Redis(connection_pool=pool)
+    app.extensions["analysis_queues"] = {
+        priority: Queue(name, connection=connection) for priority, name in QUEUE_NAMES.items()
+    }
+    app.extensions["import_queue"] = Queue(IMPORT_QUEUE_NAME, connection=connection)
+    app.extensions["maintenance_queue"] = Queue(MAINTENANCE_QUEUE_NAME, connection=connection)
+
+
+def get_queue(priority: str = "interactive") -> Queue:
+    if priority not in QUEUE_NAMES:
+        raise ValueError(f"Unknown priority: {priority}")
+    return current_app.extensions["analysis_queues"][priority]
+
+
+def get_import_queue() -> Queue:
+    return current_app.extensions["import_queue"]
+
+
+def get_maintenance_queue() -> Queue:
+    return current_app.extensions["maintenance_queue"]
+
+
+def _queue_depths() -> list[tuple[tuple, float]]:
+    queues = [
+        *current_app.extensions["analysis_queues"].values(),
+        current_app.extensions["import_queue"],
+        current_app.extensions["maintenance_queue"],
+    ]
+    return [((queue.name,), queue.count) for queue in queues]
+
+
+Gauge(registry, "chesslab_queue_depth", "Jobs waiting in each RQ queue.", ("queue",), _queue_depths)
+
+
+def request_client() -> str:
+    """Quota key for the current request: the ``X-Client-Id`` header, else the remote address."""
+    return request.headers.get("X-Client-Id") or request.remote_addr or "anonymous"
+
+
+def analysis_job_id(fen: str, depth: int, multipv: int) -> str:
+    digest = hashlib.sha1(f"{normalize_fen(fen)}|{depth}|{multipv}".encode()).hexdigest()
+    return f"analysis-{digest}"
+
+
+def enqueue_analysis(
+    queue: Queue,
+    node_id: int,
+    fen: str,
+    depth: int,
+    multipv: int,
+    *,
+    job_timeout: int = 600,
+    client: str | None = None,
+) -> tuple[str, bool]:
+    """Enqueue or attach to an analysis job; returns ``(job_id, coalesced)``.
+
+    ``queue`` selects the priority class.  Raises :class:`AnalysisQuotaExceeded`
+    when ``client`` already has its quota of active jobs in that class;
+    attaching to another client's job counts against the quota too, since
+    it can promote that job.
+    """
+    job_id = analysis_job_id(fen, depth, multipv)
+    redis = queue.connection
+    priority = queue_priority(queue.name)
+    with redis.pipeline() as pipe:
+        pipe.sadd(WAITERS_PREFIX + job_id, node_id)
+        pipe.expire(WAITERS_PREFIX + job_id, job_timeout)
+        attached, _ = pipe.execute()
+
+    if client is not None:
+        try:
+            _reserve_slot(redis, client, priority, job_id)
+        except AnalysisQuotaExceeded:
+            if attached:
+                redis.srem(WAITERS_PREFIX + job_id, node_id)
+            raise
+
+    enqueued = _enqueue_unless_active(
+        redis,
+        job_id,
+        lambda pipe: queue.enqueue(
+            f"{__package__}.worker.perform_analysis",
+            node_id=node_id,
+            fen=fen,
+            depth=depth,
+            multipv=multipv,
+            job_id=job_id,
+            job_timeout=job_timeout,
+            on_failure=_release_failed,
+            on_stopped=_release_failed,
+            pipeline=pipe,
+        ),
+    )
+    if not enqueued:
+        _promote(redis, job_id, queue)
+        return job_id, True
+    return job_id, False
+
+
+def _enqueue_unless_active(redis: Redis, job_id: str, enqueue) -> bool:
+    """Call ``enqueue(pipeline)`` unless job ``job_id`` is active; returns whether it enqueued.
+
+    The status check and the enqueue run as one WATCH/MULTI transaction on the
+    job's hash, so two requests racing past a finished job enqueue it once.
+    """
+    with redis.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(Job.key_for(job_id))
+                job = _fetch_job(redis, job_id)
+                if job is not None and job.get_status(refresh=False) in ACTIVE_STATUSES:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                enqueue(pipe)
+                pipe.execute()
+                return True
+            except WatchError:
+                continue
+
+
+def queue_priority(queue_name: str) -> str:
+    for priority, name in QUEUE_NAMES.items():
+        if name == queue_name:
+            return priority
+    raise ValueError(f"Not an analysis queue: {queue_name}")
+
+
+def _fetch_job(redis: Redis, job_id: str) -> Job | None:
+    """Fetch a job from whichever priority queue it was enqueued on."""
+    try:
+        return Job.fetch(job_id, connection=redis)
+    except NoSuchJobError:
+        return None
+
+
+def _promote(redis: Redis, job_id: str, queue: Queue) -> None:
+    """Move a still-waiting job into ``queue`` if that is a higher priority class."""
+    job = _fetch_job(redis, job_id)
+    if job is None or job.origin == queue.name or job.get_status(refresh=False) != "queued":
+        return
+    try:
+        current = PRIORITIES.index(queue_priority(job.origin))
+    except ValueError:
+        return
+    if PRIORITIES.index(queue_priority(queue.name)) >= current:
+        return
+    # LREM returning 0 means a worker already took the job, so there is nothing to move.
+    if Queue(job.origin, connection=redis).remove(job):
+        queue.enqueue_job(job)
+
+
+def _reserve_slot(redis: Redis, client: str, priority: str, job_id: str) -> None:
+    """Count ``job_id`` against ``client``'s quota for ``priority``.
+
+    The check and the reservation run as one WATCH/MULTI transaction, retried
+    if another request changes the client's set in between, so concurrent
+    requests cannot overshoot the quota.  Finished jobs are pruned lazily
+    when the quota looks full, so the worker needs no bookkeeping of its own.
+    """
+    key = f"{CLIENT_PREFIX}{client}:{priority}"
+    quota = CLIENT_QUOTAS[priority]
+    with redis.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                job_ids = [member.decode() for member in pipe.smembers(key)]
+                if job_id in job_ids:
+                    pipe.unwatch()
+                    return
+                done: list[str] = []
+                if len(job_ids) >= quota:
+                    jobs = Job.fetch_many(job_ids, connection=redis)
+                    done = [
+                        member
+                        for member, job in zip(job_ids, jobs)
+                        if job is None or job.get_status(refresh=False) not in ACTIVE_STATUSES
+                    ]
+                    if len(job_ids) - len(done) >= quota:
+                        pipe.unwatch()
+                        raise AnalysisQuotaExceeded(f"{client} already has {quota} active {priority} jobs")
+                pipe.multi()
+                if done:
+                    pipe.srem(key, *done)
+                pipe.sadd(key, job_id)
+                pipe.expire(key, BATCH_JOB_TIMEOUT)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+def interactive_waiting(redis: Redis) -> bool:
+    """Whether queued interactive jobs outnumber the idle workers about to take them.
+
+    Only then should a running bulk batch yield its worker; preempting while
+    another worker is free would throw away the current search for nothing.
+    """
+    queue = Queue(QUEUE_NAMES["interactive"], connection=redis)
+    waiting = queue.count
+    if not waiting:
+        return False
+    idle = sum(1 for worker in Worker.all(queue=queue) if worker.get_state() == WorkerStatus.IDLE)
+    return waiting > idle
+
+
+def cancel_analysis(queue: Queue, node_id: int, fen: str, depth: int, multipv: int) -> bool:
+    """Detach ``node_id`` from its job and cancel the job if nobody else is waiting.
+
+    Queued jobs are cancelled outright; running jobs get a cancel flag that the
+    worker turns into a UCI ``stop``.
+    """
+    job_id = analysis_job_id(fen, depth, multipv)
+    redis = queue.connection
+    with redis.pipeline() as pipe:
+        pipe.srem(WAITERS_PREFIX + job_id, node_id)
+        pipe.scard(WAITERS_PREFIX + job_id)
+        _, remaining = pipe.execute()
+    if remaining:
+        return False
+    job = _fetch_job(redis, job_id)
+    if job is None:
+        return False
+    status = job.get_status(refresh=False)
+    if status == "started":
+        redis.set(CANCEL_PREFIX + job_id, 1, ex=600)
+    elif status in ACTIVE_STATUSES:
+        job.cancel()
+        release(redis, job_id)
+    else:
+        return False
+    return True
+
+
+def is_cancelled(redis: Redis, job_id: str) -> bool:
+    return bool(redis.exists(CANCEL_PREFIX + job_id))
+
+
+def waiters(redis: Redis, job_id: str) -> set[int]:
+    return {int(member) for member in redis.smembers(WAITERS_PREFIX + job_id)}
+
+
+def release(redis: Redis, job_id: str) -> set[int]:
+    """Clear the job's waiters and cancel flag, returning every node that attached to it."""
+    with redis.pipeline() as pipe:
+        pipe.smembers(WAITERS_PREFIX + job_id)
+        pipe.delete(WAITERS_PREFIX + job_id, CANCEL_PREFIX + job_id)
+        members, _ = pipe.execute()
+    return {int(member) for member in members}
+
+
+def _release_failed(job, connection, *exc_info) -> None:  # pragma: no cover - RQ failure/stop callback
+    release(connection, job.id)
+
+
+def batch_id_for(*, line_id: int | None, opening_id: int | None, depth: int, multipv: int) -> str:
+    scope = f"line-{line_id}" if line_id is not None else f"opening-{opening_id}"
+    return f"batch-{scope}-{depth}-{multipv}"
+
+
+def enqueue_batch_analysis(
+    queue: Queue,
+    *,
+    line_id: int | None,
+    opening_id: int | None,
+    depth: int,
+    multipv: int,
+    client: str | None = None,
+) -> tuple[str, bool]:
+    """Enqueue a whole-line or whole-opening batch unless the same batch is already pending.
+
+    A preempted batch continues under a new job ID; ``BATCH_PREFIX`` maps the
+    stable batch ID to whichever job currently carries it.
+    """
+    batch_id = batch_id_for(line_id=line_id, opening_id=opening_id, depth=depth, multipv=multipv)
+    redis = queue.connection
+    current = redis.get(BATCH_PREFIX + batch_id)
+    job = _fetch_job(redis, current.decode() if current else batch_id)
+    if job is not None and job.get_status(refresh=False) in ACTIVE_STATUSES:
+        return batch_id, True
+    if client is not None:
+        _reserve_slot(redis, client, queue_priority(queue.name), batch_id)
+    redis.set(BATCH_PREFIX + batch_id, batch_id, ex=BATCH_JOB_TIMEOUT)
+    queue.enqueue(
+        f"{__package__}.worker.perform_batch_analysis",
+        line_id=line_id,
+        opening_id=opening_id,
+        depth=depth,
+        multipv=multipv,
+        batch_id=batch_id,
+        job_id=batch_id,
+        job_timeout=BATCH_JOB_TIMEOUT,
+        meta={"client": client},
+    )
+    return batch_id, False
+
+
+def requeue_batch(job: Job) -> str:
+    """Continue a preempted batch at the front of its queue; returns the new job ID.
+
+    Results are committed per node and analysed nodes are skipped, so the
+    continuation resumes where the preempted job stopped.
+    """
+    redis = job.connection
+    kwargs = dict(job.kwargs)
+    batch_id = kwargs["batch_id"]
+    resumes = job.meta.get("resumes", 0) + 1
+    new_id = f"{batch_id}-r{resumes}"
+    client = job.meta.get("client")
+    queue = Queue(job.origin, connection=redis)
+    with redis.pipeline() as pipe:
+        if client is not None:
+            pipe.sadd(f"{CLIENT_PREFIX}{client}:{queue_priority(queue.name)}", new_id)
+        pipe.set(BATCH_PREFIX + batch_id, new_id, ex=BATCH_JOB_TIMEOUT)
+        pipe.execute()
+    queue.enqueue(
+        f"{__package__}.worker.perform_batch_analysis",
+        **kwargs,
+        job_id=new_id,
+        job_timeout=BATCH_JOB_TIMEOUT,
+        at_front=True,
+        meta={"client": client, "resumes": resumes},
+    )
+    return new_id
+
+
+def enqueue_import(queue: Queue, *, path: str, line_id: int) -> str:
+    job = queue.enqueue(
+        f"{__package__}.worker.perform_pgn_import",
+        path=path,
+        line_id=line_id,
+        job_timeout=BATCH_JOB_TIMEOUT,
+    )
+    return job.id
+
+
+def enqueue_compaction(
+    queue: Queue, *, keep_depths: int | None = None, vacuum: bool = True, summaries: bool = False
+) -> tuple[str, bool]:
+    """Enqueue eval compaction unless a run is already pending; returns ``(job_id, coalesced)``."""
+    job = _fetch_job(queue.connection, COMPACTION_JOB_ID)
+    if job is not None and job.get_status(refresh=False) in ACTIVE_STATUSES:
+        return job.id, True
+    queue.enqueue(
+        f"{__package__}.worker.perform_eval_compaction",
+        keep_depths=keep_depths,
+        vacuum=vacuum,
+        summaries=summaries,
+        job_id=COMPACTION_JOB_ID,
+        job_timeout=BATCH_JOB_TIMEOUT,
+    )
+    return COMPACTION_JOB_ID, False
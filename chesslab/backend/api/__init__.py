@@ -4,4 +4,4 @@ from flask import Blueprint
 api_bp = Blueprint("api", __name__)
 
 # Explicitly import modules to ensure routes are registered when blueprint is used.
-from . import openings, lines, nodes, evals, import_export  # noqa: E402,F401
+from . import openings, lines, nodes, evals, analysis, explorer, import_export, search, sync, maintenance  # noqa: E402,F401
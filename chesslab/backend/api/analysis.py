@@ -0,0 +1,64 @@
+"""Batch analysis and cancellation endpoints."""
+from __future__ import annotations
+
+from flask import jsonify, request, abort, current_app
+
+from ..analysis_queue import (
+    AnalysisQuotaExceeded,
+    cancel_analysis,
+    enqueue_batch_analysis,
+    get_queue,
+    request_client,
+)
+from ..db import db_session
+from ..models import Line, Node, Opening
+from . import api_bp
+
+
+@api_bp.route("/analysis/batch", methods=["POST"])
+def start_batch_analysis():
+    data = request.get_json() or {}
+    line_id = data.get("line_id")
+    opening_id = data.get("opening_id")
+    depth = min(int(data.get("depth", 12)), current_app.config["ENGINE_MAX_DEPTH"])
+    multipv = int(data.get("multipv", current_app.config["ENGINE_MULTIPV"]))
+
+    if line_id is not None:
+        if not db_session.get(Line, line_id):
+            abort(404, description="Line not found")
+        total = db_session.query(Node).filter(Node.line_id == line_id).count()
+        opening_id = None
+    elif opening_id is not None:
+        if not db_session.get(Opening, opening_id):
+            abort(404, description="Opening not found")
+        total = db_session.query(Node).join(Line).filter(Line.opening_id == opening_id).count()
+    else:
+        abort(400, description="line_id or opening_id required")
+
+    try:
+        job_id, coalesced = enqueue_batch_analysis(
+            get_queue("bulk"),
+            line_id=line_id,
+            opening_id=opening_id,
+            depth=depth,
+            multipv=multipv,
+            client=request_client(),
+        )
+    except AnalysisQuotaExceeded as exc:
+        abort(429, description=str(exc))
+    return jsonify({"pending": True, "job_id": job_id, "coalesced": coalesced, "total": total}), 202
+
+
+@api_bp.route("/analysis/cancel", methods=["POST"])
+def cancel_node_analysis():
+    data = request.get_json() or {}
+    node_id = data.get("node_id")
+    if not node_id:
+        abort(400, description="node_id required")
+    node = db_session.get(Node, node_id)
+    if not node:
+        abort(404, description="Node not found")
+    depth = int(data.get("depth", 12))
+    multipv = int(data.get("multipv", 3))
+    cancelled = cancel_analysis(get_queue(), node.id, node.fen, depth, multipv)
+    return jsonify({"cancelled": cancelled})
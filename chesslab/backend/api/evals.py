@@ -1,16 +1,16 @@
 """Evaluation endpoints."""
 from __future__ import annotations
 
-from datetime import datetime
-
-from flask import jsonify, request, current_app
-from rq import Queue
-from redis import Redis
+from flask import jsonify, request
 
+from ..analysis_queue import PRIORITIES, AnalysisQuotaExceeded, enqueue_analysis, get_queue, request_client
 from ..db import db_session
-from ..models import Eval, Node
+from ..eval_cache import eval_cache, serialize_eval
+from ..eval_store import eval_row, upsert_evals
+from ..models import Node
+from ..positions import line_ids_at_position, position_for_node
+from ..response_cache import cached_json, line_scope, position_scope, response_cache
 from ..socketio_server import emit_eval_update
-from ..worker import perform_analysis
 from . import api_bp
 
 
@@ -23,31 +23,39 @@ def get_eval():
     depth = int(request.args.get("depth", 12))
     multipv = int(request.args.get("multipv", 3))
     mode = request.args.get("mode", "client")
+    priority = request.args.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+
+    node = db_session.get(Node, node_id)
+    if not node:
+        return jsonify({"pending": False, "error": "Node not found"}), 404
+    position = position_for_node(db_session, node)
+    db_session.commit()
+
+    def build():
+        # Runs after cached_json has read the scope versions, so the body is at
+        # least as new as its ETag.
+        rows = eval_cache.lookup(db_session, position.id, depth, multipv, shared_only=True)
+        return {"pending": False, "evals": [_serialize_eval(ev, node_id) for ev in rows]}
 
-    existing = (
-        db_session.query(Eval)
-        .filter(
-            Eval.node_id == node_id,
-            Eval.depth == depth,
-            Eval.multipv <= multipv,
-        )
-        .order_by(Eval.multipv)
-        .all()
-    )
     if mode == "client":
-        return jsonify({"pending": False, "evals": [_serialize_eval(ev) for ev in existing]})
+        return cached_json([position_scope(position.id)], build)
 
+    existing = eval_cache.lookup(db_session, position.id, depth, multipv)
     if mode == "server":
-        node = db_session.get(Node, node_id)
-        if not node:
-            return jsonify({"pending": False, "error": "Node not found"}), 404
-        redis_url = current_app.config.get("REDIS_URL", "redis://localhost:6379/0")
-        redis_conn = Redis.from_url(redis_url)
-        queue = Queue("analysis", connection=redis_conn)
-        queue.enqueue(perform_analysis, node_id=node_id, fen=node.fen, depth=depth, multipv=multipv)
-        return jsonify({"pending": True})
+        # Fewer stored lines than requested still need a search, as in perform_analysis.
+        if len(existing) >= multipv:
+            return cached_json([position_scope(position.id)], build)
+        try:
+            job_id, coalesced = enqueue_analysis(
+                get_queue(priority), node_id, node.fen, depth, multipv, client=request_client()
+            )
+        except AnalysisQuotaExceeded as exc:
+            return jsonify({"pending": False, "error": str(exc)}), 429
+        return jsonify({"pending": True, "job_id": job_id, "coalesced": coalesced})
 
-    return jsonify({"pending": False, "evals": [_serialize_eval(ev) for ev in existing]})
+    return jsonify({"pending": False, "evals": [_serialize_eval(ev, node_id) for ev in existing]})
 
 
 @api_bp.route("/eval", methods=["POST"])
@@ -57,51 +65,26 @@ def post_eval():
     if not node_id:
         return jsonify({"error": "node_id required"}), 400
 
+    node = db_session.get(Node, node_id)
+    if not node:
+        return jsonify({"error": "Node not found"}), 404
+    position = position_for_node(db_session, node)
+
     evals_payload = data.get("evals", [])
     mode = data.get("engine_mode", "client")
-    stored = []
-    for payload in evals_payload:
-        depth = payload.get("depth", 0)
-        multipv = payload.get("multipv", 1)
-        eval_entry = (
-            db_session.query(Eval)
-            .filter(
-                Eval.node_id == node_id,
-                Eval.depth == depth,
-                Eval.multipv == multipv,
-                Eval.engine_mode == mode,
-            )
-            .one_or_none()
-        )
-        if not eval_entry:
-            eval_entry = Eval(
-                node_id=node_id,
-                depth=depth,
-                multipv=multipv,
-                engine_mode=mode,
-            )
-            db_session.add(eval_entry)
-        eval_entry.pv_uci = payload.get("pv_uci")
-        eval_entry.score_cp = payload.get("score_cp")
-        eval_entry.bestmove_uci = payload.get("bestmove_uci")
-        eval_entry.created_at = datetime.utcnow()
-        stored.append(eval_entry)
+    rows = [eval_row(position.id, payload.get("depth", 0), mode, payload) for payload in evals_payload]
+    stored = upsert_evals(db_session, rows)
     db_session.commit()
+    eval_cache.invalidate(position.id)
+    response_cache.bump(
+        position_scope(position.id),
+        *(line_scope(line_id) for line_id in line_ids_at_position(db_session, position.id)),
+    )
 
-    serialized = [_serialize_eval(ev) for ev in stored]
-    emit_eval_update(node_id, serialized)
+    serialized = [_serialize_eval(serialize_eval(ev), node_id) for ev in stored]
+    emit_eval_update(node_id, serialized, line_id=node.line_id)
     return jsonify({"saved": True, "evals": serialized})
 
 
-def _serialize_eval(ev: Eval) -> dict:
-    return {
-        "id": ev.id,
-        "node_id": ev.node_id,
-        "depth": ev.depth,
-        "multipv": ev.multipv,
-        "pv_uci": ev.pv_uci,
-        "score_cp": ev.score_cp,
-        "bestmove_uci": ev.bestmove_uci,
-        "engine_mode": ev.engine_mode,
-        "created_at": ev.created_at.isoformat() if ev.created_at else None,
-    }
+def _serialize_eval(row: dict, node_id: int) -> dict:
+    return {**row, "node_id": node_id}
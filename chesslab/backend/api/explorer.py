@@ -0,0 +1,36 @@
+"""Repertoire explorer endpoint."""
+from __future__ import annotations
+
+from flask import jsonify, request, abort
+
+from ..db import db_session
+from ..encoding import zobrist_key
+from ..eval_cache import eval_cache
+from ..explorer import repertoire_index
+from . import api_bp
+
+
+@api_bp.route("/explorer", methods=["GET"])
+def explore_position():
+    fen = request.args.get("fen")
+    if not fen:
+        abort(400, description="fen required")
+    zobrist = zobrist_key(fen)
+    if zobrist is None:
+        abort(400, description="Invalid FEN")
+
+    moves = []
+    for san, stats in repertoire_index.moves(db_session, zobrist).items():
+        best = eval_cache.lookup(db_session, stats.position_id, 0, 1) if stats.position_id else []
+        moves.append(
+            {
+                "san": san,
+                "count": stats.count,
+                "line_ids": sorted(stats.line_ids),
+                "opening_ids": sorted(stats.opening_ids),
+                "position_id": stats.position_id,
+                "best_eval": best[0] if best else None,
+            }
+        )
+    moves.sort(key=lambda move: (-move["count"], move["san"]))
+    return jsonify({"fen": fen, "moves": moves})
@@ -2,82 +2,103 @@
 from __future__ import annotations
 
 import io
-from datetime import datetime
+import os
+import shutil
+import tempfile
 
-from flask import jsonify, request, abort, send_file
-import chess.pgn
+from flask import Response, jsonify, request, abort, current_app
 
+from ..analysis_queue import enqueue_import, get_import_queue
 from ..db import db_session
-from ..models import Line, Node, Opening
+from ..response_cache import line_scope, opening_scope, response_cache
+from ..bitboards import bitboard_index
+from ..explorer import repertoire_index
+from ..models import Line, Opening
+from ..pgn_export import chunked, stream_lines_pgn
+from ..pgn_import import import_games
 from . import api_bp
 
 
 @api_bp.route("/import/pgn", methods=["POST"])
 def import_pgn():
-    data = request.get_json() or {}
-    pgn_text = data.get("pgn")
-    opening_id = data.get("opening_id")
-    if not pgn_text or not opening_id:
+    """Import PGN games into a line, merging by SAN path and keeping variations.
+
+    JSON bodies (``pgn``) are imported inline.  Multipart uploads (``file``) are
+    spooled to ``IMPORT_DIR`` and handed to a background job whose progress is
+    reported over Socket.IO.
+    """
+    upload = request.files.get("file")
+    data = request.form if upload else (request.get_json() or {})
+    opening_id = data.get("opening_id", type=int) if upload else data.get("opening_id")
+    line_id = data.get("line_id", type=int) if upload else data.get("line_id")
+    pgn_text = None if upload else data.get("pgn")
+    if not opening_id or not (upload or pgn_text):
         abort(400, description="pgn and opening_id required")
-    line = Line(opening_id=opening_id, title=data.get("title", "Imported line"), is_main=False)
-    db_session.add(line)
-    db_session.flush()
-
-    game = chess.pgn.read_game(io.StringIO(pgn_text))
-    board = game.board()
-    parent_id = None
-    ply = 0
-    for move in game.mainline_moves():
-        san = board.san(move)
-        board.push(move)
-        ply += 1
-        node = Node(
-            line_id=line.id,
-            parent_id=parent_id,
-            san=san,
-            ply=ply,
-            fen=board.fen(),
-            comment=None,
-        )
-        db_session.add(node)
-        db_session.flush()
-        parent_id = node.id
-
-    db_session.commit()
-    return jsonify({"line_id": line.id, "ply_count": ply})
+    if not db_session.get(Opening, opening_id):
+        abort(404, description="Opening not found")
+
+    if line_id:
+        line = db_session.get(Line, line_id)
+        if not line or line.opening_id != opening_id:
+            abort(404, description="Line not found")
+    else:
+        line = Line(opening_id=opening_id, title=data.get("title", "Imported line"), is_main=False)
+        db_session.add(line)
+        db_session.commit()
+        response_cache.bump(opening_scope(opening_id))
+
+    if upload:
+        import_dir = current_app.config["IMPORT_DIR"]
+        os.makedirs(import_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".pgn", dir=import_dir)
+        with os.fdopen(fd, "wb") as handle:
+            shutil.copyfileobj(upload.stream, handle)
+        job_id = enqueue_import(get_import_queue(), path=path, line_id=line.id)
+        return jsonify({"line_id": line.id, "pending": True, "job_id": job_id}), 202
+
+    stats = import_games(db_session, io.StringIO(pgn_text), line.id)
+    response_cache.bump(line_scope(line.id))
+    repertoire_index.refresh(db_session)
+    bitboard_index.refresh(db_session)
+    return jsonify(
+        {
+            "line_id": line.id,
+            "ply_count": stats.max_ply,
+            "games": stats.games,
+            "nodes_created": stats.nodes_created,
+            "skipped": stats.skipped,
+        }
+    )
 
 
 @api_bp.route("/export/pgn/<int:line_id>", methods=["GET"])
 def export_pgn(line_id: int):
-    line = db_session.get(Line, line_id)
-    if not line:
+    if not db_session.get(Line, line_id):
         abort(404, description="Line not found")
+    return _pgn_response([line_id], f"line_{line_id}.pgn")
+
+
+@api_bp.route("/export/pgn/opening/<int:opening_id>", methods=["GET"])
+def export_opening_pgn(opening_id: int):
+    opening = db_session.get(Opening, opening_id)
+    if not opening:
+        abort(404, description="Opening not found")
+    line_ids = [
+        line_id
+        for (line_id,) in db_session.query(Line.id).filter(Line.opening_id == opening_id).order_by(Line.created_at, Line.id)
+    ]
+    return _pgn_response(line_ids, f"opening_{opening_id}.pgn")
+
+
+@api_bp.route("/export/pgn", methods=["GET"])
+def export_repertoire_pgn():
+    line_ids = [line_id for (line_id,) in db_session.query(Line.id).order_by(Line.opening_id, Line.created_at, Line.id)]
+    return _pgn_response(line_ids, "repertoire.pgn")
 
-    game = chess.pgn.Game()
-    game.headers["Event"] = line.title
-    board = game.board()
 
-    nodes = (
-        db_session.query(Node)
-        .filter(Node.line_id == line_id)
-        .order_by(Node.ply)
-        .all()
+def _pgn_response(line_ids: list[int], download_name: str) -> Response:
+    return Response(
+        chunked(stream_lines_pgn(line_ids)),
+        mimetype="application/x-chess-pgn",
+        headers={"Content-Disposition": f"attachment; filename={download_name}"},
     )
-    node_lookup = {node.id: node for node in nodes}
-
-    sequence = []
-    current = next((node for node in nodes if node.parent_id is None), None)
-    while current:
-        move = board.parse_san(current.san)
-        board.push(move)
-        sequence.append(move)
-        children = [node for node in nodes if node.parent_id == current.id]
-        current = children[0] if children else None
-
-    for move in sequence:
-        game.add_main_variation(move)
-
-    export_io = io.StringIO()
-    print(game, file=export_io)
-    export_io.seek(0)
-    return send_file(io.BytesIO(export_io.getvalue().encode("utf-8")), mimetype="application/x-chess-pgn", as_attachment=True, download_name=f"line_{line_id}.pgn")
@@ -3,23 +3,59 @@ from __future__ import annotations
 
 from flask import request, jsonify, abort
 
-from ..db import db_session
-from ..models import Line, Node
+from ..db import db_session, read_session
+from ..models import EvalSummary, Line, Node
+from ..response_cache import cached_json, line_scope, opening_scope, response_cache
+from ..sync import read_revision
 from . import api_bp
 
 
 @api_bp.route("/lines/<int:line_id>", methods=["GET"])
 def get_line(line_id: int):
-    line = db_session.get(Line, line_id)
+    line = read_session.get(Line, line_id)
     if not line:
         abort(404, description="Line not found")
-    return jsonify(_serialize_line(line))
+    return cached_json([line_scope(line_id)], lambda: _serialize_line(line), revision=read_revision())
+
+
+@api_bp.route("/lines/<int:line_id>/eval-curve", methods=["GET"])
+def eval_curve(line_id: int):
+    """Every node of a line by ply with its position's best-line score, for the eval graph.
+
+    Read from the primary: eval summaries carry no version a replica could be checked against.
+    """
+    if not db_session.get(Line, line_id):
+        abort(404, description="Line not found")
+
+    def build():
+        rows = (
+            db_session.query(
+                Node.id,
+                Node.ply,
+                EvalSummary.depth,
+                EvalSummary.score_cp,
+                EvalSummary.score_mate,
+            )
+            .outerjoin(EvalSummary, EvalSummary.position_id == Node.position_id)
+            .filter(Node.line_id == line_id)
+            .order_by(Node.ply, Node.id)
+            .all()
+        )
+        return [
+            {"node_id": node_id, "ply": ply, "depth": depth, "score_cp": score_cp, "score_mate": score_mate}
+            for node_id, ply, depth, score_cp, score_mate in rows
+        ]
+
+    return cached_json([line_scope(line_id)], build)
 
 
 @api_bp.route("/openings/<int:opening_id>/lines", methods=["GET"])
 def list_lines(opening_id: int):
-    lines = db_session.query(Line).filter(Line.opening_id == opening_id).order_by(Line.created_at).all()
-    return jsonify([_serialize_line(line) for line in lines])
+    def build():
+        lines = read_session.query(Line).filter(Line.opening_id == opening_id).order_by(Line.created_at).all()
+        return [_serialize_line(line) for line in lines]
+
+    return cached_json([opening_scope(opening_id)], build, revision=read_revision())
 
 
 @api_bp.route("/openings/<int:opening_id>/lines", methods=["POST"])
@@ -29,6 +65,7 @@ def create_line(opening_id: int):
     line = Line(opening_id=opening_id, title=title, is_main=data.get("is_main", False))
     db_session.add(line)
     db_session.commit()
+    response_cache.bump(opening_scope(opening_id))
     return jsonify(_serialize_line(line)), 201
 
 
@@ -0,0 +1,26 @@
+"""Database maintenance endpoints."""
+from __future__ import annotations
+
+from flask import abort, jsonify, request
+
+from ..analysis_queue import enqueue_compaction, get_maintenance_queue
+from . import api_bp
+
+
+@api_bp.route("/maintenance/compact-evals", methods=["POST"])
+def compact_evals():
+    """Queue eval compaction; ``keep_depths`` overrides ``EVAL_KEEP_DEPTHS`` for this run.
+
+    ``rebuild_summaries`` first recomputes the eval summaries behind line eval curves.
+    """
+    data = request.get_json(silent=True) or {}
+    keep_depths = data.get("keep_depths")
+    if keep_depths is not None and (not isinstance(keep_depths, int) or keep_depths < 1):
+        abort(400, description="keep_depths must be a positive integer")
+    job_id, coalesced = enqueue_compaction(
+        get_maintenance_queue(),
+        keep_depths=keep_depths,
+        vacuum=bool(data.get("vacuum", True)),
+        summaries=bool(data.get("rebuild_summaries", False)),
+    )
+    return jsonify({"pending": True, "job_id": job_id, "coalesced": coalesced}), 202
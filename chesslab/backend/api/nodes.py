@@ -1,25 +1,58 @@
 """Node management endpoints."""
 from __future__ import annotations
 
-from typing import List
-
 from flask import request, jsonify, abort
 import chess
+from sqlalchemy import tuple_
 
-from ..db import db_session
+from ..db import db_session, read_session
 from ..models import Line, Node
+from ..encoding import zobrist_key
+from ..bitboards import bitboard_index
+from ..explorer import repertoire_index
+from ..positions import get_or_create_position, normalize_fen
+from ..response_cache import Page, cached_json, line_scope, response_cache
+from ..sync import read_revision
+from ..tree import assign_path, backfill_paths, path_ids, subtree_range
 from . import api_bp
 
 
+MAX_PAGE_SIZE = 1000
+
+
 @api_bp.route("/lines/<int:line_id>/nodes", methods=["GET"])
 def list_nodes(line_id: int):
-    nodes = (
-        db_session.query(Node)
-        .filter(Node.line_id == line_id)
-        .order_by(Node.ply, Node.id)
-        .all()
-    )
-    return jsonify([_serialize_node(node) for node in nodes])
+    """All nodes of a line by ply, or one keyset page of them.
+
+    With ``limit``, at most that many nodes after the ``after`` cursor are
+    returned and ``X-Next-Cursor`` carries the cursor for the next page.
+    """
+    limit = request.args.get("limit", type=int)
+    after = request.args.get("after")
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cursor = None
+    if after:
+        try:
+            ply, node_id = (int(part) for part in after.split(":"))
+        except ValueError:
+            abort(400, description="Invalid cursor")
+        cursor = (ply, node_id)
+
+    def build():
+        query = read_session.query(Node).filter(Node.line_id == line_id)
+        if cursor is not None:
+            query = query.filter(tuple_(Node.ply, Node.id) > cursor)
+        query = query.order_by(Node.ply, Node.id)
+        if limit is None:
+            return [_serialize_node(node) for node in query.all()]
+        nodes = query.limit(limit + 1).all()
+        more = len(nodes) > limit
+        nodes = nodes[:limit]
+        next_cursor = f"{nodes[-1].ply}:{nodes[-1].id}" if more else None
+        return Page([_serialize_node(node) for node in nodes], next_cursor)
+
+    return cached_json([line_scope(line_id)], build, revision=read_revision())
 
 
 @api_bp.route("/lines/<int:line_id>/nodes", methods=["POST"])
@@ -38,19 +71,17 @@ def add_node(line_id: int):
 
     board = chess.Board()
     ply = 0
+    parent = None
 
     if parent_id:
         parent = db_session.get(Node, parent_id)
         if not parent or parent.line_id != line_id:
             abort(404, description="Parent node not in line")
-        path: List[Node] = []
-        current = parent
-        while current is not None:
-            path.append(current)
-            current = current.parent
-        for node in reversed(path):
-            board.push_san(node.san)
-            ply = node.ply
+        if parent.path is None:
+            backfill_paths(db_session, line_id)
+        # The parent's stored FEN is all that's needed to continue the line.
+        board = chess.Board(parent.fen)
+        ply = parent.ply
 
     try:
         move = board.parse_san(san)
@@ -58,19 +89,76 @@ def add_node(line_id: int):
         abort(400, description=str(exc))
 
     board.push(move)
+    position = get_or_create_position(db_session, board.fen())
     new_node = Node(
         line_id=line_id,
         parent_id=parent_id,
         san=san,
         ply=ply + 1,
         fen=board.fen(),
+        position_id=position.id,
+        zobrist=position.zobrist,
         comment=comment,
     )
     db_session.add(new_node)
+    assign_path(db_session, new_node, parent)
     db_session.commit()
+    response_cache.bump(line_scope(line_id))
+    repertoire_index.refresh(db_session)
+    bitboard_index.refresh(db_session)
     return jsonify(_serialize_node(new_node)), 201
 
 
+@api_bp.route("/nodes/<int:node_id>/children", methods=["GET"])
+def list_children(node_id: int):
+    children = read_session.query(Node).filter(Node.parent_id == node_id).order_by(Node.id).all()
+    return jsonify([_serialize_node(node) for node in children])
+
+
+@api_bp.route("/nodes/<int:node_id>/ancestors", methods=["GET"])
+def list_ancestors(node_id: int):
+    node = _node_with_path(node_id)
+    ancestor_ids = path_ids(node.path)[:-1]
+    ancestors = db_session.query(Node).filter(Node.id.in_(ancestor_ids)).order_by(Node.ply).all() if ancestor_ids else []
+    return jsonify([_serialize_node(ancestor) for ancestor in ancestors])
+
+
+@api_bp.route("/nodes/<int:node_id>/subtree", methods=["GET"])
+def get_subtree(node_id: int):
+    node = _node_with_path(node_id)
+    low, high = subtree_range(node.path)
+    query = db_session.query(Node).filter(Node.path >= low, Node.path < high)
+    max_depth = request.args.get("depth", type=int)
+    if max_depth is not None:
+        query = query.filter(Node.ply <= node.ply + max_depth)
+    nodes = query.order_by(Node.path).all()
+    return jsonify([_serialize_node(item) for item in nodes])
+
+
+@api_bp.route("/positions/nodes", methods=["GET"])
+def list_position_nodes():
+    """Every node, in any line or opening, that reaches the given position."""
+    fen = request.args.get("fen")
+    if not fen:
+        abort(400, description="fen required")
+    zobrist = zobrist_key(fen)
+    if zobrist is None:
+        abort(400, description="Invalid FEN")
+    nodes = read_session.query(Node).filter(Node.zobrist == zobrist).order_by(Node.line_id, Node.ply).all()
+    key = normalize_fen(fen)
+    return jsonify([_serialize_node(node) for node in nodes if normalize_fen(node.fen) == key])
+
+
+def _node_with_path(node_id: int) -> Node:
+    node = db_session.get(Node, node_id)
+    if not node:
+        abort(404, description="Node not found")
+    if node.path is None:
+        backfill_paths(db_session, node.line_id)
+        db_session.commit()
+    return node
+
+
 def _serialize_node(node: Node) -> dict:
     return {
         "id": node.id,
@@ -79,5 +167,7 @@ def _serialize_node(node: Node) -> dict:
         "san": node.san,
         "ply": node.ply,
         "fen": node.fen,
+        "position_id": node.position_id,
+        "path": node.path,
         "comment": node.comment,
     }
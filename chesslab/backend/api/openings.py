@@ -3,15 +3,20 @@ from __future__ import annotations
 
 from flask import request, jsonify
 
-from ..db import db_session
+from ..db import db_session, read_session
 from ..models import Opening, Line
+from ..response_cache import cached_json, opening_scope, response_cache
+from ..sync import read_revision
 from . import api_bp
 
 
 @api_bp.route("/openings", methods=["GET"])
 def list_openings():
-    openings = db_session.query(Opening).order_by(Opening.created_at.desc()).all()
-    return jsonify([_serialize_opening(op) for op in openings])
+    def build():
+        openings = read_session.query(Opening).order_by(Opening.created_at.desc()).all()
+        return [_serialize_opening(op) for op in openings]
+
+    return cached_json(["openings"], build, revision=read_revision())
 
 
 @api_bp.route("/openings", methods=["POST"])
@@ -28,6 +33,7 @@ def create_opening():
         db_session.add(line)
 
     db_session.commit()
+    response_cache.bump("openings", opening_scope(opening.id))
     return jsonify(_serialize_opening(opening)), 201
 
 
@@ -0,0 +1,52 @@
+"""Position search over the bitboard index."""
+from __future__ import annotations
+
+from flask import jsonify, request, abort
+
+from ..bitboards import PIECE_COLUMNS, bitboard_index, parse_material, parse_piece_pattern, placement_bitboards
+from ..db import db_session
+from ..models import Node
+from . import api_bp
+
+MAX_LIMIT = 500
+
+
+@api_bp.route("/search/positions", methods=["GET"])
+def search_positions():
+    """Find nodes by ``pieces`` (``Pe5,Nf3``), ``material`` (``KRPvKR``) or ``pawns`` (a FEN)."""
+    pieces_spec = request.args.get("pieces")
+    material_spec = request.args.get("material")
+    pawns_fen = request.args.get("pawns")
+    if not (pieces_spec or material_spec or pawns_fen):
+        abort(400, description="pieces, material or pawns required")
+    limit = max(1, min(request.args.get("limit", 100, type=int), MAX_LIMIT))
+
+    try:
+        pieces = parse_piece_pattern(pieces_spec) if pieces_spec else None
+        material = parse_material(material_spec) if material_spec else None
+        if pawns_fen:
+            boards = placement_bitboards(pawns_fen)
+            pawns = (boards[PIECE_COLUMNS["P"]], boards[PIECE_COLUMNS["p"]])
+        else:
+            pawns = None
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    node_ids = bitboard_index.search(
+        db_session,
+        pieces=pieces,
+        material=material,
+        pawns=pawns,
+        line_id=request.args.get("line_id", type=int),
+    )
+    page = node_ids[:limit]
+    nodes = db_session.query(Node).filter(Node.id.in_(page)).order_by(Node.id).all() if page else []
+    return jsonify(
+        {
+            "total": len(node_ids),
+            "nodes": [
+                {"id": node.id, "line_id": node.line_id, "ply": node.ply, "san": node.san, "fen": node.fen}
+                for node in nodes
+            ],
+        }
+    )
@@ -0,0 +1,32 @@
+"""Whole-repertoire snapshot and delta sync endpoints."""
+from __future__ import annotations
+
+from flask import abort, request
+
+from ..db import read_session
+from ..response_cache import cached_json
+from ..sync import current_version, repertoire_tables
+from . import api_bp
+
+
+@api_bp.route("/repertoire", methods=["GET"])
+def repertoire_snapshot():
+    version = current_version(read_session)
+    return cached_json([], lambda: repertoire_tables(read_session, version=version), revision=version)
+
+
+@api_bp.route("/repertoire/changes", methods=["GET"])
+def repertoire_changes():
+    """Rows written after ``since``; a full snapshot with ``reset`` if ``since`` is unknown."""
+    since = request.args.get("since", type=int)
+    if since is None:
+        abort(400, description="since required")
+    version = current_version(read_session)
+
+    def build():
+        if 0 <= since <= version:
+            return {"reset": False, **repertoire_tables(read_session, since, version)}
+        # The client's version comes from another database (or a rebuilt one).
+        return {"reset": True, **repertoire_tables(read_session, version=version)}
+
+    return cached_json([], build, revision=version)
@@ -2,44 +2,94 @@
 from __future__ import annotations
 
 import os
-from flask import Flask
+import tempfile
+from flask import Flask, Response
 from flask_cors import CORS
-from flask_socketio import SocketIO
 
+from . import analysis_queue, metrics, socketio_server
 from .api import api_bp
-from .db import db_session, init_engine, Base
+from .db import db_session, get_engine, get_read_engine, init_engine, read_session, Base
+from .eval_cache import eval_cache
+from .response_cache import response_cache
 from .socketio_server import socketio
+from .sync import install_version_stamping
 
 
 def create_app(test_config: dict | None = None) -> Flask:
     """Create and configure the Flask application."""
     app = Flask(__name__)
     app.config.setdefault("SQLALCHEMY_DATABASE_URI", os.getenv("DATABASE_URL", "sqlite:///chesslab.db"))
+    # Optional read replica for GET endpoints; empty reads from the primary.
+    app.config.setdefault("DATABASE_READ_URL", os.getenv("DATABASE_READ_URL", ""))
+    # Storage profile (sqlite, postgres or default); empty picks one from the URI.
+    app.config.setdefault("DB_PROFILE", os.getenv("DB_PROFILE", ""))
     app.config.setdefault("REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
     app.config.setdefault("ENGINE_MAX_DEPTH", int(os.getenv("ENGINE_MAX_DEPTH", "20")))
     app.config.setdefault("ENGINE_MULTIPV", int(os.getenv("ENGINE_MULTIPV", "3")))
+    app.config.setdefault("IMPORT_DIR", os.getenv("IMPORT_DIR", os.path.join(tempfile.gettempdir(), "chesslab-imports")))
+    app.config.setdefault("EVAL_CACHE_SIZE", int(os.getenv("EVAL_CACHE_SIZE", "10000")))
+    app.config.setdefault("EVAL_CACHE_TTL", float(os.getenv("EVAL_CACHE_TTL", "30")))
+    app.config.setdefault("EVAL_CACHE_REDIS", os.getenv("EVAL_CACHE_REDIS", "1") == "1")
+    app.config.setdefault("RESPONSE_CACHE_SIZE", int(os.getenv("RESPONSE_CACHE_SIZE", "2048")))
+    app.config.setdefault("RESPONSE_CACHE_REDIS", os.getenv("RESPONSE_CACHE_REDIS", "1") == "1")
+    # Worker-recorded metrics (engine and job timings) are read back from Redis.
+    app.config.setdefault("METRICS_REDIS", os.getenv("METRICS_REDIS", "1") == "1")
+    app.config.setdefault("REQUEST_PROFILING", os.getenv("REQUEST_PROFILING", "0") == "1")
+    app.config.setdefault("PROFILE_DIR", os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "chesslab-profiles")))
+    # Empty disables the queue; emits from the RQ worker then never reach browsers.
+    app.config.setdefault("SOCKETIO_MESSAGE_QUEUE", os.getenv("SOCKETIO_MESSAGE_QUEUE", app.config["REDIS_URL"]))
 
     if test_config:
         app.config.update(test_config)
 
-    init_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+    init_engine(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        profile=app.config["DB_PROFILE"] or None,
+        read_uri=app.config["DATABASE_READ_URL"] or None,
+    )
+    install_version_stamping()
+    metrics.instrument_engine(get_engine())
+    metrics.instrument_engine(get_read_engine())
+    metrics.registry.configure(redis_url=app.config["REDIS_URL"] if app.config["METRICS_REDIS"] else None)
+    eval_cache.configure(
+        max_entries=app.config["EVAL_CACHE_SIZE"],
+        ttl=app.config["EVAL_CACHE_TTL"],
+        redis_url=app.config["REDIS_URL"] if app.config["EVAL_CACHE_REDIS"] else None,
+    )
+
+    response_cache.configure(
+        max_entries=app.config["RESPONSE_CACHE_SIZE"],
+        redis_url=app.config["REDIS_URL"] if app.config["RESPONSE_CACHE_REDIS"] else None,
+    )
 
-    CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}})
+    analysis_queue.init_app(app)
+
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": "http://localhost:5173"}},
+        expose_headers=["ETag", "Last-Modified", "X-Next-Cursor", "Server-Timing", "X-Profile-File"],
+    )
 
     app.register_blueprint(api_bp, url_prefix="/api")
+    metrics.init_app(app)
 
     @app.teardown_appcontext
     def shutdown_session(exception: Exception | None = None) -> None:  # pragma: no cover
         if exception:
             db_session.rollback()
         db_session.remove()
+        read_session.remove()
 
-    socketio.init_app(app, cors_allowed_origins="http://localhost:5173")
+    socketio_server.init_app(app)
 
     @app.route("/health")
     def health() -> dict[str, str]:
         return {"status": "ok"}
 
+    @app.route("/metrics")
+    def prometheus_metrics() -> Response:
+        return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
     return app
 
 
@@ -0,0 +1 @@
+"""Micro-benchmarks for chesslab hot paths."""
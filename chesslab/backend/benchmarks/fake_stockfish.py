@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Scripted UCI engine for offline benchmarks and tests.
+
+Point ``STOCKFISH_PATH`` at this file to exercise the engine pool, the
+workers and the parsers without a real engine.  Output is deterministic per
+position: every ``go`` reports each depth up to the limit with ``MultiPV``
+lines, scores drift until ``FAKE_ENGINE_SETTLE_DEPTH`` and are stable after
+it, and ``FAKE_ENGINE_DEPTH_DELAY`` seconds pass between depths (``stop``
+is honoured in between).  PV moves are legal when python-chess is importable.
+
+Only the standard library is required; this file is executed directly.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import select
+import sys
+import time
+
+try:
+    import chess
+except ImportError:  # pragma: no cover - the engine still works without legal PVs
+    chess = None
+
+DEPTH_DELAY = float(os.getenv("FAKE_ENGINE_DEPTH_DELAY", "0"))
+SETTLE_DEPTH = int(os.getenv("FAKE_ENGINE_SETTLE_DEPTH", "8"))
+NODES_PER_DEPTH = 25_000
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+class Commands:
+    """Line reader over stdin that can also poll without blocking."""
+
+    def __init__(self) -> None:
+        self._buffer = b""
+        self._lines: list[str] = []
+        self.closed = False
+
+    def _fill(self, timeout: float | None) -> None:
+        if self.closed:
+            return
+        ready, _, _ = select.select([0], [], [], timeout)
+        if not ready:
+            return
+        chunk = os.read(0, 65536)
+        if not chunk:
+            self.closed = True
+            return
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        self._lines.extend(line.decode("ascii", "replace").strip() for line in lines)
+
+    def next(self, timeout: float | None = None) -> str | None:
+        """The next command, waiting up to ``timeout`` (forever if ``None``)."""
+        while not self._lines and not self.closed:
+            self._fill(timeout)
+            if timeout is not None:
+                break
+        return self._lines.pop(0) if self._lines else None
+
+
+def emit(line: str) -> None:
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def _seed(*parts: object) -> int:
+    return int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=8).digest(), "big")
+
+
+def _candidate_lines(fen: str, count: int) -> list[list[str]]:
+    """Up to ``count`` distinct PVs for the position, best first."""
+    if chess is None:
+        return [["e2e4", "e7e5"]][:count] or [["e2e4"]]
+    board = chess.Board(fen)
+    moves = sorted(board.legal_moves, key=lambda move: _seed(fen, move.uci()))
+    lines = []
+    for move in moves[:count]:
+        pv = [move]
+        board.push(move)
+        while len(pv) < 4 and not board.is_game_over():
+            reply = min(board.legal_moves, key=lambda m: _seed(fen, m.uci()))
+            pv.append(reply)
+            board.push(reply)
+        for _ in pv:
+            board.pop()
+        lines.append([m.uci() for m in pv])
+    return lines
+
+
+def search(commands: Commands, fen: str, multipv: int, depth: int) -> bool:
+    """Report one search; returns ``False`` when ``quit`` arrived meanwhile."""
+    lines = _candidate_lines(fen, multipv)
+    base = _seed(fen) % 120 - 40
+    started = time.monotonic()
+    best = lines[0][0] if lines else "0000"
+    keep_going = True
+    for current in range(1, depth + 1):
+        # Before the settle depth the top two lines trade places and scores drift.
+        unsettled = current < SETTLE_DEPTH and len(lines) > 1 and current % 2
+        ordered = [lines[1], lines[0], *lines[2:]] if unsettled else lines
+        drift = 0 if current >= SETTLE_DEPTH else (_seed(fen, current) % 61) - 30
+        elapsed = int((time.monotonic() - started) * 1000)
+        for rank, pv in enumerate(ordered, start=1):
+            score = base + drift - 12 * (rank - 1)
+            emit(
+                f"info depth {current} seldepth {current + 4} multipv {rank} score cp {score} "
+                f"nodes {current * NODES_PER_DEPTH} nps 1000000 time {elapsed} pv {' '.join(pv[:max(1, current)])}"
+            )
+        best = ordered[0][0] if ordered else best
+        if current == depth:
+            break
+        command = commands.next(DEPTH_DELAY)
+        if command == "stop":
+            break
+        if command == "quit":
+            keep_going = False
+            break
+        if command == "isready":
+            emit("readyok")
+    emit(f"bestmove {best}")
+    return keep_going
+
+
+def main() -> None:
+    commands = Commands()
+    fen = START_FEN
+    multipv = 1
+    while True:
+        command = commands.next()
+        if command is None or command == "quit":
+            return
+        if command == "uci":
+            emit("id name FakeStockfish")
+            emit("id author chesslab")
+            emit("option name MultiPV type spin default 1 min 1 max 500")
+            emit("uciok")
+        elif command == "isready":
+            emit("readyok")
+        elif command.startswith("setoption name MultiPV value"):
+            multipv = max(1, int(command.rsplit(" ", 1)[1]))
+        elif command.startswith("position"):
+            fen = _position(command)
+        elif command.startswith("go"):
+            parts = command.split()
+            if "depth" in parts:
+                depth = int(parts[parts.index("depth") + 1])
+            elif "movetime" in parts:
+                depth = max(1, int(parts[parts.index("movetime") + 1]) // 100)
+            else:
+                depth = 64
+            if not search(commands, fen, multipv, depth):
+                return
+
+
+def _position(command: str) -> str:
+    parts = command.split()
+    moves: list[str] = []
+    if "moves" in parts:
+        moves = parts[parts.index("moves") + 1:]
+        parts = parts[: parts.index("moves")]
+    fen = START_FEN if parts[1] == "startpos" else " ".join(parts[2:])
+    if moves and chess is not None:
+        board = chess.Board(fen)
+        for move in moves:
+            board.push_uci(move)
+        fen = board.fen()
+    return fen
+
+
+if __name__ == "__main__":
+    main()
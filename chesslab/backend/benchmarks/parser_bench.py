@@ -0,0 +1,118 @@
+"""Measure UCI output parse cost per line on recorded engine transcripts.
+
+Run with ``python -m chesslab.backend.benchmarks.parser_bench [transcript ...]``.
+Two numbers are reported per implementation: the parser alone, and the whole
+channel (reader-side filtering, queue hand-off and parsing) that every engine
+line goes through.  The legacy text-mode implementation is timed alongside.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from queue import Queue
+
+from ..engine.parser import is_pv_info, parse_bestmove, parse_info
+
+TRANSCRIPTS = Path(__file__).with_name("transcripts")
+
+
+def legacy_parse(line: str) -> dict | None:
+    """The pre-parser implementation: substring test plus repeated index scans."""
+    if not (line.startswith("info") and "pv" in line):
+        return None
+    parts = line.split()
+    info: dict[str, int | str] = {}
+    if "multipv" in parts:
+        info["multipv"] = int(parts[parts.index("multipv") + 1])
+    if "depth" in parts:
+        info["depth"] = int(parts[parts.index("depth") + 1])
+    if "score" in parts:
+        idx = parts.index("score")
+        if parts[idx + 1] == "cp":
+            info["score_cp"] = int(parts[idx + 2])
+        elif parts[idx + 1] == "mate":
+            info["score_mate"] = int(parts[idx + 2])
+    if "pv" in parts:
+        pv_moves = parts[parts.index("pv") + 1:]
+        info["pv_uci"] = " ".join(pv_moves)
+        info["bestmove_uci"] = pv_moves[0] if pv_moves else None
+    return info
+
+
+def _fast_pass(lines: list[bytes]) -> None:
+    for line in lines:
+        if parse_info(line) is None:
+            parse_bestmove(line)
+
+
+def _legacy_pass(lines: list[str]) -> None:
+    for line in lines:
+        legacy_parse(line.strip())
+
+
+def _fast_channel(lines: list[bytes]) -> None:
+    queue: Queue[bytes] = Queue()
+    for line in lines:
+        if line.startswith(b"info") and not is_pv_info(line):
+            continue
+        queue.put(line.rstrip())
+    while not queue.empty():
+        line = queue.get()
+        if parse_info(line) is None:
+            parse_bestmove(line)
+
+
+def _legacy_channel(lines: list[bytes]) -> None:
+    queue: Queue[str] = Queue()
+    for line in lines:
+        queue.put(line.decode("utf-8").strip())
+    while not queue.empty():
+        legacy_parse(queue.get())
+
+
+def _time_per_line(fn, lines, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - start)
+    return best / len(lines) * 1e9
+
+
+def run(paths: list[Path], repeat: int = 50) -> list[dict]:
+    rows = []
+    for path in paths:
+        raw = path.read_bytes().splitlines(keepends=True)
+        stripped = [line.rstrip() for line in raw]
+        text = [line.decode("ascii") for line in raw]
+        rows.append(
+            {
+                "transcript": path.name,
+                "lines": len(raw),
+                "pv_lines": sum(1 for line in stripped if parse_info(line) is not None),
+                "parse_ns_per_line": _time_per_line(_fast_pass, stripped, repeat),
+                "legacy_parse_ns_per_line": _time_per_line(_legacy_pass, text, repeat),
+                "channel_ns_per_line": _time_per_line(_fast_channel, raw, repeat),
+                "legacy_channel_ns_per_line": _time_per_line(_legacy_channel, raw, repeat),
+            }
+        )
+    return rows
+
+
+def main() -> None:  # pragma: no cover - manual execution helper
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("transcripts", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    paths = args.transcripts or sorted(TRANSCRIPTS.glob("*.txt"))
+    for row in run(paths, args.repeat):
+        print(
+            f"{row['transcript']}: {row['lines']} lines ({row['pv_lines']} PV)\n"
+            f"  parse:   {row['parse_ns_per_line']:.0f} ns/line (legacy {row['legacy_parse_ns_per_line']:.0f})\n"
+            f"  channel: {row['channel_ns_per_line']:.0f} ns/line (legacy {row['legacy_channel_ns_per_line']:.0f})"
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
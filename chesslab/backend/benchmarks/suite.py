@@ -0,0 +1,314 @@
+"""Latency and query-count benchmarks for the backend's hot paths.
+
+Run with ``python -m chesslab.backend.benchmarks.suite``.  A synthetic
+repertoire is generated into a fresh SQLite file (or ``--database-url``),
+then each case is called repeatedly through the Flask test client, or
+directly for worker functions.  Engine cases use the scripted
+``fake_stockfish.py``, so no engine binary is needed.  Each case reports
+p50/p95/p99 latency and SQL statements per call.
+
+``--save PATH`` writes the results as a baseline; ``--compare PATH`` prints
+each case against a saved baseline and, with ``--fail-on-regression``,
+exits non-zero when a case got slower than ``--tolerance`` allows or issues
+more queries.  Baselines for the preset scales live in ``baselines/``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+import chess
+from sqlalchemy import event
+
+from ..app import create_app
+from ..db import Base, db_session, get_engine
+from ..engine import pool
+from ..engine.uci import UCIEngine
+from ..eval_store import eval_row, upsert_evals
+from ..models import Node
+from ..response_cache import response_cache
+from ..worker import perform_analysis
+from .synthetic import build_repertoire, games_pgn, random_games
+
+FAKE_ENGINE = str(Path(__file__).with_name("fake_stockfish.py"))
+BASELINES = Path(__file__).with_name("baselines")
+
+# Repertoire size per preset: openings, games per opening, plies per game.
+SCALES = {
+    "small": {"openings": 50, "games_per_opening": 9, "plies": 24},
+    "full": {"openings": 1000, "games_per_opening": 9, "plies": 24},
+}
+
+
+class QueryCounter:
+    """Counts SQL statements sent through the engine."""
+
+    def __init__(self, engine) -> None:
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def close(self, engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def _timed(samples: list[float], queries: list[int], counter: QueryCounter) -> Iterator[None]:
+    before = counter.count
+    start = time.perf_counter()
+    yield
+    samples.append((time.perf_counter() - start) * 1000)
+    queries.append(counter.count - before)
+
+
+def summarize(name: str, samples: list[float], queries: list[int]) -> dict:
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "case": name,
+        "calls": len(samples),
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "queries_per_call": round(statistics.fmean(queries), 2),
+    }
+
+
+class Suite:
+    def __init__(self, database_url: str, scale: dict, *, seed: int = 0) -> None:
+        self.app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": database_url,
+                "SOCKETIO_MESSAGE_QUEUE": "",
+                "EVAL_CACHE_REDIS": False,
+                "RESPONSE_CACHE_REDIS": False,
+            }
+        )
+        Base.metadata.create_all(get_engine())
+        self.client = self.app.test_client()
+        self.rng = random.Random(seed)
+        start = time.perf_counter()
+        self.repertoire = build_repertoire(db_session, seed=seed, **scale)
+        self.seed_seconds = time.perf_counter() - start
+        self.node_ids = [node_id for (node_id,) in db_session.query(Node.id)]
+        self._seed_evals(fraction=0.2)
+        db_session.remove()
+        self.counter = QueryCounter(get_engine())
+
+    def _seed_evals(self, fraction: float) -> None:
+        sample = self.rng.sample(self.node_ids, int(len(self.node_ids) * fraction))
+        rows = []
+        for (position_id,) in db_session.query(Node.position_id).filter(Node.id.in_(sample)).distinct():
+            for multipv in (1, 2, 3):
+                rows.append(eval_row(position_id, 20, "server", {"multipv": multipv, "score_cp": 10, "pv_uci": "e2e4"}))
+        upsert_evals(db_session, rows)
+        db_session.commit()
+        self.evaluated = {row["position_id"] for row in rows}
+
+    def run_case(
+        self,
+        name: str,
+        call: Callable[..., None],
+        iterations: int,
+        setup: Callable[[], tuple] | None = None,
+    ) -> dict:
+        """Time ``call(*setup())``; ``setup`` runs outside the measurement.
+
+        One untimed warm-up call builds lazy state (indexes, engine processes).
+        """
+        samples: list[float] = []
+        queries: list[int] = []
+        for index in range(iterations + 1):
+            args = setup() if setup is not None else ()
+            if index == 0:
+                call(*args)
+                continue
+            with _timed(samples, queries, self.counter):
+                call(*args)
+        db_session.remove()
+        return summarize(name, samples, queries)
+
+    def _line(self) -> int:
+        return self.rng.choice(self.repertoire.line_ids)
+
+    def _node(self) -> Node:
+        node = db_session.get(Node, self.rng.choice(self.node_ids))
+        db_session.remove()
+        return node
+
+    def cases(self, iterations: int) -> list[dict]:
+        few = max(1, iterations // 5)
+        results = [
+            self.run_case("list_nodes", self._get, iterations, self._cold(lambda: f"/api/lines/{self._line()}/nodes")),
+        ]
+        warm = f"/api/lines/{self._line()}/nodes"
+        etag = self.client.get(warm).headers["ETag"]
+        results += [
+            self.run_case("list_nodes_cached", self._get, iterations, lambda: (warm,)),
+            self.run_case("list_nodes_304", self._get, iterations, lambda: (warm, {"If-None-Match": etag}, 304)),
+            self.run_case("add_node", self._post_node, iterations, self._new_move),
+            self.run_case("import_pgn", self._post_import, few, self._import_body),
+            self.run_case("export_pgn", self._get, few, lambda: (f"/api/export/pgn/{self._line()}",)),
+            self.run_case(
+                "get_eval",
+                self._get,
+                iterations,
+                self._cold(lambda: f"/api/eval?node_id={self.rng.choice(self.node_ids)}&depth=20&multipv=3"),
+            ),
+            self.run_case("perform_analysis", self._analyse, few, self._analysis_target),
+        ]
+        return results
+
+    @staticmethod
+    def _cold(url: Callable[[], str]) -> Callable[[], tuple]:
+        """Setup for uncached reads: empty the response cache and pick a URL."""
+
+        def setup() -> tuple:
+            response_cache.clear()
+            return (url(),)
+
+        return setup
+
+    def _get(self, url: str, headers: dict | None = None, status: int = 200) -> None:
+        response = self.client.get(url, headers=headers)
+        response.get_data()
+        if response.status_code != status:
+            raise RuntimeError(f"GET {url}: {response.status_code}")
+
+    def _new_move(self) -> tuple:
+        """A parent node and a SAN move it does not have yet."""
+        while True:
+            parent = self._node()
+            taken = {san for (san,) in db_session.query(Node.san).filter(Node.parent_id == parent.id)}
+            db_session.remove()
+            board = chess.Board(parent.fen)
+            moves = [san for san in (board.san(move) for move in board.legal_moves) if san not in taken]
+            if moves:
+                return parent.line_id, {"parent_id": parent.id, "san": self.rng.choice(moves)}
+
+    def _post_node(self, line_id: int, body: dict) -> None:
+        response = self.client.post(f"/api/lines/{line_id}/nodes", json=body)
+        if response.status_code != 201:
+            raise RuntimeError(f"add_node: {response.status_code}")
+
+    def _import_body(self) -> tuple:
+        index = self.rng.randrange(len(self.repertoire.line_ids))
+        return (
+            {
+                "opening_id": self.repertoire.opening_ids[index],
+                "line_id": self.repertoire.line_ids[index],
+                "pgn": games_pgn(random_games(self.rng, 5, 30)),
+            },
+        )
+
+    def _post_import(self, body: dict) -> None:
+        response = self.client.post("/api/import/pgn", json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"import_pgn: {response.status_code}")
+
+    def _analysis_target(self) -> tuple:
+        # A stored eval (seeded or from an earlier call) would answer the request
+        # without the engine, so only positions nothing has evaluated are picked.
+        while True:
+            node = self._node()
+            if node.position_id not in self.evaluated:
+                self.evaluated.add(node.position_id)
+                return node.id, node.fen
+
+    def _analyse(self, node_id: int, fen: str) -> None:
+        with self.app.app_context():
+            perform_analysis(node_id, fen, 18, 3)
+        db_session.remove()
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Describe each case against ``baseline``; returns the regressions."""
+    previous = {row["case"]: row for row in baseline}
+    regressions = []
+    for row in results:
+        old = previous.get(row["case"])
+        if old is None:
+            print(f"  {row['case']:<20} (no baseline)")
+            continue
+        ratio = row["p95_ms"] / old["p95_ms"] if old["p95_ms"] else 1.0
+        flags = []
+        if ratio > 1 + tolerance:
+            flags.append(f"p95 x{ratio:.2f}")
+        if row["queries_per_call"] > old["queries_per_call"]:
+            flags.append(f"queries {old['queries_per_call']} -> {row['queries_per_call']}")
+        print(f"  {row['case']:<20} p95 {old['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms  {'REGRESSION: ' + ', '.join(flags) if flags else 'ok'}")
+        if flags:
+            regressions.append(row["case"])
+    return regressions
+
+
+def run(scale: str = "small", *, iterations: int = 50, database_url: str | None = None, seed: int = 0) -> dict:
+    owned = None
+    if database_url is None:
+        fd, owned = tempfile.mkstemp(suffix=".db", prefix="chesslab-bench-")
+        os.close(fd)
+        database_url = f"sqlite:///{owned}"
+    os.environ.setdefault("FAKE_ENGINE_DEPTH_DELAY", "0")
+    pool.configure(size=1, factory=lambda: UCIEngine(FAKE_ENGINE))
+    try:
+        suite = Suite(database_url, SCALES[scale], seed=seed)
+        try:
+            results = suite.cases(iterations)
+        finally:
+            suite.counter.close(get_engine())
+        return {
+            "scale": scale,
+            "openings": len(suite.repertoire.opening_ids),
+            "nodes": suite.repertoire.nodes,
+            "seed_seconds": round(suite.seed_seconds, 2),
+            "results": results,
+        }
+    finally:
+        pool.get_pool().close()
+        if owned is not None:
+            os.remove(owned)
+
+
+def main() -> None:  # pragma: no cover - manual execution helper
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--database-url")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="write results as a baseline")
+    parser.add_argument("--compare", type=Path, help="baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    report = run(args.scale, iterations=args.iterations, database_url=args.database_url, seed=args.seed)
+    print(f"{report['openings']} openings, {report['nodes']} nodes (seeded in {report['seed_seconds']}s)")
+    print(f"  {'case':<20} {'p50':>9} {'p95':>9} {'p99':>9}  queries/call")
+    for row in report["results"]:
+        print(
+            f"  {row['case']:<20} {row['p50_ms']:>7.2f}ms {row['p95_ms']:>7.2f}ms {row['p99_ms']:>7.2f}ms"
+            f"  {row['queries_per_call']}"
+        )
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        print(f"Against {args.compare}:")
+        regressions = compare(report["results"], json.loads(args.compare.read_text())["results"], args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,82 @@
+"""Deterministic synthetic repertoires for benchmarks.
+
+Each opening gets one line filled with random legal games that branch off
+earlier games of the same opening, so lines have the shared trunks and
+variations real repertoires have.  Games are written as PGN and loaded with
+:func:`~chesslab.backend.pgn_import.import_games`, the same path imports use.
+"""
+from __future__ import annotations
+
+import io
+import random
+from dataclasses import dataclass, field
+
+import chess
+from sqlalchemy.orm import Session
+
+from ..models import Line, Node, Opening
+from ..pgn_import import import_games
+
+
+@dataclass
+class SyntheticRepertoire:
+    opening_ids: list[int] = field(default_factory=list)
+    line_ids: list[int] = field(default_factory=list)
+    nodes: int = 0
+
+
+def random_games(rng: random.Random, games: int, plies: int, trunk: int = 4) -> list[list[str]]:
+    """SAN move lists sharing a ``trunk``-ply prefix, each branching off an earlier game."""
+    played: list[list[str]] = []
+    for index in range(games):
+        if index == 0:
+            prefix: list[str] = []
+        else:
+            source = rng.choice(played)
+            prefix = source[: rng.randint(trunk, max(trunk, len(source) - 1))]
+        board = chess.Board()
+        for san in prefix:
+            board.push_san(san)
+        moves = list(prefix)
+        while len(moves) < plies and not board.is_game_over():
+            move = rng.choice(list(board.legal_moves))
+            moves.append(board.san(move))
+            board.push(move)
+        played.append(moves)
+    return played
+
+
+def games_pgn(games: list[list[str]]) -> str:
+    chunks = []
+    for moves in games:
+        tokens = []
+        for ply, san in enumerate(moves):
+            if ply % 2 == 0:
+                tokens.append(f"{ply // 2 + 1}.")
+            tokens.append(san)
+        chunks.append(" ".join(tokens) + " *\n")
+    return "\n".join(chunks)
+
+
+def build_repertoire(
+    session: Session,
+    *,
+    openings: int,
+    games_per_opening: int,
+    plies: int,
+    seed: int = 0,
+) -> SyntheticRepertoire:
+    """Create ``openings`` openings, one line each, and return their IDs and node count."""
+    rng = random.Random(seed)
+    repertoire = SyntheticRepertoire()
+    for index in range(openings):
+        opening = Opening(name=f"Synthetic {index}", side="white" if index % 2 == 0 else "black")
+        line = Line(opening=opening, title="Main line", is_main=True)
+        session.add_all([opening, line])
+        session.commit()
+        games = random_games(rng, games_per_opening, plies)
+        import_games(session, io.StringIO(games_pgn(games)), line.id)
+        repertoire.opening_ids.append(opening.id)
+        repertoire.line_ids.append(line.id)
+    repertoire.nodes = session.query(Node).count()
+    return repertoire
@@ -0,0 +1,173 @@
+"""Columnar bitboard index for searching stored positions.
+
+Every node's placement is kept as twelve ``uint64`` bitboards (one per
+colour and piece type) plus per-piece counts, in NumPy arrays that grow by
+doubling.  Searches by piece placement, material signature or pawn structure
+become a handful of vectorized mask comparisons over all nodes instead of a
+python-chess parse per row.  Like the explorer index, it is filled lazily and
+refreshed by repertoire-version watermark, which follows commit order.
+"""
+from __future__ import annotations
+
+import threading
+
+import chess
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .models import Node
+
+# Column order: white P N B R Q K, then black p n b r q k.
+PIECE_COLUMNS = {
+    symbol: index for index, symbol in enumerate("PNBRQKpnbrqk")
+}
+_WHITE_PAWNS = PIECE_COLUMNS["P"]
+_BLACK_PAWNS = PIECE_COLUMNS["p"]
+_INITIAL_CAPACITY = 1024
+
+
+def placement_bitboards(fen: str) -> list[int]:
+    """Twelve piece bitboards for ``fen``, in :data:`PIECE_COLUMNS` order."""
+    board = chess.BaseBoard(fen.split(" ", 1)[0])
+    return [
+        board.pieces_mask(chess.PIECE_SYMBOLS.index(symbol.lower()), symbol.isupper())
+        for symbol in PIECE_COLUMNS
+    ]
+
+
+def parse_piece_pattern(spec: str) -> dict[int, int]:
+    """Parse ``"Pe5,Nf3,pd6"`` into required squares per piece column.
+
+    Piece letters follow FEN case: upper case is White, lower case Black.
+    """
+    masks: dict[int, int] = {}
+    for token in filter(None, (part.strip() for part in spec.split(","))):
+        symbol, square_name = token[0], token[1:]
+        if symbol not in PIECE_COLUMNS:
+            raise ValueError(f"Unknown piece: {symbol}")
+        try:
+            square = chess.parse_square(square_name)
+        except ValueError:
+            raise ValueError(f"Invalid square: {square_name}") from None
+        column = PIECE_COLUMNS[symbol]
+        masks[column] = masks.get(column, 0) | chess.BB_SQUARES[square]
+    return masks
+
+
+def parse_material(spec: str) -> list[int]:
+    """Parse ``"KRPPvKR"`` (White before ``v``, Black after) into per-column counts."""
+    white, sep, black = spec.partition("v")
+    if not sep:
+        raise ValueError("Material must look like 'KRPvKR'")
+    counts = [0] * len(PIECE_COLUMNS)
+    for side, letters in ((str.upper, white), (str.lower, black)):
+        for letter in letters:
+            symbol = side(letter)
+            if symbol not in PIECE_COLUMNS:
+                raise ValueError(f"Unknown piece: {letter}")
+            counts[PIECE_COLUMNS[symbol]] += 1
+    return counts
+
+
+class BitboardIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset(_INITIAL_CAPACITY)
+
+    def _reset(self, capacity: int) -> None:
+        self._size = 0
+        # Versions start at 0 for rows written before they were stamped.
+        self._watermark = -1
+        # Updates restamp a node without changing its placement.
+        self._seen: set[int] = set()
+        self._node_ids = np.zeros(capacity, dtype=np.int64)
+        self._line_ids = np.zeros(capacity, dtype=np.int64)
+        self._boards = np.zeros((capacity, len(PIECE_COLUMNS)), dtype=np.uint64)
+        self._counts = np.zeros((capacity, len(PIECE_COLUMNS)), dtype=np.uint8)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = len(self._node_ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._node_ids = np.resize(self._node_ids, capacity)
+        self._line_ids = np.resize(self._line_ids, capacity)
+        self._boards = np.resize(self._boards, (capacity, len(PIECE_COLUMNS)))
+        self._counts = np.resize(self._counts, (capacity, len(PIECE_COLUMNS)))
+
+    def refresh(self, session: Session) -> int:
+        """Index nodes written since the last refresh; returns how many were added."""
+        with self._lock:
+            watermark = self._watermark
+        rows = (
+            session.query(Node.id, Node.line_id, Node.fen, Node.version)
+            .filter(Node.version > watermark)
+            .order_by(Node.version, Node.id)
+            .all()
+        )
+        with self._lock:
+            if rows:
+                self._watermark = max(self._watermark, rows[-1][3])
+            rows = [row for row in rows if row[0] not in self._seen]
+            if not rows:
+                return 0
+            self._seen.update(row[0] for row in rows)
+            self._reserve(len(rows))
+            start, stop = self._size, self._size + len(rows)
+            boards = [placement_bitboards(fen) for _, _, fen, _ in rows]
+            self._node_ids[start:stop] = [row[0] for row in rows]
+            self._line_ids[start:stop] = [row[1] for row in rows]
+            self._boards[start:stop] = np.array(boards, dtype=np.uint64)
+            self._counts[start:stop] = [[chess.popcount(bb) for bb in row] for row in boards]
+            self._size = stop
+        return len(rows)
+
+    def search(
+        self,
+        session: Session,
+        *,
+        pieces: dict[int, int] | None = None,
+        material: list[int] | None = None,
+        pawns: tuple[int, int] | None = None,
+        line_id: int | None = None,
+    ) -> list[int]:
+        """Node IDs matching every given criterion, in commit order.
+
+        ``pieces`` maps a column to squares that must all hold that piece,
+        ``material`` is an exact per-column count and ``pawns`` an exact
+        (white, black) pawn bitboard pair.
+        """
+        self.refresh(session)
+        with self._lock:
+            size = self._size
+            boards = self._boards[:size]
+            mask = np.ones(size, dtype=bool)
+            if line_id is not None:
+                mask &= self._line_ids[:size] == line_id
+            for column, squares in (pieces or {}).items():
+                required = np.uint64(squares)
+                mask &= (boards[:, column] & required) == required
+            if material is not None:
+                mask &= (self._counts[:size] == np.array(material, dtype=np.uint8)).all(axis=1)
+            if pawns is not None:
+                mask &= boards[:, _WHITE_PAWNS] == np.uint64(pawns[0])
+                mask &= boards[:, _BLACK_PAWNS] == np.uint64(pawns[1])
+            return self._node_ids[:size][mask].tolist()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset(_INITIAL_CAPACITY)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "nodes": self._size,
+                "capacity": len(self._node_ids),
+                "watermark": self._watermark,
+                "bytes": self._node_ids.nbytes + self._line_ids.nbytes + self._boards.nbytes + self._counts.nbytes,
+            }
+
+
+bitboard_index = BitboardIndex()
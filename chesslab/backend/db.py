@@ -1,25 +1,112 @@
-"""Database helpers for the chesslab backend."""
+"""Database helpers for the chesslab backend.
+
+Engines are built from a named storage profile (``DB_PROFILE``; by default
+the one matching the URI's dialect):
+
+``sqlite``
+    WAL journaling with ``synchronous=NORMAL``, a busy timeout, memory-mapped
+    I/O and a larger page cache, applied on every new connection, so the RQ
+    worker's commits no longer block API reads.
+``postgres``
+    A sized, pre-pinged, recycled connection pool and a larger compiled
+    statement cache (plus server-side prepared statements on psycopg 3).
+``default``
+    SQLAlchemy's defaults.
+
+``read_session`` serves read-only GET endpoints.  It is bound to
+``DATABASE_READ_URL`` (for example a streaming replica) when set, and to
+the primary database otherwise; flushing it raises.
+"""
 from __future__ import annotations
 
+import os
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import scoped_session, sessionmaker, DeclarativeBase
 
+from .env import env_int
+
 
 class Base(DeclarativeBase):
     pass
 
 
 _engine = None
+_read_engine = None
 Session = sessionmaker(autocommit=False, autoflush=False)
 db_session = scoped_session(Session)
+ReadSession = sessionmaker(autocommit=False, autoflush=False)
+read_session = scoped_session(ReadSession)
+
+PROFILES = ("default", "sqlite", "postgres")
+
+
+def default_profile(database_uri: str) -> str:
+    backend = make_url(database_uri).get_backend_name()
+    return {"sqlite": "sqlite", "postgresql": "postgres"}.get(backend, "default")
+
+
+def sqlite_pragmas() -> dict[str, str | int]:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "mmap_size": env_int("SQLITE_MMAP_MB", 256) * 1024 * 1024,
+        # Negative sizes are KiB rather than pages.
+        "cache_size": -env_int("SQLITE_CACHE_MB", 64) * 1024,
+        "temp_store": "MEMORY",
+    }
+
+
+def engine_options(database_uri: str, profile: str | None = None) -> dict:
+    """``create_engine`` keyword arguments for ``profile``."""
+    profile = profile or os.getenv("DB_PROFILE") or default_profile(database_uri)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown storage profile: {profile}")
+    if profile != "postgres":
+        return {}
+    options = {
+        "pool_size": env_int("DB_POOL_SIZE", 10),
+        "max_overflow": env_int("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+        # Most recently used first lets idle connections past pool_size age out.
+        "pool_use_lifo": True,
+        "query_cache_size": env_int("DB_STATEMENT_CACHE_SIZE", 1200),
+    }
+    if make_url(database_uri).get_driver_name() == "psycopg":
+        options["connect_args"] = {"prepare_threshold": env_int("DB_PREPARE_THRESHOLD", 5)}
+    return options
 
 
-def init_engine(database_uri: str) -> None:
-    global _engine
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def build_engine(database_uri: str, profile: str | None = None):
+    profile = profile or os.getenv("DB_PROFILE") or default_profile(database_uri)
+    engine = create_engine(database_uri, future=True, echo=False, **engine_options(database_uri, profile))
+    if profile == "sqlite" and make_url(database_uri).database not in (None, "", ":memory:"):
+        # In-memory databases cannot use WAL; the other pragmas gain nothing there.
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def init_engine(database_uri: str, *, profile: str | None = None, read_uri: str | None = None) -> None:
+    global _engine, _read_engine
     if _engine is None:
-        _engine = create_engine(database_uri, future=True, echo=False)
+        _engine = build_engine(database_uri, profile)
         Session.configure(bind=_engine)
+        _read_engine = build_engine(read_uri, profile) if read_uri else _engine
+        ReadSession.configure(bind=_read_engine)
 
 
 def get_engine():
@@ -28,6 +115,17 @@ def get_engine():
     return _engine
 
 
+def get_read_engine():
+    if _read_engine is None:
+        raise RuntimeError("Database engine not initialized")
+    return _read_engine
+
+
+@event.listens_for(ReadSession, "before_flush")
+def _refuse_writes(session, flush_context, instances) -> None:
+    raise RuntimeError("read_session is read-only; write through db_session")
+
+
 @contextmanager
 def session_scope():
     session = db_session()
@@ -0,0 +1,50 @@
+"""Compact encodings for positions and principal variations.
+
+Positions are keyed by their 64-bit Polyglot Zobrist hash, stored as a signed
+BIGINT.  Moves are packed into 16 bits (6 bits from-square, 6 bits to-square,
+3 bits promotion piece), so a PV costs two bytes per ply instead of five.
+"""
+from __future__ import annotations
+
+import struct
+
+import chess
+import chess.polyglot
+
+_PROMOTIONS = [None, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+
+def board_zobrist(board: chess.Board) -> int:
+    """Signed 64-bit Polyglot hash of ``board``."""
+    value = chess.polyglot.zobrist_hash(board)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def zobrist_key(fen: str) -> int | None:
+    """Signed 64-bit Polyglot hash of ``fen``, or ``None`` when it does not parse."""
+    try:
+        board = chess.Board(fen)
+    except ValueError:
+        return None
+    return board_zobrist(board)
+
+
+def encode_move(move: chess.Move) -> int:
+    if move.drop is not None:
+        raise ValueError(f"Drop moves cannot be packed: {move.uci()}")
+    return move.from_square | (move.to_square << 6) | (_PROMOTIONS.index(move.promotion) << 12)
+
+
+def decode_move(code: int) -> chess.Move:
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, _PROMOTIONS[(code >> 12) & 0x7])
+
+
+def pack_pv(pv_uci: str) -> bytes:
+    """Pack a space-separated UCI PV; raises ``ValueError`` on malformed moves."""
+    moves = [encode_move(chess.Move.from_uci(token)) for token in pv_uci.split()]
+    return struct.pack(f"<{len(moves)}H", *moves)
+
+
+def unpack_pv(blob: bytes) -> str:
+    codes = struct.unpack(f"<{len(blob) // 2}H", blob)
+    return " ".join(decode_move(code).uci() for code in codes)
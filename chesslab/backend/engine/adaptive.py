@@ -0,0 +1,69 @@
+"""Early stopping for searches whose result has settled.
+
+Quiet opening positions often reach their final best move and score many
+iterations before the requested depth.  :class:`StabilityMonitor` watches
+the per-depth snapshots of a streamed search and reports when the first
+line's best move has stayed the same, with its score inside a centipawn
+window, for ``iterations`` consecutive depths.  The engine clients then send
+UCI ``stop``.  Positions whose evaluation keeps moving never settle and still
+get the full depth budget.
+"""
+from __future__ import annotations
+
+import os
+
+from ..env import env_int
+
+ADAPTIVE_ENABLED = os.getenv("ANALYSIS_ADAPTIVE", "1") == "1"
+
+
+class StabilityMonitor:
+    def __init__(
+        self,
+        *,
+        window_cp: int | None = None,
+        iterations: int | None = None,
+        min_depth: int | None = None,
+    ) -> None:
+        self.window_cp = window_cp if window_cp is not None else env_int("ADAPTIVE_CP_WINDOW", 15)
+        self.iterations = iterations if iterations is not None else env_int("ADAPTIVE_ITERATIONS", 3)
+        self.min_depth = min_depth if min_depth is not None else env_int("ADAPTIVE_MIN_DEPTH", 10)
+        self.stable = False
+        self.stopped_at: int | None = None
+        # Consecutive iterations agreeing on (bestmove, mate score), with their cp scores.
+        self._key: tuple | None = None
+        self._run: list[tuple[int, int | None]] = []
+
+    def update(self, snapshot: list[dict]) -> bool:
+        """Record one snapshot; return ``True`` once the search may stop."""
+        if not snapshot or self.stable:
+            return self.stable
+        best = snapshot[0]
+        depth = best.get("depth")
+        if depth is None:
+            return False
+        if self._run and self._run[-1][0] == depth:
+            # A later snapshot of the same iteration replaces the earlier one.
+            self._run.pop()
+        key = (best.get("bestmove_uci"), best.get("score_mate"))
+        entry = (depth, best.get("score_cp"))
+        if self._run and key == self._key and self._within_window(entry[1]):
+            self._run.append(entry)
+        else:
+            self._key = key
+            self._run = [entry]
+        if depth >= self.min_depth and len(self._run) >= self.iterations:
+            self.stable = True
+            self.stopped_at = depth
+        return self.stable
+
+    def _within_window(self, score_cp: int | None) -> bool:
+        scores = [score for _, score in self._run if score is not None]
+        if score_cp is None or not scores:
+            return True
+        return max(scores + [score_cp]) - min(scores + [score_cp]) <= self.window_cp
+
+
+def make_monitor() -> StabilityMonitor | None:
+    """A fresh monitor when adaptive analysis is enabled, else ``None``."""
+    return StabilityMonitor() if ADAPTIVE_ENABLED else None
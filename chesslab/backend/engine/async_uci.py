@@ -0,0 +1,273 @@
+"""asyncio-native UCI client and engine pool.
+
+The threaded :class:`~.uci.UCIEngine` needs a reader thread per engine and
+blocks its caller while a search runs.  Here engine output is read from the
+subprocess pipe by the event loop, so one thread can drive many engines and
+many concurrent searches.  Output is parsed with the same
+:class:`~.parser.SnapshotAssembler`, so both clients report identical
+snapshots.
+
+Nothing in the application runs on it; it is a library for asyncio callers
+such as offline analysis scripts.  Server searches run in the RQ worker,
+a synchronous process that uses :mod:`.pool`.  ``python -m chesslab.serve``
+runs the web process on eventlet, whose monkey-patched pipes and locks
+already let the threaded client yield to other green threads, and an
+eventlet hub cannot drive an asyncio event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Iterable
+
+from ..metrics import ENGINE_SEARCH_SECONDS
+from .parser import SnapshotAssembler, is_pv_info
+from .pool import EnginePoolExhausted, PoolSettings
+from .uci import UCIEngineError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .adaptive import StabilityMonitor
+
+
+class AsyncUCIEngine:
+    search_timeout = 10.0
+
+    def __init__(self, command: str | None = None) -> None:
+        self.command = command or os.getenv("STOCKFISH_PATH", "stockfish")
+        self.process: asyncio.subprocess.Process | None = None
+
+    @classmethod
+    async def start(cls, command: str | None = None) -> "AsyncUCIEngine":
+        engine = cls(command)
+        if not shutil.which(engine.command):
+            raise UCIEngineError(f"Stockfish binary not found: {engine.command}")
+        engine.process = await asyncio.create_subprocess_exec(
+            engine.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        engine._send("uci")
+        await engine._wait_for("uciok")
+        return engine
+
+    async def close(self) -> None:
+        if self.process is not None and self.process.returncode is None:
+            self._send("quit")
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=2)
+            except asyncio.TimeoutError:  # pragma: no cover - defensive
+                self.process.kill()
+
+    async def __aenter__(self) -> "AsyncUCIEngine":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _send(self, command: str) -> None:
+        if self.process is None or self.process.stdin is None or self.process.stdin.is_closing():
+            raise UCIEngineError("Engine stdin closed")
+        # Pipe transports write immediately when they can and buffer otherwise.
+        self.process.stdin.write(command.encode("ascii") + b"\n")
+
+    async def _readline(self, timeout: float) -> bytes:
+        """Next line worth parsing; info lines without a PV are skipped."""
+        assert self.process is not None and self.process.stdout is not None
+        while True:
+            try:
+                line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+            except asyncio.TimeoutError as exc:
+                raise UCIEngineError("Engine timed out") from exc
+            if not line:
+                raise UCIEngineError("Engine exited")
+            if line.startswith(b"info") and not is_pv_info(line):
+                continue
+            return line.rstrip()
+
+    async def _wait_for(self, token: str, timeout: float = 5.0) -> None:
+        token = token.encode("ascii")
+        while token not in await self._readline(timeout):
+            pass
+
+    def set_option(self, name: str, value: str | int) -> None:
+        self._send(f"setoption name {name} value {value}")
+
+    def stop(self) -> None:
+        self._send("stop")
+
+    async def analyse(
+        self,
+        fen: str,
+        *,
+        depth: int | None = None,
+        movetime: int | None = None,
+        multipv: int = 3,
+        new_game: bool = True,
+        monitor: StabilityMonitor | None = None,
+    ) -> list[dict]:
+        results: list[dict] = []
+        async for results in self.analyse_stream(
+            fen, depth=depth, movetime=movetime, multipv=multipv, new_game=new_game, monitor=monitor
+        ):
+            pass
+        return results
+
+    async def analyse_stream(
+        self,
+        fen: str,
+        *,
+        depth: int | None = None,
+        movetime: int | None = None,
+        multipv: int = 3,
+        new_game: bool = True,
+        stop_event: asyncio.Event | None = None,
+        monitor: StabilityMonitor | None = None,
+    ) -> AsyncIterator[list[dict]]:
+        """Async counterpart of :meth:`.UCIEngine.analyse_stream`."""
+        if depth is None and movetime is None:
+            depth = 12
+        if new_game:
+            self._send("ucinewgame")
+        self._send(f"position fen {fen}")
+        self._send(f"setoption name MultiPV value {multipv}")
+        self._send(f"go depth {depth}" if depth is not None else f"go movetime {movetime}")
+
+        stopper = asyncio.ensure_future(self._stop_when_set(stop_event)) if stop_event is not None else None
+        assembler = SnapshotAssembler(multipv)
+        stop_sent = False
+        started = time.perf_counter()
+        outcome = "completed"
+        try:
+            while not assembler.finished:
+                for snapshot in assembler.feed(await self._readline(self.search_timeout)):
+                    yield snapshot
+                    if monitor is not None and not stop_sent and monitor.update(snapshot):
+                        self.stop()
+                        stop_sent = True
+        except GeneratorExit:
+            outcome = "abandoned"
+            self.stop()
+            await self._wait_for("bestmove", timeout=self.search_timeout)
+            raise
+        finally:
+            if stopper is not None:
+                stopper.cancel()
+            if (stop_sent or (stop_event is not None and stop_event.is_set())) and outcome == "completed":
+                outcome = "stopped"
+            ENGINE_SEARCH_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        snapshot = assembler.flush()
+        if snapshot is not None:
+            yield snapshot
+
+    async def _stop_when_set(self, stop_event: asyncio.Event) -> None:
+        await stop_event.wait()
+        self.stop()
+
+
+class AsyncEnginePool:
+    """Event-loop counterpart of :class:`.pool.EnginePool`, sized by the same :class:`.PoolSettings`."""
+
+    def __init__(
+        self,
+        settings: PoolSettings | None = None,
+        *,
+        factory: Callable[[], Awaitable[AsyncUCIEngine]] | None = None,
+    ) -> None:
+        self.settings = settings or PoolSettings.resolve()
+        self._factory = factory or AsyncUCIEngine.start
+        self._idle: list[AsyncUCIEngine] = []
+        self._spawned = 0
+        self._waiters = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+
+    async def _spawn(self) -> AsyncUCIEngine:
+        engine = await self._factory()
+        engine.set_option("Threads", self.settings.threads)
+        engine.set_option("Hash", self.settings.hash_mb)
+        return engine
+
+    async def checkout(self, timeout: float | None = None) -> AsyncUCIEngine:
+        timeout = self.settings.timeout if timeout is None else timeout
+        async with self._cond:
+            if self._closed:
+                raise UCIEngineError("Engine pool is closed")
+            if not self._idle and self._spawned >= self.settings.size:
+                if self._waiters >= self.settings.max_waiters:
+                    raise EnginePoolExhausted("Engine pool wait queue is full")
+                self._waiters += 1
+                try:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(lambda: self._closed or self._idle or self._spawned < self.settings.size),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    raise EnginePoolExhausted(f"No engine available after {timeout:.1f}s") from None
+                finally:
+                    self._waiters -= 1
+                if self._closed:
+                    raise UCIEngineError("Engine pool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._spawned += 1
+        try:
+            return await self._spawn()
+        except Exception:
+            async with self._cond:
+                self._spawned -= 1
+                self._cond.notify()
+            raise
+
+    async def checkin(self, engine: AsyncUCIEngine, *, discard: bool = False) -> None:
+        process = engine.process
+        alive = process.returncode is None if process is not None else True
+        drop = discard or not alive or self._closed
+        async with self._cond:
+            if drop:
+                self._spawned -= 1
+            else:
+                self._idle.append(engine)
+            self._cond.notify()
+        if drop:
+            try:
+                await engine.close()
+            except Exception:  # pragma: no cover - best effort cleanup
+                pass
+
+    @asynccontextmanager
+    async def session(self, timeout: float | None = None) -> AsyncIterator[AsyncUCIEngine]:
+        engine = await self.checkout(timeout)
+        failed = False
+        try:
+            yield engine
+        except UCIEngineError:
+            failed = True
+            raise
+        finally:
+            await self.checkin(engine, discard=failed)
+
+    async def analyse_many(
+        self, fens: Iterable[str], *, depth: int | None = None, multipv: int = 3
+    ) -> list[list[dict]]:
+        """Analyse positions concurrently, one search per engine, in input order."""
+        # Bound concurrency by the pool size so long lists never overflow the wait queue.
+        slots = asyncio.Semaphore(self.settings.size)
+
+        async def run(fen: str) -> list[dict]:
+            async with slots, self.session() as engine:
+                return await engine.analyse(fen, depth=depth, multipv=multipv)
+
+        return list(await asyncio.gather(*(run(fen) for fen in fens)))
+
+    async def close(self) -> None:
+        async with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._spawned -= len(idle)
+            self._cond.notify_all()
+        for engine in idle:
+            await engine.close()
@@ -0,0 +1,120 @@
+"""Single-pass parser for UCI engine output.
+
+Engine output is handled as raw bytes straight off the pipe.  Only ``info``
+lines that carry a principal variation are parsed; ``currmove``, ``hashfull``
+and ``string`` chatter is rejected with one substring test, which matters at
+high depth and MultiPV where it dominates the stream.  ``" pv "`` (with
+spaces) is the marker because a bare ``"pv"`` also matches ``multipv``.
+"""
+from __future__ import annotations
+
+_PV_MARKER = b" pv "
+_INT_FIELDS = {
+    b"depth": "depth",
+    b"multipv": "multipv",
+    b"nodes": "nodes",
+    b"nps": "nps",
+    b"time": "time",
+}
+_BOUNDS = {b"lowerbound": "lower", b"upperbound": "upper"}
+
+
+def is_pv_info(line: bytes) -> bool:
+    return line.startswith(b"info") and _PV_MARKER in line
+
+
+def parse_info(line: bytes) -> dict | None:
+    """Parse a PV ``info`` line, or return ``None`` for any other line.
+
+    The line is cut once at ``pv``; the ``score`` clause is lifted out and the
+    remaining tokens are plain ``key value`` pairs, so each field is found
+    with one dict lookup instead of a list scan.  Scores are reported as
+    ``score_cp`` or ``score_mate``; aspiration-window results additionally
+    carry ``bound`` (``"lower"`` or ``"upper"``).
+    """
+    if not line.startswith(b"info"):
+        return None
+    head, marker, pv = line.partition(_PV_MARKER)
+    if not marker:
+        return None
+    tokens = head.split()
+    info: dict = {}
+    if b"score" in tokens:
+        idx = tokens.index(b"score")
+        kind = tokens[idx + 1]
+        if kind == b"cp":
+            info["score_cp"] = int(tokens[idx + 2])
+        elif kind == b"mate":
+            info["score_mate"] = int(tokens[idx + 2])
+        bound = _BOUNDS.get(tokens[idx + 3]) if idx + 3 < len(tokens) else None
+        if bound is not None:
+            info["bound"] = bound
+            del tokens[idx:idx + 4]
+        else:
+            del tokens[idx:idx + 3]
+    pairs = dict(zip(tokens[1::2], tokens[2::2]))
+    for key, field in _INT_FIELDS.items():
+        value = pairs.get(key)
+        if value is not None:
+            info[field] = int(value)
+    pv_uci = pv.decode("ascii")
+    info["pv_uci"] = pv_uci
+    info["bestmove_uci"] = pv_uci.partition(" ")[0] or None
+    return info
+
+
+def parse_bestmove(line: bytes) -> str | None:
+    """Return the move from a ``bestmove`` line, or ``None`` for other lines."""
+    if not line.startswith(b"bestmove"):
+        return None
+    parts = line.split()
+    return parts[1].decode("ascii") if len(parts) > 1 else None
+
+
+class SnapshotAssembler:
+    """Group parsed ``info`` lines into one MultiPV snapshot per iteration.
+
+    Shared by the threaded and asyncio engine clients: feed every output line
+    and yield what :meth:`feed` returns; :attr:`finished` turns true at
+    ``bestmove``.
+    """
+
+    def __init__(self, multipv: int) -> None:
+        self.multipv = multipv
+        self.results: list[dict] = []
+        self.current_depth = 0
+        self.pending = False
+        self.finished = False
+
+    def _snapshot(self) -> list[dict]:
+        self.pending = False
+        return [dict(entry) for entry in self.results]
+
+    def feed(self, line: bytes) -> list[list[dict]]:
+        """Return the snapshots completed by ``line`` (usually none or one)."""
+        info = parse_info(line)
+        if info is None:
+            if line.startswith(b"bestmove"):
+                self.finished = True
+            return []
+        if "bound" in info:
+            # Aspiration-window results are superseded within the same iteration.
+            return []
+        snapshots = []
+        info_depth = int(info.get("depth", self.current_depth))
+        if info_depth > self.current_depth and self.pending:
+            # A new iteration started before every MultiPV line was reported.
+            snapshots.append(self._snapshot())
+        self.current_depth = info_depth
+        index = int(info.get("multipv", 1))
+        while len(self.results) < index:
+            self.results.append({"multipv": len(self.results) + 1})
+        self.results[index - 1].update(info)
+        self.pending = True
+        if index == self.multipv:
+            snapshots.append(self._snapshot())
+        return snapshots
+
+    def flush(self) -> list[dict] | None:
+        """The last incomplete snapshot, if the search ended mid-iteration."""
+        return self._snapshot() if self.pending else None
@@ -1,35 +1,220 @@
-"""Simple engine pool that keeps a single persistent Stockfish instance."""
+"""Engine pool that keeps several persistent Stockfish processes.
+
+Each engine is checked out exclusively for the duration of a session so that
+concurrent callers never interleave UCI commands on the same stdin.  Callers
+beyond the pool size wait in a bounded queue; once that queue is full new
+requests fail fast instead of piling up behind a saturated worker box.
+"""
 from __future__ import annotations
 
+import os
 import threading
 from contextlib import contextmanager
-from typing import Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterator
 
+from ..env import env_float, env_int
+from ..metrics import Gauge, registry
 from .uci import UCIEngine, UCIEngineError
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .adaptive import StabilityMonitor
+
+
+class EnginePoolExhausted(UCIEngineError):
+    """Raised when no engine could be checked out in time."""
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Sizing shared by :class:`EnginePool` and the asyncio pool."""
+
+    size: int
+    threads: int
+    hash_mb: int
+    max_waiters: int
+    timeout: float
+
+    @classmethod
+    def resolve(
+        cls,
+        size: int | None = None,
+        *,
+        threads: int | None = None,
+        hash_mb: int | None = None,
+        max_waiters: int | None = None,
+        timeout: float | None = None,
+    ) -> "PoolSettings":
+        """Settings with every value not given read from the ``ENGINE_*`` environment."""
+        size = max(1, size if size is not None else env_int("ENGINE_POOL_SIZE", os.cpu_count() or 1))
+        return cls(
+            size=size,
+            threads=threads if threads is not None else env_int("ENGINE_THREADS", 1),
+            hash_mb=hash_mb if hash_mb is not None else env_int("ENGINE_HASH_MB", 64),
+            max_waiters=max_waiters if max_waiters is not None else env_int("ENGINE_POOL_MAX_WAITERS", 4 * size),
+            timeout=timeout if timeout is not None else env_float("ENGINE_CHECKOUT_TIMEOUT", 30.0),
+        )
+
+
+class EnginePool:
+    """Fixed-size pool of UCI engines with exclusive checkout/checkin."""
+
+    def __init__(
+        self,
+        size: int | None = None,
+        *,
+        threads: int | None = None,
+        hash_mb: int | None = None,
+        max_waiters: int | None = None,
+        timeout: float | None = None,
+        factory: Callable[[], UCIEngine] | None = None,
+    ) -> None:
+        self.settings = PoolSettings.resolve(
+            size, threads=threads, hash_mb=hash_mb, max_waiters=max_waiters, timeout=timeout
+        )
+        self._factory = factory or UCIEngine
+        self._idle: list[UCIEngine] = []
+        self._spawned = 0
+        self._waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _spawn(self) -> UCIEngine:
+        engine = self._factory()
+        engine.set_option("Threads", self.settings.threads)
+        engine.set_option("Hash", self.settings.hash_mb)
+        return engine
+
+    def checkout(self, timeout: float | None = None) -> UCIEngine:
+        """Return an engine reserved for the caller until :meth:`checkin`."""
+        timeout = self.settings.timeout if timeout is None else timeout
+        with self._cond:
+            if self._closed:
+                raise UCIEngineError("Engine pool is closed")
+            if not self._idle and self._spawned >= self.settings.size:
+                if self._waiters >= self.settings.max_waiters:
+                    raise EnginePoolExhausted("Engine pool wait queue is full")
+                self._waiters += 1
+                try:
+                    ready = self._cond.wait_for(
+                        lambda: self._closed or self._idle or self._spawned < self.settings.size, timeout=timeout
+                    )
+                finally:
+                    self._waiters -= 1
+                if not ready:
+                    raise EnginePoolExhausted(f"No engine available after {timeout:.1f}s")
+                if self._closed:
+                    raise UCIEngineError("Engine pool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._spawned += 1
+
+        # Spawning talks to a subprocess, so do it outside the pool lock.
+        try:
+            return self._spawn()
+        except Exception:
+            with self._cond:
+                self._spawned -= 1
+                self._cond.notify()
+            raise
+
+    def checkin(self, engine: UCIEngine, *, discard: bool = False) -> None:
+        """Return ``engine`` to the pool, or drop it when it is unhealthy."""
+        alive = engine.process.poll() is None if getattr(engine, "process", None) else True
+        with self._cond:
+            if discard or not alive or self._closed:
+                self._spawned -= 1
+            else:
+                self._idle.append(engine)
+            self._cond.notify()
+        if discard or not alive or self._closed:
+            try:
+                engine.close()
+            except Exception:  # pragma: no cover - best effort cleanup
+                pass
 
-_engine: UCIEngine | None = None
+    @contextmanager
+    def session(self, timeout: float | None = None) -> Iterator[UCIEngine]:
+        engine = self.checkout(timeout)
+        failed = False
+        try:
+            yield engine
+        except UCIEngineError:
+            # A timed-out engine may still be mid-search; never hand it out again.
+            failed = True
+            raise
+        finally:
+            self.checkin(engine, discard=failed)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "size": self.settings.size,
+                "spawned": self._spawned,
+                "idle": len(self._idle),
+                "busy": self._spawned - len(self._idle),
+                "waiters": self._waiters,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._spawned -= len(idle)
+            self._cond.notify_all()
+        for engine in idle:
+            engine.close()
+
+
+_pool: EnginePool | None = None
 _lock = threading.Lock()
 
 
-def _get_engine() -> UCIEngine:
-    global _engine
+def get_pool() -> EnginePool:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = EnginePool()
+        return _pool
+
+
+def configure(**kwargs) -> EnginePool:
+    """Replace the process-wide pool, closing the previous one."""
+    global _pool
     with _lock:
-        if _engine is None:
-            _engine = UCIEngine()
-        return _engine
+        previous, _pool = _pool, EnginePool(**kwargs)
+    if previous is not None:
+        previous.close()
+    return _pool
+
+
+def _pool_state() -> list[tuple[tuple, float]]:
+    stats = _pool.stats() if _pool is not None else {}
+    return [((state,), stats[state]) for state in ("idle", "busy", "waiters") if state in stats]
+
+
+Gauge(registry, "chesslab_engine_pool", "Engines in this process's pool by state, and callers waiting.", ("state",), _pool_state)
 
 
 @contextmanager
-def engine_session() -> Iterator[UCIEngine]:
-    engine = _get_engine()
-    try:
+def engine_session(timeout: float | None = None) -> Iterator[UCIEngine]:
+    with get_pool().session(timeout) as engine:
         yield engine
-    finally:
-        pass
 
 
-def analyse(fen: str, *, depth: int | None = None, multipv: int = 3):
+def analyse(fen: str, *, depth: int | None = None, multipv: int = 3, monitor: StabilityMonitor | None = None):
+    with engine_session() as engine:
+        return engine.analyse(fen, depth=depth, multipv=multipv, monitor=monitor)
+
+
+def analyse_stream(
+    fen: str,
+    *,
+    depth: int | None = None,
+    multipv: int = 3,
+    stop_event: threading.Event | None = None,
+    monitor: StabilityMonitor | None = None,
+) -> Iterator[list[dict]]:
+    """Stream per-depth snapshots; the engine is held until the generator finishes."""
     with engine_session() as engine:
-        engine.set_option("MultiPV", multipv)
-        return engine.analyse(fen, depth=depth, multipv=multipv)
+        yield from engine.analyse_stream(fen, depth=depth, multipv=multipv, stop_event=stop_event, monitor=monitor)
@@ -5,7 +5,15 @@ import os
 import shutil
 import subprocess
 import threading
+import time
 from queue import Queue, Empty
+from typing import TYPE_CHECKING, Iterator
+
+from ..metrics import ENGINE_SEARCH_SECONDS
+from .parser import SnapshotAssembler, is_pv_info
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .adaptive import StabilityMonitor
 
 
 class UCIEngineError(RuntimeError):
@@ -13,6 +21,11 @@ class UCIEngineError(RuntimeError):
 
 
 class UCIEngine:
+    poll_interval = 0.1
+    search_timeout = 10.0
+    # Monotonic time of the engine's latest output line, including dropped ones.
+    last_output = 0.0
+
     def __init__(self, command: str | None = None) -> None:
         self.command = command or os.getenv("STOCKFISH_PATH", "stockfish")
         if not shutil.which(self.command):
@@ -21,11 +34,9 @@ class UCIEngine:
             [self.command],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
+            stderr=subprocess.DEVNULL,
         )
-        self.stdout_queue: Queue[str] = Queue()
+        self.stdout_queue: Queue[bytes] = Queue()
         self.listener = threading.Thread(target=self._enqueue_output, daemon=True)
         self.listener.start()
         self._send("uci")
@@ -37,17 +48,27 @@ class UCIEngine:
             self.process.wait(timeout=2)
 
     def _enqueue_output(self) -> None:
+        """Forward engine output as bytes, dropping info lines without a PV.
+
+        Dropped lines still count as output, so ``currmove``/``nodes`` progress
+        keeps a long iteration from tripping the search timeout.
+        """
         assert self.process.stdout is not None
+        put = self.stdout_queue.put
         for line in self.process.stdout:
-            self.stdout_queue.put(line.strip())
+            self.last_output = time.monotonic()
+            if line.startswith(b"info") and not is_pv_info(line):
+                continue
+            put(line.rstrip())
 
     def _send(self, command: str) -> None:
         if not self.process.stdin:
             raise UCIEngineError("Engine stdin closed")
-        self.process.stdin.write(command + "\n")
+        self.process.stdin.write(command.encode("ascii") + b"\n")
         self.process.stdin.flush()
 
     def _wait_for(self, token: str, timeout: float = 5.0) -> None:
+        token = token.encode("ascii")
         while True:
             try:
                 line = self.stdout_queue.get(timeout=timeout)
@@ -59,10 +80,55 @@ class UCIEngine:
     def set_option(self, name: str, value: str | int) -> None:
         self._send(f"setoption name {name} value {value}")
 
-    def analyse(self, fen: str, *, depth: int | None = None, movetime: int | None = None, multipv: int = 3):
+    def stop(self) -> None:
+        """Ask the engine to finish the current search as soon as possible."""
+        self._send("stop")
+
+    def analyse(
+        self,
+        fen: str,
+        *,
+        depth: int | None = None,
+        movetime: int | None = None,
+        multipv: int = 3,
+        new_game: bool = True,
+        monitor: StabilityMonitor | None = None,
+    ):
+        """Search ``fen`` and return the final info line per MultiPV index.
+
+        Pass ``new_game=False`` when analysing positions related to the previous
+        search so the engine keeps its hash table warm.
+        """
+        results: list[dict] = []
+        for results in self.analyse_stream(
+            fen, depth=depth, movetime=movetime, multipv=multipv, new_game=new_game, monitor=monitor
+        ):
+            pass
+        return results
+
+    def analyse_stream(
+        self,
+        fen: str,
+        *,
+        depth: int | None = None,
+        movetime: int | None = None,
+        multipv: int = 3,
+        new_game: bool = True,
+        stop_event: threading.Event | None = None,
+        monitor: StabilityMonitor | None = None,
+    ) -> Iterator[list[dict]]:
+        """Yield a MultiPV snapshot each time the engine completes an iteration.
+
+        Setting ``stop_event`` sends UCI ``stop``; the generator then yields the
+        engine's final lines and ends.  A ``monitor`` stops the search the same
+        way once it reports the result stable.  Closing the generator early also stops
+        the search and drains output up to ``bestmove`` so the engine can be
+        reused.
+        """
         if depth is None and movetime is None:
             depth = 12
-        self._send("ucinewgame")
+        if new_game:
+            self._send("ucinewgame")
         self._send(f"position fen {fen}")
         self._send(f"setoption name MultiPV value {multipv}")
         if depth is not None:
@@ -70,43 +136,41 @@ class UCIEngine:
         elif movetime is not None:
             self._send(f"go movetime {movetime}")
 
-        results: list[dict] = []
-        while True:
-            try:
-                line = self.stdout_queue.get(timeout=10)
-            except Empty as exc:  # pragma: no cover
-                raise UCIEngineError("Engine timed out") from exc
-            if line.startswith("info") and "pv" in line:
-                results = self._parse_info(line, results)
-            elif line.startswith("bestmove"):
-                break
-        return sorted(results, key=lambda r: r["multipv"])
-
-    def _parse_info(self, line: str, results: list[dict]) -> list[dict]:
-        parts = line.split()
-        info: dict[str, int | str] = {}
-        if "multipv" in parts:
-            info["multipv"] = int(parts[parts.index("multipv") + 1])
-        if "depth" in parts:
-            info["depth"] = int(parts[parts.index("depth") + 1])
-        if "score" in parts:
-            idx = parts.index("score")
-            score_type = parts[idx + 1]
-            score_value = int(parts[idx + 2])
-            if score_type == "cp":
-                info["score_cp"] = score_value
-            elif score_type == "mate":
-                info["score_mate"] = score_value
-        if "pv" in parts:
-            pv_index = parts.index("pv") + 1
-            pv_moves = parts[pv_index:]
-            info["pv_uci"] = " ".join(pv_moves)
-            info["bestmove_uci"] = pv_moves[0] if pv_moves else None
-        multipv = int(info.get("multipv", 1))
-        while len(results) < multipv:
-            results.append({"multipv": len(results) + 1})
-        results[multipv - 1].update(info)
-        return results
+        assembler = SnapshotAssembler(multipv)
+        stop_sent = False
+        started = time.perf_counter()
+        last_seen = time.monotonic()
+        outcome = "completed"
+        try:
+            while not assembler.finished:
+                if stop_event is not None and not stop_sent and stop_event.is_set():
+                    self.stop()
+                    stop_sent = True
+                try:
+                    line = self.stdout_queue.get(timeout=self.poll_interval)
+                except Empty:
+                    last_seen = max(last_seen, self.last_output)
+                    if time.monotonic() - last_seen >= self.search_timeout:  # pragma: no cover
+                        raise UCIEngineError("Engine timed out")
+                    continue
+                last_seen = time.monotonic()
+                for snapshot in assembler.feed(line):
+                    yield snapshot
+                    if monitor is not None and not stop_sent and monitor.update(snapshot):
+                        self.stop()
+                        stop_sent = True
+        except GeneratorExit:
+            outcome = "abandoned"
+            self.stop()
+            self._wait_for("bestmove", timeout=self.search_timeout)
+            raise
+        finally:
+            if stop_sent and outcome == "completed":
+                outcome = "stopped"
+            ENGINE_SEARCH_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        snapshot = assembler.flush()
+        if snapshot is not None:
+            yield snapshot
 
 
 def analyse(fen: str, *, depth: int | None = None, movetime: int | None = None, multipv: int = 3):
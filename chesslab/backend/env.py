@@ -0,0 +1,16 @@
+"""Typed readers for numeric settings taken from the environment."""
+from __future__ import annotations
+
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    """``int`` value of ``name``, or ``default`` when it is unset or empty."""
+    raw = os.getenv(name)
+    return int(raw) if raw else default
+
+
+def env_float(name: str, default: float) -> float:
+    """``float`` value of ``name``, or ``default`` when it is unset or empty."""
+    raw = os.getenv(name)
+    return float(raw) if raw else default
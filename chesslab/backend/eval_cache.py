@@ -0,0 +1,231 @@
+"""Tiered evaluation cache: in-process LRU, then Redis, then SQL.
+
+Entries are keyed by position and hold the deepest stored result set for it.
+A deeper result always answers a shallower request, so a depth-22 search
+satisfies a client asking for depth 12.  A server search that stopped early
+because its result settled keeps the depth it reached but answers requests
+up to the depth it was asked for (``Eval.requested_depth``).  Writers call :meth:`EvalCache.invalidate`
+after committing; in-process entries also expire after a short TTL so that
+writes made by another process (the RQ worker) become visible without a
+shared invalidation channel.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from redis import Redis, RedisError
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .metrics import Gauge, registry, stats_collector
+from .models import Eval
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_eval(ev: Eval) -> dict:
+    """Node-independent representation of a stored evaluation line."""
+    return {
+        "id": ev.id,
+        "position_id": ev.position_id,
+        "depth": ev.depth,
+        "multipv": ev.multipv,
+        "pv_uci": ev.pv_uci,
+        "score_cp": ev.score_cp,
+        "score_mate": ev.score_mate,
+        "bestmove_uci": ev.bestmove_uci,
+        "engine_mode": ev.engine_mode,
+        "created_at": ev.created_at.isoformat() if ev.created_at else None,
+    }
+
+
+# The deepest request a stored row answers.
+_covers = func.coalesce(Eval.requested_depth, Eval.depth)
+
+
+def _satisfies(entry: dict, depth: int, multipv: int) -> bool:
+    # Entries cached before ``covers`` existed only answer up to their own depth.
+    return entry.get("covers", entry["depth"]) >= depth and len(entry["evals"]) >= multipv
+
+
+class EvalCache:
+    def __init__(self, max_entries: int = 10_000, ttl: float = 30.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis: Redis | None = None
+        self.redis_ttl = 3600
+        self.redis_prefix = "chesslab:eval:"
+        self._entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "lru_hits": 0,
+            "redis_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def configure(
+        self,
+        *,
+        max_entries: int | None = None,
+        ttl: float | None = None,
+        redis_url: str | None = None,
+        redis_ttl: int | None = None,
+    ) -> None:
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if ttl is not None:
+            self.ttl = ttl
+        if redis_ttl is not None:
+            self.redis_ttl = redis_ttl
+        self.redis = Redis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=0.5) if redis_url else None
+        self.clear()
+
+    def lookup(
+        self, session: Session, position_id: int, depth: int, multipv: int, *, shared_only: bool = False
+    ) -> list[dict]:
+        """Return the deepest stored lines with ``depth`` or more, up to ``multipv``.
+
+        ``shared_only`` skips the in-process tier, which may lag another
+        process's writes by up to ``ttl``; Redis and SQL are invalidated
+        before writers bump response-cache versions.
+        """
+        entry = None if shared_only else self._lru_get(position_id)
+        if entry is not None and _satisfies(entry, depth, multipv):
+            self._count("lru_hits")
+            return entry["evals"][:multipv]
+
+        entry = self._redis_get(position_id)
+        if entry is not None and _satisfies(entry, depth, multipv):
+            self._count("redis_hits")
+            self._lru_put(position_id, entry)
+            return entry["evals"][:multipv]
+
+        entry = self._db_get(session, position_id, depth, multipv)
+        if entry is None:
+            self._count("misses")
+            return []
+        self._count("db_hits")
+        self._lru_put(position_id, entry)
+        self._redis_put(position_id, entry)
+        return entry["evals"][:multipv]
+
+    def invalidate(self, position_id: int) -> None:
+        with self._lock:
+            self._entries.pop(position_id, None)
+            self._counters["invalidations"] += 1
+        if self.redis is not None:
+            try:
+                self.redis.delete(self.redis_prefix + str(position_id))
+            except RedisError:
+                logger.warning("Failed to invalidate Redis eval cache for position %s", position_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self._counters, "size": len(self._entries), "max_entries": self.max_entries}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _lru_get(self, position_id: int) -> dict | None:
+        with self._lock:
+            item = self._entries.get(position_id)
+            if item is None:
+                return None
+            stored_at, entry = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[position_id]
+                return None
+            self._entries.move_to_end(position_id)
+            return entry
+
+    def _lru_put(self, position_id: int, entry: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[position_id] = (time.monotonic(), entry)
+            self._entries.move_to_end(position_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _redis_get(self, position_id: int) -> dict | None:
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.get(self.redis_prefix + str(position_id))
+        except RedisError:
+            return None
+        return json.loads(raw) if raw else None
+
+    def _redis_put(self, position_id: int, entry: dict) -> None:
+        """Fill Redis from SQL unless it already holds a deeper entry.
+
+        A reader that loaded a shallow row can finish after another process
+        cached a deeper one; the WATCH makes the depth check and the write
+        atomic, and a fill that loses the race is simply dropped.
+        """
+        if self.redis is None:
+            return
+        key = self.redis_prefix + str(position_id)
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.watch(key)
+                raw = pipe.get(key)
+                if raw and json.loads(raw)["depth"] > entry["depth"]:
+                    pipe.unwatch()
+                    return
+                pipe.multi()
+                pipe.set(key, json.dumps(entry), ex=self.redis_ttl)
+                pipe.execute()
+        except RedisError:  # including WatchError
+            pass
+
+    def _db_get(self, session: Session, position_id: int, depth: int, multipv: int) -> dict | None:
+        rows = (
+            session.query(Eval)
+            .filter(Eval.position_id == position_id, _covers >= depth)
+            .order_by(Eval.depth.desc(), Eval.multipv, Eval.created_at.desc())
+            .all()
+        )
+        by_depth: dict[int, dict[int, Eval]] = {}
+        for ev in rows:
+            # Several engine modes may store the same line; keep the newest.
+            by_depth.setdefault(ev.depth, {}).setdefault(ev.multipv, ev)
+        if not by_depth:
+            return None
+        # Prefer the deepest result that covers every requested line, else the deepest at all.
+        chosen = next((d for d, lines in by_depth.items() if len(lines) >= multipv), next(iter(by_depth)))
+        lines = by_depth[chosen]
+        covers = min(max(ev.depth, ev.requested_depth or 0) for ev in lines.values())
+        return {"depth": chosen, "covers": covers, "evals": [serialize_eval(lines[idx]) for idx in sorted(lines)]}
+
+
+eval_cache = EvalCache()
+
+Gauge(
+    registry,
+    "chesslab_eval_cache_events_total",
+    "Eval cache lookups by tier that answered, plus evictions and invalidations.",
+    ("event",),
+    stats_collector(eval_cache.stats, keys=("lru_hits", "redis_hits", "db_hits", "misses", "evictions", "invalidations")),
+    kind="counter",
+)
+Gauge(
+    registry,
+    "chesslab_eval_cache_entries",
+    "Entries in the in-process eval cache.",
+    (),
+    lambda: [((), eval_cache.stats()["size"])],
+)
@@ -0,0 +1,154 @@
+"""Set-based persistence for engine evaluations.
+
+All writers (the analysis worker, batch analysis and the client upload
+endpoint) go through :func:`upsert_evals`, which writes any number of lines
+for any number of positions in one ``INSERT ... ON CONFLICT DO UPDATE``
+against the unique ``(position_id, depth, multipv, engine_mode)`` index.
+Concurrent writers therefore update the same row instead of racing to
+insert duplicates.
+
+The same call maintains ``eval_summaries``: the best line of each
+position's deepest evaluation, which backs the per-line eval curve.  Its
+upsert only replaces a summary with one at least as deep, so writers of
+shallower results (in any order) never regress it.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import case, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import Eval, EvalSummary, pack_pv_column
+
+EVAL_KEY = ("position_id", "depth", "multipv", "engine_mode")
+# Attribute names; ``pv_text`` is stored in the ``pv_uci`` column.
+_UPDATED = ("pv_packed", "pv_text", "score_cp", "score_mate", "bestmove_uci", "created_at")
+_UPDATED_COLUMNS = [Eval.__mapper__.columns[name].name for name in _UPDATED]
+_SUMMARY_COLUMNS = ("depth", "score_cp", "score_mate", "bestmove_uci", "engine_mode", "updated_at")
+_DIALECT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+# Rows per statement; each row binds eleven parameters and SQLite caps a statement at 32766.
+_CHUNK = 1000
+
+
+def eval_row(
+    position_id: int, depth: int, engine_mode: str, result: dict, *, requested_depth: int | None = None
+) -> dict:
+    """Column values for one engine line, as accepted by :func:`upsert_evals`."""
+    pv_packed, pv_text = pack_pv_column(result.get("pv_uci"))
+    return {
+        "position_id": position_id,
+        "depth": depth,
+        "requested_depth": requested_depth,
+        "multipv": result.get("multipv", 1),
+        "engine_mode": engine_mode,
+        "pv_packed": pv_packed,
+        "pv_text": pv_text,
+        "score_cp": result.get("score_cp"),
+        "score_mate": result.get("score_mate"),
+        "bestmove_uci": result.get("bestmove_uci"),
+    }
+
+
+def upsert_evals(session: Session, rows: Iterable[dict]) -> list[Eval]:
+    """Insert or overwrite evaluation rows, returning the stored ``Eval`` objects.
+
+    Rows repeating a key keep the last value.  The caller commits.
+    """
+    now = datetime.utcnow()
+    unique: dict[tuple, dict] = {}
+    for row in rows:
+        unique[tuple(row[column] for column in EVAL_KEY)] = {"created_at": now, **row}
+    if not unique:
+        return []
+
+    make_insert = _dialect_insert(session)
+    values = list(unique.values())
+    stored: list[Eval] = []
+    for start in range(0, len(values), _CHUNK):
+        stmt = make_insert(Eval).values(values[start:start + _CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(EVAL_KEY),
+            set_={
+                **{column: stmt.excluded[column] for column in _UPDATED_COLUMNS},
+                "requested_depth": _deepest(Eval.requested_depth, stmt.excluded.requested_depth),
+            },
+        ).returning(Eval)
+        stored.extend(session.scalars(stmt, execution_options={"populate_existing": True}).all())
+    stored.sort(key=lambda ev: (ev.position_id, ev.depth, ev.multipv))
+    _upsert_summaries(session, values)
+    return stored
+
+
+def rebuild_summaries(session: Session) -> int:
+    """Recompute every eval summary from the stored evals; returns the number of positions.
+
+    Only needed for evals written before summaries existed.  The caller commits.
+    """
+    rows = session.execute(
+        select(
+            Eval.position_id,
+            Eval.depth,
+            Eval.multipv,
+            Eval.score_cp,
+            Eval.score_mate,
+            Eval.bestmove_uci,
+            Eval.engine_mode,
+            Eval.created_at,
+        )
+        .where(Eval.multipv == 1)
+        .order_by(Eval.position_id, Eval.depth, Eval.created_at)
+    ).mappings()
+    return _upsert_summaries(session, rows)
+
+
+def _deepest(current, incoming):
+    """The larger of two nullable depths, so a shallower request never lowers what a row answers."""
+    return case(
+        (current.is_(None), incoming),
+        (incoming > current, incoming),
+        else_=current,
+    )
+
+
+def _dialect_insert(session: Session):
+    dialect = session.get_bind().dialect.name
+    try:
+        return _DIALECT_INSERTS[dialect]
+    except KeyError:
+        raise NotImplementedError(f"Eval upserts are not supported on {dialect}") from None
+
+
+def _upsert_summaries(session: Session, rows: Iterable[dict]) -> int:
+    best: dict[int, dict] = {}
+    for row in rows:
+        current = best.get(row["position_id"])
+        # Later rows win ties, matching the last-value-wins rule of upsert_evals.
+        if row["multipv"] == 1 and (current is None or row["depth"] >= current["depth"]):
+            best[row["position_id"]] = row
+    if not best:
+        return 0
+    make_insert = _dialect_insert(session)
+    values = [
+        {
+            "position_id": position_id,
+            "depth": row["depth"],
+            "score_cp": row.get("score_cp"),
+            "score_mate": row.get("score_mate"),
+            "bestmove_uci": row.get("bestmove_uci"),
+            "engine_mode": row["engine_mode"],
+            "updated_at": row["created_at"],
+        }
+        for position_id, row in best.items()
+    ]
+    for start in range(0, len(values), _CHUNK):
+        stmt = make_insert(EvalSummary).values(values[start:start + _CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["position_id"],
+            set_={column: stmt.excluded[column] for column in _SUMMARY_COLUMNS},
+            where=stmt.excluded.depth >= EvalSummary.depth,
+        )
+        session.execute(stmt)
+    return len(values)
@@ -0,0 +1,111 @@
+"""In-memory repertoire explorer index.
+
+Maps a position's Zobrist key to every move the repertoire plays from it,
+with how many nodes play it and which lines and openings they belong to.
+The index is built lazily on first use and then kept current incrementally:
+:meth:`RepertoireIndex.refresh` loads only nodes stamped with a repertoire
+version above the highest seen so far, so rows written by other processes
+(the import worker) are picked up with one indexed query.  Versions, unlike
+IDs, become visible in commit order (see :mod:`.sync`), so a long import
+that commits after a later ``add_node`` is not skipped.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+
+import chess
+from sqlalchemy.orm import Session, aliased
+
+from .encoding import board_zobrist, zobrist_key
+from .models import Line, Node
+
+START_ZOBRIST = board_zobrist(chess.Board())
+
+
+@dataclass
+class MoveStats:
+    count: int = 0
+    position_id: int | None = None
+    line_ids: set[int] = field(default_factory=set)
+    opening_ids: set[int] = field(default_factory=set)
+
+    def copy(self) -> "MoveStats":
+        return MoveStats(self.count, self.position_id, set(self.line_ids), set(self.opening_ids))
+
+
+class RepertoireIndex:
+    def __init__(self) -> None:
+        self._moves: dict[int, dict[str, MoveStats]] = {}
+        # Versions start at 0 for rows written before they were stamped.
+        self._watermark = -1
+        # Updated nodes are restamped; their move is already counted.
+        self._seen: set[int] = set()
+        self._built = False
+        self._lock = threading.Lock()
+
+    def moves(self, session: Session, zobrist: int) -> dict[str, MoveStats]:
+        """Copies of the stats for moves from ``zobrist``, safe to read while refreshes run."""
+        self.refresh(session)
+        with self._lock:
+            return {san: stats.copy() for san, stats in self._moves.get(zobrist, {}).items()}
+
+    def refresh(self, session: Session) -> int:
+        """Load nodes written since the last refresh; returns how many were added."""
+        with self._lock:
+            watermark = self._watermark
+        parent = aliased(Node)
+        rows = (
+            session.query(
+                Node.id,
+                Node.version,
+                Node.san,
+                Node.line_id,
+                Line.opening_id,
+                Node.position_id,
+                parent.zobrist,
+                parent.fen,
+            )
+            .join(Line, Line.id == Node.line_id)
+            .outerjoin(parent, parent.id == Node.parent_id)
+            .filter(Node.version > watermark)
+            .order_by(Node.version, Node.id)
+            .all()
+        )
+        added = 0
+        with self._lock:
+            for node_id, _, san, line_id, opening_id, position_id, parent_zobrist, parent_fen in rows:
+                if node_id in self._seen:
+                    continue  # restamped, or another thread loaded it first
+                self._seen.add(node_id)
+                added += 1
+                if parent_fen is None:
+                    key = START_ZOBRIST
+                else:
+                    key = parent_zobrist if parent_zobrist is not None else zobrist_key(parent_fen)
+                if key is None:
+                    continue
+                stats = self._moves.setdefault(key, {}).setdefault(san, MoveStats())
+                stats.count += 1
+                stats.line_ids.add(line_id)
+                stats.opening_ids.add(opening_id)
+                if stats.position_id is None:
+                    stats.position_id = position_id
+            if rows:
+                self._watermark = max(self._watermark, rows[-1][1])
+            self._built = True
+        return added
+
+    def clear(self) -> None:
+        with self._lock:
+            self._moves.clear()
+            self._watermark = -1
+            self._seen.clear()
+            self._built = False
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"positions": len(self._moves), "watermark": self._watermark, "built": int(self._built)}
+
+
+repertoire_index = RepertoireIndex()
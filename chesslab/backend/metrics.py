@@ -0,0 +1,311 @@
+"""Prometheus metrics and per-request instrumentation.
+
+A small self-contained registry rendered in the Prometheus text format at
+``/metrics``.  Counters and histograms live in-process; metrics declared
+``shared`` (those recorded by the RQ worker, such as engine search time) are
+accumulated in Redis hashes instead, so the web process can report them.
+
+:func:`init_app` times every request and counts the SQL statements it issues
+(reported as metrics and in a ``Server-Timing`` header).  With
+``REQUEST_PROFILING`` enabled, a request sent with ``X-Profile: 1`` runs
+under cProfile and its stats are written to ``PROFILE_DIR``.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+from flask import Flask, Response, g, has_request_context, request
+from redis import Redis, RedisError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# A sample key: label values in declaration order plus a suffix ("" for counters;
+# "sum", "count" or a bucket bound for histograms).
+SampleKey = tuple
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+        self._samples: dict[str, dict[SampleKey, float]] = {}
+        self._lock = threading.Lock()
+        self.redis: Redis | None = None
+        self.redis_prefix = "chesslab:metrics:"
+
+    def configure(self, *, redis_url: str | None = None) -> None:
+        self.redis = Redis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=0.5) if redis_url else None
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics.append(metric)
+        self._samples[metric.name] = {}
+
+    def add(self, metric: "_Metric", increments: dict[SampleKey, float]) -> None:
+        if metric.shared and self.redis is not None:
+            try:
+                with self.redis.pipeline(transaction=False) as pipe:
+                    for key, amount in increments.items():
+                        pipe.hincrbyfloat(self.redis_prefix + metric.name, json.dumps(key), amount)
+                    pipe.execute()
+                return
+            except RedisError:
+                logger.debug("Redis unavailable; keeping %s in-process", metric.name)
+        with self._lock:
+            samples = self._samples[metric.name]
+            for key, amount in increments.items():
+                samples[key] = samples.get(key, 0.0) + amount
+
+    def samples(self, metric: "_Metric") -> dict[SampleKey, float]:
+        with self._lock:
+            samples = dict(self._samples[metric.name])
+        if metric.shared and self.redis is not None:
+            try:
+                stored = self.redis.hgetall(self.redis_prefix + metric.name)
+            except RedisError:
+                stored = {}
+            for field, value in stored.items():
+                key = tuple(json.loads(field))
+                samples[key] = samples.get(key, 0.0) + float(value)
+        return samples
+
+    def clear(self) -> None:
+        with self._lock:
+            for samples in self._samples.values():
+                samples.clear()
+
+    def render(self) -> str:
+        out: list[str] = []
+        for metric in self._metrics:
+            try:
+                lines = metric.render(self.samples(metric) if not isinstance(metric, Gauge) else {})
+            except Exception as exc:  # a failing collector must not break the whole scrape
+                logger.warning("Failed to collect %s: %s", metric.name, exc)
+                continue
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def _labels(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: Registry, name: str, help: str, labels: tuple[str, ...] = (), *, shared: bool = False):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.shared = shared
+        registry.register(self)
+
+    def _values(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self.registry.add(self, {(*self._values(labels), ""): amount})
+
+    def render(self, samples: dict[SampleKey, float]) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, key[:-1])} {_number(value)}" for key, value in sorted(samples.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        values = self._values(labels)
+        increments = {(*values, "sum"): value, (*values, "count"): 1.0}
+        # Only the first bucket the value fits is stored; buckets are made cumulative on render.
+        bound = next((bound for bound in self.buckets if value <= bound), None)
+        if bound is not None:
+            increments[(*values, _number(bound))] = 1.0
+        self.registry.add(self, increments)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the block's wall time; also usable as a function decorator."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, samples: dict[SampleKey, float]) -> list[str]:
+        series: dict[tuple, dict[str, float]] = {}
+        for key, value in samples.items():
+            series.setdefault(key[:-1], {})[key[-1]] = value
+        lines = []
+        for values, fields in sorted(series.items()):
+            cumulative = 0.0
+            for bound in self.buckets:
+                cumulative += fields.get(_number(bound), 0.0)
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {_number(cumulative)}")
+            count = fields.get("count", 0.0)
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, values, inf)} {_number(count)}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(fields.get('sum', 0.0))}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {_number(count)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Values read from a callback at scrape time.
+
+    ``kind="counter"`` exposes monotonic totals kept elsewhere (cache stats).
+    """
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        help: str,
+        labels: tuple[str, ...],
+        collect: Callable[[], Iterable[tuple[tuple, float]]],
+        *,
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(registry, name, help, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self, samples: dict) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, values)} {_number(value)}" for values, value in self.collect()]
+
+
+registry = Registry()
+
+
+def stats_collector(stats: Callable[[], dict], *, keys: Iterable[str]) -> Callable[[], list[tuple[tuple, float]]]:
+    """Gauge callback exposing the given entries of a ``stats()`` dict, one series per key."""
+    keys = tuple(keys)
+
+    def collect() -> list[tuple[tuple, float]]:
+        values = stats()
+        return [((key,), values[key]) for key in keys if key in values]
+
+    return collect
+
+
+HTTP_REQUESTS = Counter(registry, "chesslab_http_requests_total", "HTTP requests.", ("endpoint", "method", "status"))
+HTTP_SECONDS = Histogram(registry, "chesslab_http_request_seconds", "HTTP request latency.", ("endpoint",))
+HTTP_QUERIES = Histogram(
+    registry, "chesslab_http_request_queries", "SQL statements per HTTP request.", ("endpoint",), buckets=QUERY_BUCKETS
+)
+SQL_QUERIES = Counter(registry, "chesslab_sql_queries_total", "SQL statements executed.", ("context",))
+SQL_SECONDS = Counter(registry, "chesslab_sql_seconds_total", "Time spent executing SQL.", ("context",))
+ENGINE_SEARCH_SECONDS = Histogram(
+    registry, "chesslab_engine_search_seconds", "UCI engine search time.", ("outcome",), shared=True
+)
+JOB_SECONDS = Histogram(
+    registry, "chesslab_job_seconds", "Background job run time, engine and storage included.", ("kind",), shared=True
+)
+SOCKETIO_EMITS = Counter(registry, "chesslab_socketio_emits_total", "Socket.IO events emitted.", ("event",), shared=True)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("chesslab_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get("chesslab_query_start")
+    elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+    context_label = "request" if has_request_context() else "background"
+    SQL_QUERIES.inc(context=context_label)
+    SQL_SECONDS.inc(elapsed, context=context_label)
+    if context_label == "request" and "sql" in g:
+        g.sql[0] += 1
+        g.sql[1] += elapsed
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time every statement ``engine`` executes."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+_profile_lock = threading.Lock()
+
+
+def _endpoint() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def init_app(app: Flask) -> None:
+    """Time requests, count their SQL and serve opt-in cProfile dumps."""
+
+    @app.before_request
+    def _start_request() -> None:
+        g.request_start = time.perf_counter()
+        g.sql = [0, 0.0]
+        if (
+            app.config.get("REQUEST_PROFILING")
+            and request.headers.get("X-Profile") == "1"
+            and _profile_lock.acquire(blocking=False)
+        ):
+            # cProfile allows one active profiler per thread; concurrent requests go unprofiled.
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _finish_request(response: Response) -> Response:
+        if "request_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        queries, sql_seconds = g.sql
+        endpoint = _endpoint()
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        HTTP_SECONDS.observe(elapsed, endpoint=endpoint)
+        HTTP_QUERIES.observe(queries, endpoint=endpoint)
+        response.headers.add(
+            "Server-Timing", f'app;dur={elapsed * 1000:.1f}, sql;dur={sql_seconds * 1000:.1f};desc="{queries} queries"'
+        )
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+            response.headers["X-Profile-File"] = _dump_profile(app, profiler, endpoint)
+        return response
+
+
+def _dump_profile(app: Flask, profiler: cProfile.Profile, endpoint: str) -> str:
+    directory = app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    slug = endpoint.strip("/").replace("/", "_").replace("<", "").replace(">", "").replace(":", "_") or "root"
+    path = os.path.join(directory, f"{slug}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{threading.get_ident()}.prof")
+    profiler.dump_stats(path)
+    return path
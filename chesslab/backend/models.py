@@ -2,10 +2,21 @@
 from __future__ import annotations
 
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Boolean, Text, UniqueConstraint
+from sqlalchemy import DDL, BigInteger, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Boolean, Text, UniqueConstraint, event, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from .db import Base
+from .encoding import pack_pv, unpack_pv
+
+
+def pack_pv_column(pv_uci: str | None) -> tuple[bytes | None, str | None]:
+    """Return ``(pv_packed, pv_text)`` column values for a UCI PV string."""
+    if not pv_uci:
+        return None, pv_uci
+    try:
+        return pack_pv(pv_uci), None
+    except ValueError:
+        return None, pv_uci
 
 
 class Opening(Base):
@@ -16,6 +27,7 @@ class Opening(Base):
     side: Mapped[str] = mapped_column(String(5), nullable=False, default="white")
     tags: Mapped[str | None] = mapped_column(String(255))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
 
     lines: Mapped[list["Line"]] = relationship("Line", back_populates="opening", cascade="all, delete-orphan")
 
@@ -28,11 +40,15 @@ class Line(Base):
     title: Mapped[str] = mapped_column(String(120), nullable=False)
     is_main: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
 
     opening: Mapped[Opening] = relationship("Opening", back_populates="lines")
     nodes: Mapped[list["Node"]] = relationship("Node", back_populates="line", cascade="all, delete-orphan")
 
-    __table_args__ = (Index("ix_lines_opening_id", "opening_id"),)
+    __table_args__ = (
+        Index("ix_lines_opening_id", "opening_id"),
+        Index("ix_lines_version", "version"),
+    )
 
 
 class Node(Base):
@@ -44,34 +60,114 @@ class Node(Base):
     san: Mapped[str] = mapped_column(String(20), nullable=False)
     ply: Mapped[int] = mapped_column(Integer, nullable=False)
     fen: Mapped[str] = mapped_column(Text, nullable=False)
+    position_id: Mapped[int | None] = mapped_column(ForeignKey("positions.id"), nullable=True)
+    zobrist: Mapped[int | None] = mapped_column(BigInteger)
+    # Subtree queries are byte-order ranges (see tree.subtree_range).  Postgres
+    # locale collations ignore '/', so the column is C-collated there; SQLite's
+    # default BINARY collation already compares bytes.
+    path: Mapped[str | None] = mapped_column(String(1024).with_variant(String(1024, collation="C"), "postgresql"))
     comment: Mapped[str | None] = mapped_column(Text)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
 
-    parent: Mapped["Node" | None] = relationship("Node", remote_side="Node.id")
+    parent: Mapped["Node | None"] = relationship("Node", remote_side="Node.id")
     line: Mapped[Line] = relationship("Line", back_populates="nodes")
-    evals: Mapped[list["Eval"]] = relationship("Eval", back_populates="node", cascade="all, delete-orphan")
+    position: Mapped["Position | None"] = relationship("Position", back_populates="nodes")
 
     __table_args__ = (
         UniqueConstraint("line_id", "parent_id", "san", name="uq_node_san"),
+        # NULLs never collide in uq_node_san, so root moves need their own partial index.
+        Index(
+            "uq_node_root_san",
+            "line_id",
+            "san",
+            unique=True,
+            sqlite_where=text("parent_id IS NULL"),
+            postgresql_where=text("parent_id IS NULL"),
+        ),
         Index("ix_nodes_line_ply", "line_id", "ply"),
+        Index("ix_nodes_parent_id", "parent_id"),
+        Index("ix_nodes_path", "path"),
+        Index("ix_nodes_position_id", "position_id"),
+        Index("ix_nodes_zobrist", "zobrist"),
+        Index("ix_nodes_version", "version"),
     )
 
 
+class RepertoireVersion(Base):
+    """Single-row counter stamped on every opening, line and node a transaction writes."""
+
+    __tablename__ = "repertoire_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+event.listen(
+    RepertoireVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO repertoire_version (id, value) VALUES (1, 0)"),
+)
+
+
+class Position(Base):
+    """A board position shared by every node (in any line or opening) reaching it."""
+
+    __tablename__ = "positions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    fen_key: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
+    zobrist: Mapped[int | None] = mapped_column(BigInteger, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    nodes: Mapped[list[Node]] = relationship("Node", back_populates="position")
+    evals: Mapped[list["Eval"]] = relationship("Eval", back_populates="position", cascade="all, delete-orphan")
+
+
 class Eval(Base):
     __tablename__ = "evals"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    node_id: Mapped[int] = mapped_column(ForeignKey("nodes.id", ondelete="CASCADE"), nullable=False)
+    position_id: Mapped[int] = mapped_column(ForeignKey("positions.id", ondelete="CASCADE"), nullable=False)
     depth: Mapped[int] = mapped_column(Integer, nullable=False)
+    # The depth a server search was asked for.  A search stopped early because its
+    # result settled is stored at the depth it reached but answers requests up to this.
+    requested_depth: Mapped[int | None] = mapped_column(Integer)
     multipv: Mapped[int] = mapped_column(Integer, nullable=False)
-    pv_uci: Mapped[str | None] = mapped_column(Text)
+    pv_packed: Mapped[bytes | None] = mapped_column(LargeBinary)
+    # Text PVs are kept only for rows written before packing or that fail to parse.
+    pv_text: Mapped[str | None] = mapped_column("pv_uci", Text)
     score_cp: Mapped[int | None] = mapped_column(Integer)
     score_mate: Mapped[int | None] = mapped_column(Integer)
     bestmove_uci: Mapped[str | None] = mapped_column(String(10))
     engine_mode: Mapped[str] = mapped_column(String(10), nullable=False, default="client")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    node: Mapped[Node] = relationship("Node", back_populates="evals")
+    position: Mapped[Position] = relationship("Position", back_populates="evals")
+
+    @property
+    def pv_uci(self) -> str | None:
+        if self.pv_packed is not None:
+            return unpack_pv(self.pv_packed)
+        return self.pv_text
+
+    @pv_uci.setter
+    def pv_uci(self, value: str | None) -> None:
+        self.pv_packed, self.pv_text = pack_pv_column(value)
 
     __table_args__ = (
-        Index("ix_eval_node_depth", "node_id", "depth", "multipv", "engine_mode"),
+        Index("ix_eval_position_depth", "position_id", "depth", "multipv", "engine_mode", unique=True),
     )
+
+
+class EvalSummary(Base):
+    """The best line (``multipv`` 1) of a position's deepest evaluation, kept by :func:`.upsert_evals`."""
+
+    __tablename__ = "eval_summaries"
+
+    position_id: Mapped[int] = mapped_column(ForeignKey("positions.id", ondelete="CASCADE"), primary_key=True)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+    score_cp: Mapped[int | None] = mapped_column(Integer)
+    score_mate: Mapped[int | None] = mapped_column(Integer)
+    bestmove_uci: Mapped[str | None] = mapped_column(String(10))
+    engine_mode: Mapped[str] = mapped_column(String(10), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
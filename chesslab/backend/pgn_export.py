@@ -0,0 +1,176 @@
+"""Streaming PGN export of node trees.
+
+Each line becomes one PGN game containing every variation.  Movetext is
+generated straight from the stored SAN and ply of each node, from a child
+index built once per line, so no board replay or in-memory ``chess.pgn.Game``
+is needed.  Output is yielded in chunks suitable for a streamed response.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+from sqlalchemy.orm import Session
+
+from .db import ReadSession as SessionFactory
+from .models import Eval, Line, Node, Opening
+
+CHUNK_SIZE = 8192
+LINE_WIDTH = 79
+_IN_CHUNK = 500
+
+
+def best_evals(session: Session, position_ids: Iterable[int]) -> dict[int, Eval]:
+    """Deepest first-line evaluation per position."""
+    best: dict[int, Eval] = {}
+    ids = list(set(position_ids))
+    for start in range(0, len(ids), _IN_CHUNK):
+        rows = (
+            session.query(Eval)
+            .filter(Eval.position_id.in_(ids[start:start + _IN_CHUNK]), Eval.multipv == 1)
+            .order_by(Eval.depth.desc(), Eval.created_at.desc())
+            .all()
+        )
+        for ev in rows:
+            best.setdefault(ev.position_id, ev)
+    return best
+
+
+def _eval_tag(node: Node, ev: Eval) -> str | None:
+    # Engine scores are relative to the side to move; PGN [%eval] is from White's view.
+    sign = -1 if node.ply % 2 == 1 else 1
+    if ev.score_mate is not None:
+        return f"[%eval #{sign * ev.score_mate}]"
+    if ev.score_cp is not None:
+        return f"[%eval {sign * ev.score_cp / 100:.2f}]"
+    return None
+
+
+def _annotation(node: Node, evals: dict[int, Eval]) -> str | None:
+    parts = []
+    if node.comment:
+        parts.append(node.comment.replace("}", ")"))
+    ev = evals.get(node.position_id) if node.position_id is not None else None
+    tag = _eval_tag(node, ev) if ev is not None else None
+    if tag:
+        parts.append(tag)
+    return "{ " + " ".join(parts) + " }" if parts else None
+
+
+def movetext_tokens(nodes: list[Node], evals: dict[int, Eval]) -> Iterator[str]:
+    """Yield PGN movetext tokens for a node tree, main move first at each branch."""
+    children: dict[int | None, list[Node]] = {}
+    for node in sorted(nodes, key=lambda item: item.id):
+        children.setdefault(node.parent_id, []).append(node)
+
+    # Items are ("seq", siblings, force_number) or ("text", token).
+    stack: list[tuple] = [("seq", children.get(None, []), False)]
+    while stack:
+        item = stack.pop()
+        if item[0] == "text":
+            yield item[1]
+            continue
+        _, siblings, force_number = item
+        if not siblings:
+            continue
+        main, alternatives = siblings[0], siblings[1:]
+        number = (main.ply + 1) // 2
+        if main.ply % 2 == 1:
+            yield f"{number}. {main.san}"
+        elif force_number:
+            yield f"{number}... {main.san}"
+        else:
+            yield main.san
+        annotation = _annotation(main, evals)
+        if annotation:
+            yield annotation
+        stack.append(("seq", children.get(main.id, []), bool(alternatives or annotation)))
+        for alternative in reversed(alternatives):
+            stack.append(("text", ")"))
+            stack.append(("seq", [alternative], True))
+            stack.append(("text", "("))
+
+
+def _wrap(tokens: Iterable[str]) -> Iterator[str]:
+    """Join tokens into lines of at most ``LINE_WIDTH`` characters where possible."""
+    column = 0
+    for token in tokens:
+        if token == ")":
+            yield token
+            column += 1
+            continue
+        if column and column + 1 + len(token) > LINE_WIDTH:
+            yield "\n"
+            column = 0
+        elif column:
+            yield " "
+            column += 1
+        yield token
+        column += len(token)
+    if column:
+        yield "\n"
+
+
+def line_pgn(session: Session, line: Line, opening: Opening | None = None) -> Iterator[str]:
+    """Yield one PGN game for ``line`` with all variations and annotations."""
+    nodes = session.query(Node).filter(Node.line_id == line.id).all()
+    evals = best_evals(session, [node.position_id for node in nodes if node.position_id is not None])
+    opening = opening or line.opening
+    headers = [
+        ("Event", line.title),
+        ("Site", "?"),
+        ("Date", "????.??.??"),
+        ("Round", "?"),
+        ("White", "?"),
+        ("Black", "?"),
+        ("Result", "*"),
+        ("Opening", opening.name if opening else "?"),
+    ]
+    for name, value in headers:
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        yield f'[{name} "{escaped}"]\n'
+    yield "\n"
+    yield from _wrap(_join_parens(movetext_tokens(nodes, evals)))
+    yield "*\n\n"
+
+
+def _join_parens(tokens: Iterable[str]) -> Iterator[str]:
+    """Attach ``(`` to the token after it so variations print as ``(1... c5``."""
+    pending_open = False
+    for token in tokens:
+        if token == "(":
+            pending_open = True
+            continue
+        if pending_open:
+            token = "(" + token
+            pending_open = False
+        yield token
+
+
+def chunked(parts: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    buffer: list[str] = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def stream_lines_pgn(line_ids: list[int]) -> Iterator[str]:
+    """Export lines in order on a dedicated session.
+
+    Streamed responses outlive the request's scoped session, so the generator
+    owns its session and closes it when the stream ends.
+    """
+    session = SessionFactory()
+    try:
+        for line_id in line_ids:
+            line = session.get(Line, line_id)
+            if line is not None:
+                yield from line_pgn(session, line)
+            session.expunge_all()
+    finally:
+        session.close()
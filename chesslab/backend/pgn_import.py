@@ -0,0 +1,184 @@
+"""Streaming PGN import into a line's node tree.
+
+Games are read one at a time from a text stream, and every variation is kept.
+Moves are merged into the existing tree by SAN path, so importing the same
+opening twice creates no duplicates.  Lines are rooted at the standard start
+position, so games set up from a ``[FEN]`` header are skipped and reported in
+:attr:`ImportStats.skipped`.  New nodes are buffered and written in
+batches, one bulk ``INSERT ... RETURNING`` per ply level, instead of one flush
+per move.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, TextIO
+
+import chess
+import chess.pgn
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from .encoding import board_zobrist
+from .models import Node
+from .positions import bulk_position_ids, normalize_fen
+from .sync import next_version
+from .tree import backfill_paths
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TreeNode:
+    san: str | None
+    ply: int
+    fen: str
+    id: int | None = None
+    zobrist: int | None = None
+    path: str = "/"
+    comment: str | None = None
+    parent: "TreeNode | None" = None
+    children: dict[str, "TreeNode"] = field(default_factory=dict)
+
+
+@dataclass
+class ImportStats:
+    games: int = 0
+    nodes_created: int = 0
+    max_ply: int = 0
+    # One ``{"game": ordinal, "reason": ...}`` per game left out, ordinals counting from 1.
+    skipped: list[dict] = field(default_factory=list)
+
+
+class TreeImporter:
+    """Merge games into one line, buffering new nodes until :meth:`flush`."""
+
+    def __init__(self, session: Session, line_id: int) -> None:
+        self.session = session
+        self.line_id = line_id
+        self.root = TreeNode(san=None, ply=0, fen=chess.STARTING_FEN)
+        self.pending: list[TreeNode] = []
+        self.stats = ImportStats()
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        if self.session.query(Node.id).filter(Node.line_id == self.line_id, Node.path.is_(None)).first():
+            backfill_paths(self.session, self.line_id)
+        rows = (
+            self.session.query(Node.id, Node.parent_id, Node.san, Node.ply, Node.fen, Node.path)
+            .filter(Node.line_id == self.line_id)
+            .order_by(Node.ply, Node.id)
+            .all()
+        )
+        by_id: dict[int | None, TreeNode] = {None: self.root}
+        for node_id, parent_id, san, ply, fen, path in rows:
+            parent = by_id.get(parent_id)
+            if parent is None:  # pragma: no cover - orphaned row
+                continue
+            tree_node = TreeNode(san=san, ply=ply, fen=fen, id=node_id, path=path, parent=parent)
+            parent.children[san] = tree_node
+            by_id[node_id] = tree_node
+
+    def add_game(self, game: chess.pgn.Game) -> None:
+        if game.board().fen() != chess.STARTING_FEN:
+            ordinal = self.stats.games + len(self.stats.skipped) + 1
+            reason = f"starts from a set-up position ({game.board().fen()})"
+            self.stats.skipped.append({"game": ordinal, "reason": reason})
+            return
+        self.stats.games += 1
+        board = game.board()
+        # Entries are (game node, tree parent) to visit, or None to undo one move.
+        stack: list[tuple[chess.pgn.ChildNode, TreeNode] | None] = [
+            (variation, self.root) for variation in reversed(game.variations)
+        ]
+        while stack:
+            item = stack.pop()
+            if item is None:
+                board.pop()
+                continue
+            game_node, parent = item
+            san = board.san(game_node.move)
+            board.push(game_node.move)
+            child = parent.children.get(san)
+            if child is None:
+                child = TreeNode(
+                    san=san,
+                    ply=parent.ply + 1,
+                    fen=board.fen(),
+                    zobrist=board_zobrist(board),
+                    comment=game_node.comment or None,
+                    parent=parent,
+                )
+                parent.children[san] = child
+                self.pending.append(child)
+            self.stats.max_ply = max(self.stats.max_ply, child.ply)
+            stack.append(None)
+            stack.extend((variation, child) for variation in reversed(game_node.variations))
+
+    def flush(self) -> int:
+        """Write buffered nodes level by level; returns how many were inserted."""
+        if not self.pending:
+            return 0
+        position_ids = bulk_position_ids(self.session, [node.fen for node in self.pending])
+        # Core inserts bypass the ORM flush hook that stamps versions.
+        version = next_version(self.session)
+        levels: dict[int, list[TreeNode]] = {}
+        for node in self.pending:
+            levels.setdefault(node.ply, []).append(node)
+        for ply in sorted(levels):
+            nodes = levels[ply]
+            rows = [
+                {
+                    "line_id": self.line_id,
+                    "parent_id": node.parent.id,
+                    "san": node.san,
+                    "ply": node.ply,
+                    "fen": node.fen,
+                    "position_id": position_ids[normalize_fen(node.fen)],
+                    "zobrist": node.zobrist,
+                    "comment": node.comment,
+                    "version": version,
+                }
+                for node in nodes
+            ]
+            ids = self.session.execute(
+                insert(Node).returning(Node.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            for node, node_id in zip(nodes, ids):
+                node.id = node_id
+                node.path = f"{node.parent.path}{node_id}/"
+            self.session.execute(update(Node), [{"id": node.id, "path": node.path} for node in nodes])
+        count = len(self.pending)
+        self.stats.nodes_created += count
+        self.pending = []
+        return count
+
+
+def import_games(
+    session: Session,
+    stream: TextIO,
+    line_id: int,
+    *,
+    batch_games: int = 200,
+    progress: Callable[[ImportStats], None] | None = None,
+) -> ImportStats:
+    """Stream every game from ``stream`` into ``line_id``, committing per batch."""
+    importer = TreeImporter(session, line_id)
+    read = 0
+    while True:
+        game = chess.pgn.read_game(stream)
+        if game is None:
+            break
+        importer.add_game(game)
+        read += 1
+        if read % batch_games == 0:
+            importer.flush()
+            session.commit()
+            if progress is not None:
+                progress(importer.stats)
+    importer.flush()
+    session.commit()
+    if progress is not None:
+        progress(importer.stats)
+    if importer.stats.skipped:
+        logger.warning("Skipped %d PGN games set up from a custom position", len(importer.stats.skipped))
+    return importer.stats
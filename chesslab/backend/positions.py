@@ -0,0 +1,78 @@
+"""Helpers for resolving nodes to shared, normalized positions."""
+from __future__ import annotations
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .encoding import zobrist_key
+from .models import Node, Position
+
+# Keeps IN lists under SQLite's bound-parameter limit.
+_IN_CHUNK = 500
+_DIALECT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def normalize_fen(fen: str) -> str:
+    """Strip the halfmove and fullmove clocks so transpositions share a key."""
+    return " ".join(fen.split()[:4])
+
+
+def get_or_create_position(session: Session, fen: str) -> Position:
+    key = normalize_fen(fen)
+    zobrist = zobrist_key(fen)
+    query = session.query(Position)
+    if zobrist is not None:
+        # The 8-byte hash index narrows the lookup; the key check guards against collisions.
+        query = query.filter(Position.zobrist == zobrist)
+    position = query.filter(Position.fen_key == key).one_or_none()
+    if position is not None:
+        return position
+    try:
+        with session.begin_nested():
+            position = Position(fen_key=key, zobrist=zobrist)
+            session.add(position)
+    except IntegrityError:
+        # Another writer inserted the same position concurrently.
+        position = session.query(Position).filter(Position.fen_key == key).one()
+    return position
+
+
+def position_for_node(session: Session, node: Node) -> Position:
+    """Return the node's position, attaching one if the node predates positions."""
+    if node.position_id is not None:
+        return node.position
+    position = get_or_create_position(session, node.fen)
+    node.position_id = position.id
+    node.zobrist = position.zobrist
+    return position
+
+
+def line_ids_at_position(session: Session, position_id: int) -> list[int]:
+    """IDs of every line with a node at the position, whose eval curves show its evals."""
+    return [line_id for (line_id,) in session.query(Node.line_id).filter(Node.position_id == position_id).distinct()]
+
+
+def bulk_position_ids(session: Session, fens: list[str]) -> dict[str, int]:
+    """Map each FEN's normalized key to a position ID, inserting missing ones in bulk."""
+    keys = {normalize_fen(fen) for fen in fens}
+    found: dict[str, int] = {}
+    key_list = list(keys)
+    for start in range(0, len(key_list), _IN_CHUNK):
+        chunk = key_list[start:start + _IN_CHUNK]
+        found.update(session.query(Position.fen_key, Position.id).filter(Position.fen_key.in_(chunk)).all())
+    missing = [{"fen_key": key, "zobrist": zobrist_key(key)} for key in keys if key not in found]
+    if missing:
+        make_insert = _DIALECT_INSERTS.get(session.get_bind().dialect.name)
+        if make_insert is None:
+            stmt = insert(Position)
+        else:
+            # Another writer may insert the same position concurrently (see get_or_create_position).
+            stmt = make_insert(Position).on_conflict_do_nothing(index_elements=["fen_key"])
+        found.update(session.execute(stmt.returning(Position.fen_key, Position.id), missing).all())
+        raced = [row["fen_key"] for row in missing if row["fen_key"] not in found]
+        for start in range(0, len(raced), _IN_CHUNK):
+            chunk = raced[start:start + _IN_CHUNK]
+            found.update(session.query(Position.fen_key, Position.id).filter(Position.fen_key.in_(chunk)).all())
+    return found
@@ -0,0 +1,213 @@
+"""Versioned response cache and conditional GET for read endpoints.
+
+Every cacheable resource belongs to one or more *scopes* (``"openings"``,
+``"opening:3"``, ``"line:7"``, ``"position:42"``).  Writers bump a scope's
+version after committing; eval writes also bump every line with a node at the
+position, since line eval curves embed them.  A response's ETag is derived
+from the request path and the versions of its scopes, so a client that
+revalidates with ``If-None-Match`` gets a ``304`` without the server querying
+or serializing anything.  Serialized bodies, gzipped when large enough, are kept in a
+bounded in-process LRU under the same tag.
+
+Versions live in Redis when configured, so bumps made by the RQ worker are
+seen by every web process; otherwise they are kept in-process.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, NamedTuple
+
+from flask import Response, current_app, request
+from redis import Redis, RedisError
+
+from .metrics import Gauge, registry, stats_collector
+
+logger = logging.getLogger(__name__)
+
+GZIP_MIN_BYTES = 1024
+
+
+def opening_scope(opening_id: int) -> str:
+    return f"opening:{opening_id}"
+
+
+def line_scope(line_id: int) -> str:
+    return f"line:{line_id}"
+
+
+def position_scope(position_id: int) -> str:
+    return f"position:{position_id}"
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 2048) -> None:
+        self.max_entries = max_entries
+        self.redis: Redis | None = None
+        self.redis_prefix = "chesslab:version:"
+        # scope -> (version, last-modified epoch seconds)
+        self._versions: dict[str, tuple[int, float]] = {}
+        # tag -> (body, gzipped body or None, extra headers)
+        self._bodies: OrderedDict[str, tuple[bytes, bytes | None, dict[str, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "bumps": 0}
+        # Part of every tag, so versions restarting from zero never revalidate old ETags.
+        self.epoch = uuid.uuid4().hex
+
+    def configure(self, *, max_entries: int | None = None, redis_url: str | None = None) -> None:
+        if max_entries is not None:
+            self.max_entries = max_entries
+        self.redis = Redis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=0.5) if redis_url else None
+        self.clear()
+        if self.redis is not None:
+            # Processes sharing Redis versions must also share the epoch.
+            try:
+                self.redis.set(self.redis_prefix + "epoch", self.epoch, nx=True)
+                self.epoch = (self.redis.get(self.redis_prefix + "epoch") or self.epoch.encode()).decode()
+            except RedisError:
+                logger.warning("Redis unavailable; response versions are per process")
+
+    def bump(self, *scopes: str) -> None:
+        """Mark ``scopes`` as changed; call after the write has committed."""
+        now = time.time()
+        with self._lock:
+            for scope in scopes:
+                version, _ = self._versions.get(scope, (0, now))
+                self._versions[scope] = (version + 1, now)
+            self._counters["bumps"] += len(scopes)
+        if self.redis is not None:
+            try:
+                with self.redis.pipeline() as pipe:
+                    for scope in scopes:
+                        pipe.hincrby(self.redis_prefix + scope, "v", 1)
+                        pipe.hset(self.redis_prefix + scope, "t", now)
+                    pipe.execute()
+            except RedisError:
+                logger.warning("Failed to bump Redis versions for %s", ", ".join(scopes))
+
+    def versions(self, scopes: Iterable[str]) -> list[tuple[int, float]]:
+        scopes = list(scopes)
+        if self.redis is not None:
+            try:
+                with self.redis.pipeline() as pipe:
+                    for scope in scopes:
+                        pipe.hmget(self.redis_prefix + scope, "v", "t")
+                    rows = pipe.execute()
+                return [(int(v or 0), float(t or 0)) for v, t in rows]
+            except RedisError:
+                pass
+        with self._lock:
+            return [self._versions.get(scope, (0, 0.0)) for scope in scopes]
+
+    def get(self, tag: str) -> tuple[bytes, bytes | None, dict[str, str]] | None:
+        with self._lock:
+            entry = self._bodies.get(tag)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._bodies.move_to_end(tag)
+            self._counters["hits"] += 1
+            return entry
+
+    def put(
+        self, tag: str, body: bytes, headers: dict[str, str] | None = None
+    ) -> tuple[bytes, bytes | None, dict[str, str]]:
+        compressed = gzip.compress(body, compresslevel=5) if len(body) >= GZIP_MIN_BYTES else None
+        entry = (body, compressed, headers or {})
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._bodies[tag] = entry
+            self._bodies.move_to_end(tag)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+                self._counters["evictions"] += 1
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._bodies.clear()
+            self.epoch = uuid.uuid4().hex
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self._counters, "size": len(self._bodies), "max_entries": self.max_entries}
+
+    def not_modified(self) -> None:
+        with self._lock:
+            self._counters["not_modified"] += 1
+
+
+response_cache = ResponseCache()
+
+Gauge(
+    registry,
+    "chesslab_response_cache_events_total",
+    "Response cache lookups, 304 revalidations, evictions and version bumps.",
+    ("event",),
+    stats_collector(response_cache.stats, keys=("hits", "misses", "not_modified", "evictions", "bumps")),
+    kind="counter",
+)
+
+
+class Page(NamedTuple):
+    """One keyset page; ``next_cursor`` is sent as ``X-Next-Cursor`` when set."""
+
+    items: list
+    next_cursor: str | None
+
+
+def cached_json(scopes: Iterable[str], build: Callable[[], Any], *, revision: Any = None) -> Response:
+    """Serve ``build()`` as JSON with an ETag and Last-Modified tied to ``scopes``.
+
+    ``build`` only runs when neither the client nor the cache already holds
+    the current version.  It may return a :class:`Page`.  ``revision`` is
+    mixed into the ETag for resources that carry their own version.
+    """
+    versions = response_cache.versions(scopes)
+    identity = json.dumps([response_cache.epoch, request.full_path, versions, revision])
+    tag = hashlib.sha1(identity.encode()).hexdigest()
+
+    response = current_app.response_class(mimetype="application/json")
+    response.set_etag(tag, weak=True)
+    modified = max((t for _, t in versions), default=0.0)
+    if modified:
+        response.last_modified = datetime.fromtimestamp(int(modified), tz=timezone.utc)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(tag)
+    else:
+        since = request.if_modified_since
+        fresh = bool(modified and since and int(modified) <= since.timestamp())
+    if fresh:
+        response_cache.not_modified()
+        response.status_code = 304
+        return response
+
+    entry = response_cache.get(tag)
+    if entry is None:
+        payload = build()
+        headers = {}
+        if isinstance(payload, Page):
+            if payload.next_cursor is not None:
+                headers["X-Next-Cursor"] = payload.next_cursor
+            payload = payload.items
+        entry = response_cache.put(tag, json.dumps(payload, separators=(",", ":")).encode(), headers)
+    body, compressed, headers = entry
+    response.headers.update(headers)
+    if compressed is not None and "gzip" in request.accept_encodings:
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response.set_data(body)
+    return response
@@ -0,0 +1,183 @@
+"""Retention policy and compaction for stored evaluations.
+
+Clients that upload every depth of a search leave one row per depth and
+line.  Only the deepest of those can ever answer :meth:`.EvalCache.lookup`,
+which serves a request from the deepest stored depth that has enough lines.
+A depth is therefore *superseded* once ``keep_depths`` deeper depths of the
+same position each have at least as many lines (in any engine mode) and
+answer requests at least as deep (see ``Eval.requested_depth``).  Deleting
+superseded depths leaves every lookup answer unchanged.
+
+:func:`compact_evals` walks positions in ID order, a batch per transaction,
+so live writers only ever wait on one short batch.  Rows written after the
+pass started are never deleted, even if a concurrent writer re-posts a
+superseded depth.  :func:`maintain` then reclaims space and refreshes
+planner statistics.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import delete, func, select, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .env import env_int
+from .metrics import Counter, registry
+from .models import Eval
+
+logger = logging.getLogger(__name__)
+
+EVALS_COMPACTED = Counter(
+    registry, "chesslab_evals_compacted_total", "Eval rows deleted by compaction.", shared=True
+)
+_DELETE_CHUNK = 400
+
+
+@dataclass
+class RetentionPolicy:
+    # Deeper depths with at least as many lines a depth needs before it is dropped.
+    # 1 keeps only the deepest result; higher values keep that much history.
+    keep_depths: int = 1
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(keep_depths=max(1, env_int("EVAL_KEEP_DEPTHS", 1)))
+
+    def superseded(self, widths: dict[int, int], covers: dict[int, tuple[int, int]] | None = None) -> list[int]:
+        """Depths to drop, given each stored depth's number of MultiPV lines.
+
+        ``covers`` maps a depth to the least and greatest request depth its rows
+        answer; depths missing from it answer up to themselves.
+        """
+        covers = covers or {}
+        dropped = []
+        deeper: list[tuple[int, int]] = []
+        for depth in sorted(widths, reverse=True):
+            least, greatest = covers.get(depth, (depth, depth))
+            dominating = sum(1 for width, answers in deeper if width >= widths[depth] and answers >= greatest)
+            if dominating >= self.keep_depths:
+                dropped.append(depth)
+            deeper.append((widths[depth], least))
+        return dropped
+
+
+@dataclass
+class CompactionStats:
+    positions: int = 0
+    batches: int = 0
+    rows_deleted: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def compact_evals(
+    session: Session,
+    policy: RetentionPolicy | None = None,
+    *,
+    batch_positions: int | None = None,
+    progress: Callable[[CompactionStats], None] | None = None,
+) -> CompactionStats:
+    """Delete superseded eval rows, committing once per batch of positions."""
+    policy = policy or RetentionPolicy.from_env()
+    batch_positions = batch_positions or env_int("EVAL_COMPACTION_BATCH", 500)
+    started = datetime.utcnow()
+    stats = CompactionStats()
+    last_position = 0
+    while True:
+        position_ids = session.scalars(
+            select(Eval.position_id)
+            .where(Eval.position_id > last_position)
+            .group_by(Eval.position_id)
+            .order_by(Eval.position_id)
+            .limit(batch_positions)
+        ).all()
+        if not position_ids:
+            break
+        last_position = position_ids[-1]
+        widths: dict[int, dict[int, int]] = {}
+        covers: dict[int, dict[int, tuple[int, int]]] = {}
+        answers = func.coalesce(Eval.requested_depth, Eval.depth)
+        for position_id, depth, width, least, greatest in session.execute(
+            select(
+                Eval.position_id,
+                Eval.depth,
+                func.count(func.distinct(Eval.multipv)),
+                func.min(answers),
+                func.max(answers),
+            )
+            .where(Eval.position_id.in_(position_ids))
+            .group_by(Eval.position_id, Eval.depth)
+        ):
+            widths.setdefault(position_id, {})[depth] = width
+            covers.setdefault(position_id, {})[depth] = (least, greatest)
+        doomed = [
+            (position_id, depth)
+            for position_id, by_depth in widths.items()
+            for depth in policy.superseded(by_depth, covers[position_id])
+        ]
+        for start in range(0, len(doomed), _DELETE_CHUNK):
+            result = session.execute(
+                delete(Eval).where(
+                    tuple_(Eval.position_id, Eval.depth).in_(doomed[start:start + _DELETE_CHUNK]),
+                    Eval.created_at <= started,
+                )
+            )
+            stats.rows_deleted += result.rowcount
+        session.commit()
+        stats.positions += len(position_ids)
+        stats.batches += 1
+        if progress is not None:
+            progress(stats)
+    EVALS_COMPACTED.inc(stats.rows_deleted)
+    logger.info("Eval compaction deleted %d rows across %d positions", stats.rows_deleted, stats.positions)
+    return stats
+
+
+def maintain(engine: Engine, *, vacuum: bool = True) -> None:
+    """Refresh planner statistics for ``evals`` and, with ``vacuum``, return freed pages."""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        statements = ["ANALYZE evals"] + (["VACUUM"] if vacuum else [])
+    elif dialect == "postgresql":
+        statements = ["VACUUM (ANALYZE) evals" if vacuum else "ANALYZE evals"]
+    else:
+        return
+    # VACUUM cannot run inside a transaction block.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+
+
+def main() -> None:  # pragma: no cover - manual execution helper
+    import argparse
+
+    from .db import db_session, get_engine, init_engine
+    from .eval_store import rebuild_summaries
+
+    parser = argparse.ArgumentParser(description="Compact stored evaluations.")
+    parser.add_argument("--keep-depths", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=None)
+    parser.add_argument("--no-vacuum", action="store_true")
+    parser.add_argument(
+        "--rebuild-summaries", action="store_true", help="Recompute eval summaries from the stored evals first."
+    )
+    args = parser.parse_args()
+    init_engine(os.getenv("DATABASE_URL", "sqlite:///chesslab.db"), profile=os.getenv("DB_PROFILE") or None)
+    if args.rebuild_summaries:
+        rebuilt = rebuild_summaries(db_session)
+        db_session.commit()
+        print(f"Rebuilt eval summaries for {rebuilt} positions")
+    policy = RetentionPolicy(keep_depths=args.keep_depths) if args.keep_depths else None
+    stats = compact_evals(db_session, policy, batch_positions=args.batch)
+    maintain(get_engine(), vacuum=not args.no_vacuum)
+    print(f"Deleted {stats.rows_deleted} rows across {stats.positions} positions in {stats.batches} batches")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -1,10 +1,183 @@
-"""Socket.IO configuration for the chesslab backend."""
+"""Socket.IO configuration for the chesslab backend.
+
+Clients join rooms with a ``subscribe`` event (``{"node_id": 5}``,
+``{"line_id": 2}`` or ``{"job_id": "..."}``) and only receive events for
+what they subscribed to.  When a message queue is configured, emits from any
+process (the RQ worker included) are published through Redis and delivered
+by whichever web process holds the client's connection.
+"""
 from __future__ import annotations
 
-from flask_socketio import SocketIO
+import os
+import threading
+
+from flask_socketio import SocketIO, join_room, leave_room
+
+from .metrics import SOCKETIO_EMITS, Gauge, registry
+
+# ``chesslab.serve`` selects eventlet; the default keeps the plain threaded server.
+socketio = SocketIO(async_mode=os.getenv("SOCKETIO_ASYNC_MODE", "threading"))
+# Emits go through ``_emitter``; worker processes swap in a queue-only instance.
+_emitter = socketio
+
+COALESCE_WINDOW = float(os.getenv("SOCKETIO_COALESCE_WINDOW", "0.1"))
+
+
+def node_room(node_id: int) -> str:
+    return f"node:{node_id}"
+
+
+def line_room(line_id: int) -> str:
+    return f"line:{line_id}"
+
+
+def job_room(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _subscriptions() -> list[tuple[tuple, float]]:
+    """Subscribed connections per room kind in this process."""
+    counts = {"node": 0, "line": 0, "job": 0}
+    server = socketio.server
+    if server is not None:
+        for room, members in server.manager.rooms.get("/", {}).items():
+            kind = room.split(":", 1)[0] if isinstance(room, str) else None
+            if kind in counts:
+                counts[kind] += len(members)
+    return [((kind,), count) for kind, count in counts.items()]
+
+
+Gauge(registry, "chesslab_socketio_subscriptions", "Room memberships by room kind.", ("kind",), _subscriptions)
+
+
+def _emit(event: str, payload: dict, to) -> None:
+    SOCKETIO_EMITS.inc(event=event)
+    _emitter.emit(event, payload, to=to)
+
+
+def _rooms(data: dict) -> list[str]:
+    rooms = []
+    if data.get("node_id") is not None:
+        rooms.append(node_room(int(data["node_id"])))
+    if data.get("line_id") is not None:
+        rooms.append(line_room(int(data["line_id"])))
+    if data.get("job_id"):
+        rooms.append(job_room(str(data["job_id"])))
+    return rooms
+
+
+@socketio.on("subscribe")
+def _subscribe(data: dict | None) -> None:
+    for room in _rooms(data or {}):
+        join_room(room)
+
+
+@socketio.on("unsubscribe")
+def _unsubscribe(data: dict | None) -> None:
+    for room in _rooms(data or {}):
+        leave_room(room)
+
+
+def init_app(app) -> None:
+    """Attach Socket.IO to the app, sharing emits across processes via ``SOCKETIO_MESSAGE_QUEUE``."""
+    socketio.init_app(
+        app,
+        cors_allowed_origins="http://localhost:5173",
+        message_queue=app.config.get("SOCKETIO_MESSAGE_QUEUE") or None,
+    )
+
+
+def configure_emitter(message_queue: str | None) -> None:
+    """Publish emits to ``message_queue`` from a process that serves no clients."""
+    global _emitter
+    _emitter = SocketIO(message_queue=message_queue) if message_queue else socketio
+
+
+class UpdateCoalescer:
+    """Collapse bursts of per-node updates into the latest one per window.
+
+    The first pending update for a node arms a timer; later updates for the
+    same node within ``window`` seconds replace its payload, so subscribers
+    see at most one update per node per window.  ``window <= 0`` sends
+    immediately.
+    """
+
+    def __init__(self, send, window: float = COALESCE_WINDOW) -> None:
+        self._send = send
+        self.window = window
+        self._pending: dict[int, tuple] = {}
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, node_id: int, *args) -> None:
+        if self.window <= 0:
+            self._send(node_id, *args)
+            return
+        with self._lock:
+            self._pending[node_id] = args
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def discard(self, node_id: int) -> None:
+        with self._lock:
+            self._pending.pop(node_id, None)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        for node_id, args in pending.items():
+            self._send(node_id, *args)
+
+
+def _eval_rooms(node_id: int, line_id: int | None) -> list[str]:
+    rooms = [node_room(node_id)]
+    if line_id is not None:
+        rooms.append(line_room(line_id))
+    return rooms
+
+
+def _send_partial(node_id: int, evals: list[dict], line_id: int | None) -> None:
+    _emit(
+        "eval_partial",
+        {"type": "eval_partial", "node_id": node_id, "evals": evals},
+        _eval_rooms(node_id, line_id),
+    )
+
+
+partial_updates = UpdateCoalescer(_send_partial)
+
+
+def emit_eval_update(node_id: int, evals: list[dict], line_id: int | None = None) -> None:
+    # The final result supersedes any partial snapshot still waiting to go out.
+    partial_updates.discard(node_id)
+    _emit(
+        "eval_update",
+        {"type": "eval_update", "node_id": node_id, "evals": evals},
+        _eval_rooms(node_id, line_id),
+    )
+
+
+def emit_eval_partial(node_id: int, evals: list[dict], line_id: int | None = None) -> None:
+    """Intermediate per-depth snapshot of a search that is still running."""
+    partial_updates.submit(node_id, evals, line_id)
+
 
-socketio = SocketIO(async_mode="threading")
+def emit_analysis_progress(batch_id: str, *, done: int, total: int, node_id: int | None = None) -> None:
+    _emit(
+        "analysis_progress",
+        {"type": "analysis_progress", "batch_id": batch_id, "done": done, "total": total, "node_id": node_id},
+        job_room(batch_id),
+    )
 
 
-def emit_eval_update(node_id: int, evals: list[dict]) -> None:
-    socketio.emit("eval_update", {"type": "eval_update", "node_id": node_id, "evals": evals})
+def emit_import_progress(job_id: str, *, line_id: int, games: int, nodes_created: int) -> None:
+    _emit(
+        "import_progress",
+        {"type": "import_progress", "job_id": job_id, "line_id": line_id, "games": games, "nodes_created": nodes_created},
+        [job_room(job_id), line_room(line_id)],
+    )
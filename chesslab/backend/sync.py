@@ -0,0 +1,108 @@
+"""Repertoire snapshots and version-based delta sync.
+
+Every transaction that writes openings, lines or nodes takes the next value
+of the single-row ``repertoire_version`` counter and stamps it on each row it
+writes.  Incrementing the counter row locks it until the transaction ends,
+so versions become visible in commit order: a client that has seen version
+``v`` is missing exactly the rows with ``version > v``.  The stamping hooks
+are attached to the writable ``db_session`` factory by
+:func:`install_version_stamping`, which the app and the worker call at
+startup; flushes that touch no repertoire rows never take the counter.
+
+Tables are sent column-wise (one array per column) so the field names are
+not repeated for each of thousands of nodes.
+"""
+from __future__ import annotations
+
+from itertools import chain
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from .db import Session as WriteSession, get_engine, get_read_engine, read_session
+from .models import Line, Node, Opening, RepertoireVersion
+
+_SESSION_KEY = "repertoire_version"
+_VERSIONED = (Opening, Line, Node)
+
+OPENING_COLUMNS = ("id", "name", "side", "tags")
+LINE_COLUMNS = ("id", "opening_id", "title", "is_main")
+NODE_COLUMNS = ("id", "line_id", "parent_id", "san", "ply", "fen", "position_id", "comment")
+
+
+def next_version(session: Session) -> int:
+    """The version this transaction stamps on its rows, allocated on first use."""
+    version = session.info.get(_SESSION_KEY)
+    if version is None:
+        version = session.execute(
+            update(RepertoireVersion)
+            .where(RepertoireVersion.id == 1)
+            .values(value=RepertoireVersion.value + 1)
+            .returning(RepertoireVersion.value)
+        ).scalar_one()
+        session.info[_SESSION_KEY] = version
+    return version
+
+
+def current_version(session: Session) -> int:
+    return session.execute(select(RepertoireVersion.value).where(RepertoireVersion.id == 1)).scalar_one()
+
+
+def read_revision() -> int | None:
+    """The repertoire version ``read_session`` sees when it reads a replica, else ``None``.
+
+    Response-cache scopes are bumped as soon as the primary commits.  Mixed
+    into an ETag, the replica's own version keeps a body built before the
+    replica applied a write from being cached under that write's tag.
+    """
+    if get_read_engine() is get_engine():
+        return None
+    return current_version(read_session)
+
+
+def install_version_stamping() -> None:
+    """Stamp repertoire versions on flushes of ``db_session``; safe to call more than once."""
+    if event.contains(WriteSession, "before_flush", _stamp_versions):
+        return
+    event.listen(WriteSession, "before_flush", _stamp_versions)
+    event.listen(WriteSession, "after_commit", _release_version)
+    event.listen(WriteSession, "after_soft_rollback", _release_version)
+
+
+def _stamp_versions(session: Session, flush_context, instances) -> None:
+    # Eval writes and other non-repertoire flushes leave the counter row alone.
+    if not any(isinstance(obj, _VERSIONED) for obj in chain(session.new, session.dirty, session.deleted)):
+        return
+    changed = [obj for obj in session.new if isinstance(obj, _VERSIONED)]
+    changed += [obj for obj in session.dirty if isinstance(obj, _VERSIONED) and session.is_modified(obj)]
+    if changed:
+        version = next_version(session)
+        for obj in changed:
+            obj.version = version
+
+
+def _release_version(session: Session, *args) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _columns(session: Session, model, names: tuple[str, ...], since: int | None, upto: int) -> dict[str, list]:
+    query = select(*(getattr(model, name) for name in names)).where(model.version <= upto)
+    if since is not None:
+        query = query.where(model.version > since)
+    rows = session.execute(query.order_by(model.id)).all()
+    return {name: [row[index] for row in rows] for index, name in enumerate(names)}
+
+
+def repertoire_tables(session: Session, since: int | None = None, version: int | None = None) -> dict:
+    """Column-wise openings, lines and nodes, all of them or only those changed after ``since``.
+
+    Rows are read as of ``version``, the current version by default.
+    """
+    if version is None:
+        version = current_version(session)
+    return {
+        "version": version,
+        "openings": _columns(session, Opening, OPENING_COLUMNS, since, version),
+        "lines": _columns(session, Line, LINE_COLUMNS, since, version),
+        "nodes": _columns(session, Node, NODE_COLUMNS, since, version),
+    }
@@ -2,13 +2,19 @@ from __future__ import annotations
 
 import pytest
 
-from ..db import Base, init_engine, get_engine, db_session
+from ..db import Base, init_engine, get_engine, db_session, read_session
+from ..bitboards import bitboard_index
+from ..eval_cache import eval_cache
+from ..explorer import repertoire_index
+from ..response_cache import response_cache
+from ..sync import install_version_stamping
 
 
 def pytest_configure():
     init_engine("sqlite:///:memory:")
     engine = get_engine()
     Base.metadata.create_all(engine)
+    install_version_stamping()
 
 
 @pytest.fixture(autouse=True)
@@ -16,7 +22,13 @@ def session_scope():
     connection = get_engine().connect()
     trans = connection.begin()
     db_session.configure(bind=connection)
+    read_session.configure(bind=connection)
+    eval_cache.clear()
+    repertoire_index.clear()
+    bitboard_index.clear()
+    response_cache.clear()
     yield
     db_session.remove()
+    read_session.remove()
     trans.rollback()
     connection.close()
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from redis.exceptions import WatchError
+
+from .. import analysis_queue
+from ..analysis_queue import AnalysisQuotaExceeded, _reserve_slot, analysis_job_id
+
+
+class FakeRedis:
+    """Just enough of redis-py's sets and WATCH/MULTI pipelines for quota checks."""
+
+    def __init__(self):
+        self.sets: dict[str, set[bytes]] = {}
+        self.writes: dict[str, int] = {}
+        self.after_read = None
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def smembers(self, key):
+        return FakePipeline(self).smembers(key)
+
+    def write(self, key, update):
+        update(self.sets.setdefault(key, set()))
+        self.writes[key] = self.writes.get(key, 0) + 1
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.watched: dict[str, int] = {}
+        self.queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        self.watched[key] = self.redis.writes.get(key, 0)
+
+    def unwatch(self):
+        self.watched.clear()
+
+    def smembers(self, key):
+        members = set(self.redis.sets.get(key, set()))
+        if self.redis.after_read is not None:
+            hook, self.redis.after_read = self.redis.after_read, None
+            hook()
+        return members
+
+    def multi(self):
+        self.queued = []
+
+    def sadd(self, key, *members):
+        self.queued.append((key, lambda members_set: members_set.update(m.encode() for m in members)))
+
+    def srem(self, key, *members):
+        self.queued.append((key, lambda members_set: members_set.difference_update(m.encode() for m in members)))
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute(self):
+        if any(self.redis.writes.get(key, 0) != seen for key, seen in self.watched.items()):
+            self.watched.clear()
+            raise WatchError()
+        for key, update in self.queued:
+            self.redis.write(key, update)
+        self.watched.clear()
+        return []
+
+
+def test_concurrent_reservations_cannot_overshoot_the_quota(monkeypatch):
+    monkeypatch.setitem(analysis_queue.CLIENT_QUOTAS, "bulk", 2)
+    active = mock.Mock(**{"get_status.return_value": "started"})
+    monkeypatch.setattr(analysis_queue.Job, "fetch_many", lambda ids, connection: [active for _ in ids])
+    redis = FakeRedis()
+    key = f"{analysis_queue.CLIENT_PREFIX}alice:bulk"
+    _reserve_slot(redis, "alice", "bulk", "job-1")
+
+    # A second request reserves its slot between our read and our write.
+    redis.after_read = lambda: _reserve_slot(redis, "alice", "bulk", "job-2")
+    with pytest.raises(AnalysisQuotaExceeded):
+        _reserve_slot(redis, "alice", "bulk", "job-3")
+    assert redis.sets[key] == {b"job-1", b"job-2"}
+
+    # Re-reserving a job the client already holds is not a new slot.
+    _reserve_slot(redis, "alice", "bulk", "job-2")
+    assert redis.sets[key] == {b"job-1", b"job-2"}
+
+
+def test_bulk_yields_only_when_no_worker_is_idle(monkeypatch):
+    from rq.worker import WorkerStatus
+
+    states = []
+    monkeypatch.setattr(analysis_queue.Queue, "count", property(lambda queue: queued))
+    monkeypatch.setattr(
+        analysis_queue.Worker,
+        "all",
+        lambda queue: [mock.Mock(**{"get_state.return_value": state}) for state in states],
+    )
+
+    redis = mock.Mock()
+    queued = 0
+    assert not analysis_queue.interactive_waiting(redis)
+    queued, states = 1, [WorkerStatus.BUSY, WorkerStatus.IDLE]
+    assert not analysis_queue.interactive_waiting(redis)
+    queued = 2
+    assert analysis_queue.interactive_waiting(redis)
+    queued, states = 1, [WorkerStatus.BUSY]
+    assert analysis_queue.interactive_waiting(redis)
+
+
+def test_analysis_job_id_ignores_move_clocks():
+    first = analysis_job_id("8/8/8/8/8/8/8/K6k w - - 0 10", 12, 3)
+    assert first == analysis_job_id("8/8/8/8/8/8/8/K6k w - - 4 12", 12, 3)
+    assert first != analysis_job_id("8/8/8/8/8/8/8/K6k w - - 0 10", 14, 3)
+
+
+@pytest.mark.parametrize(
+    ("statuses", "coalesced"),
+    [
+        # A job that has waited in the queue past its run timeout is still joined.
+        (["queued"], True),
+        # A job whose worker died (RQ marks it failed) no longer blocks a new search.
+        (["failed"], False),
+        # Another request enqueued between the status read and the transaction.
+        (["finished", "queued"], True),
+    ],
+)
+def test_enqueue_coalesces_by_job_status(monkeypatch, statuses, coalesced):
+    redis = mock.MagicMock()
+    pipe = redis.pipeline.return_value.__enter__.return_value
+    pipe.execute.side_effect = [[1, True]] + [WatchError()] * (len(statuses) - 1) + [[True]]
+    queue = mock.Mock(connection=redis)
+    queue.name = analysis_queue.QUEUE_NAME
+    reads = iter(statuses)
+    monkeypatch.setattr(
+        analysis_queue,
+        "_fetch_job",
+        lambda redis, job_id: mock.Mock(origin=queue.name, get_status=mock.Mock(return_value=next(reads, statuses[-1]))),
+    )
+
+    job_id, attached = analysis_queue.enqueue_analysis(queue, 1, "8/8/8/8/8/8/8/K6k w - - 0 1", 12, 1)
+
+    assert attached is coalesced
+    assert job_id == analysis_job_id("8/8/8/8/8/8/8/K6k w - - 0 1", 12, 1)
+    # One execute records the waiter and each status read but the last lost a WATCH race.
+    committed = pipe.execute.call_count - len(statuses)
+    assert committed == (0 if coalesced else 1)
+    assert queue.enqueue.call_args is None or queue.enqueue.call_args.kwargs["pipeline"] is pipe
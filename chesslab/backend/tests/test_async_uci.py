@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import stat
+import sys
+
+import pytest
+
+from ..engine.async_uci import AsyncEnginePool, AsyncUCIEngine
+from ..engine.pool import PoolSettings
+
+FAKE_ENGINE = '''
+import sys
+for raw in sys.stdin:
+    cmd = raw.strip()
+    if cmd == "uci":
+        print("id name Fake")
+        print("uciok")
+    elif cmd.startswith("go"):
+        print("info depth 1 multipv 1 score cp 30 nodes 10 pv e2e4")
+        print("info depth 1 currmove e2e4 currmovenumber 1")
+        print("info depth 1 multipv 2 score cp 20 nodes 20 pv d2d4")
+        print("info depth 2 multipv 1 score cp 40 lowerbound nodes 30 pv e2e4")
+        print("info depth 2 multipv 1 score cp 35 nodes 40 pv e2e4 e7e5")
+        print("info depth 2 multipv 2 score mate 3 nodes 50 pv d2d4 d7d5")
+        print("bestmove e2e4")
+    elif cmd == "quit":
+        break
+    sys.stdout.flush()
+'''
+
+
+@pytest.fixture
+def fake_engine(tmp_path):
+    path = tmp_path / "fake_engine"
+    path.write_text(f"#!{sys.executable}\n{FAKE_ENGINE}")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_async_engine_streams_snapshots(fake_engine):
+    async def run():
+        engine = await AsyncUCIEngine.start(fake_engine)
+        async with engine:
+            return [snap async for snap in engine.analyse_stream("startpos", depth=2, multipv=2)]
+
+    snapshots = asyncio.run(run())
+    assert [[entry["depth"] for entry in snap] for snap in snapshots] == [[1, 1], [2, 2]]
+    assert snapshots[-1][1]["score_mate"] == 3
+
+
+def test_async_pool_multiplexes_searches(fake_engine):
+    async def run():
+        pool = AsyncEnginePool(PoolSettings.resolve(2, max_waiters=0), factory=lambda: AsyncUCIEngine.start(fake_engine))
+        try:
+            results = await pool.analyse_many(["startpos"] * 5, depth=2, multipv=2)
+            return results, pool._spawned
+        finally:
+            await pool.close()
+
+    results, spawned = asyncio.run(run())
+    assert len(results) == 5 and all(result[0]["score_cp"] == 35 for result in results)
+    assert spawned == 2
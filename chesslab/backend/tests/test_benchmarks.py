@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from ..benchmarks.suite import FAKE_ENGINE, compare, summarize
+from ..benchmarks.synthetic import build_repertoire
+from ..db import db_session
+from ..engine.adaptive import StabilityMonitor
+from ..engine.uci import UCIEngine
+from ..models import Line
+
+
+def test_fake_engine_reports_every_depth_and_settles():
+    engine = UCIEngine(FAKE_ENGINE)
+    try:
+        results = engine.analyse("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1", depth=12, multipv=3)
+        assert [entry["multipv"] for entry in results] == [1, 2, 3]
+        assert all(entry["depth"] == 12 for entry in results)
+        assert results[0]["score_cp"] > results[1]["score_cp"]
+
+        monitor = StabilityMonitor(window_cp=0, iterations=3, min_depth=1)
+        engine.analyse("8/8/8/8/8/2k5/8/K1Q5 w - - 0 1", depth=20, multipv=1, monitor=monitor)
+        assert monitor.stopped_at is not None and monitor.stopped_at <= 10
+    finally:
+        engine.close()
+
+
+def test_synthetic_repertoire_branches():
+    repertoire = build_repertoire(db_session, openings=2, games_per_opening=4, plies=10, seed=1)
+    assert len(repertoire.line_ids) == 2
+    # Later games branch off earlier ones, so lines share their trunk.
+    assert 10 < repertoire.nodes < 2 * 4 * 10
+    assert db_session.query(Line).count() == 2
+
+
+def test_compare_flags_slower_cases_and_extra_queries():
+    baseline = [summarize("a", [1.0, 1.0, 1.0], [2, 2, 2]), summarize("b", [1.0, 1.0], [1, 1])]
+    current = [summarize("a", [1.1, 1.1, 1.1], [2, 2, 2]), summarize("b", [1.0, 1.0], [1, 2])]
+    assert compare(current, baseline, tolerance=0.25) == ["b"]
+    current[0] = summarize("a", [2.0, 2.0], [2, 2])
+    assert compare(current, baseline, tolerance=0.25) == ["a", "b"]
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import io
+
+import chess
+
+from ..app import create_app
+from ..bitboards import BitboardIndex, parse_material, parse_piece_pattern, placement_bitboards
+from ..db import db_session
+from ..models import Line, Node, Opening
+from ..pgn_import import import_games
+
+
+def _line(title):
+    opening = Opening(name=title, side="white")
+    db_session.add(opening)
+    db_session.flush()
+    line = Line(opening_id=opening.id, title=title, is_main=False)
+    db_session.add(line)
+    db_session.flush()
+    return line
+
+
+def _fens(node_ids):
+    return {node.fen for node in db_session.query(Node).filter(Node.id.in_(node_ids))}
+
+
+def test_search_by_pattern_material_and_pawns_grows_incrementally():
+    french = _line("French")
+    import_games(db_session, io.StringIO("1. e4 e6 2. d4 d5 3. e5 c5 4. Nf3 *"), french.id)
+
+    index = BitboardIndex()
+    advance = index.search(db_session, pieces=parse_piece_pattern("Pe5,Nf3"))
+    assert len(advance) == 1
+    assert _fens(advance) == {"rnbqkbnr/pp3ppp/4p3/2ppP3/3P4/5N2/PPP2PPP/RNBQKB1R b KQkq - 1 4"}
+
+    full = parse_material("KQRRBBNNPPPPPPPPvKQRRBBNNPPPPPPPP")
+    assert len(index.search(db_session, material=full)) == 7
+    assert index.search(db_session, pieces=parse_piece_pattern("Pe5"), line_id=french.id + 1) == []
+
+    sicilian = _line("Sicilian")
+    import_games(db_session, io.StringIO("1. e4 c5 2. Nf3 d6 3. d4 cxd4 *"), sicilian.id)
+    assert len(index.search(db_session, material=full)) == 12
+    board = chess.Board()
+    for san in ["e4", "c5", "Nf3", "d6", "d4", "cxd4"]:
+        board.push_san(san)
+    boards = placement_bitboards(board.fen())
+    pawns = (boards[0], boards[6])
+    assert _fens(index.search(db_session, pawns=pawns)) == {board.fen()}
+    pawn_down = index.search(db_session, material=parse_material("KQRRBBNNPPPPPPPvKQRRBBNNPPPPPPPP"))
+    assert _fens(pawn_down) == {board.fen()}
+    assert index.stats()["nodes"] == 13
+
+
+def test_refresh_follows_commit_order_not_ids():
+    line = _line("Out of order")
+    base = (db_session.query(Node.id).order_by(Node.id.desc()).limit(1).scalar() or 0) + 1
+    e4 = chess.Board()
+    e4.push_san("e4")
+    d4 = chess.Board()
+    d4.push_san("d4")
+
+    index = BitboardIndex()
+    db_session.add(Node(id=base + 100, line_id=line.id, san="e4", ply=1, fen=e4.fen()))
+    db_session.commit()
+    assert index.search(db_session, pieces=parse_piece_pattern("Pe4"), line_id=line.id) == [base + 100]
+
+    # A transaction that took a lower ID commits after the higher one was indexed.
+    late = Node(id=base, line_id=line.id, san="d4", ply=1, fen=d4.fen())
+    db_session.add(late)
+    db_session.commit()
+    assert index.search(db_session, pieces=parse_piece_pattern("Pd4"), line_id=line.id) == [base]
+
+    late.comment = "Queen's pawn"
+    db_session.commit()
+    assert index.refresh(db_session) == 0
+    assert index.stats()["nodes"] == 2
+
+
+def test_search_endpoint_clamps_limit():
+    client = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SOCKETIO_MESSAGE_QUEUE": "",
+            "RESPONSE_CACHE_REDIS": False,
+            "METRICS_REDIS": False,
+        }
+    ).test_client()
+    line = _line("Limits")
+    import_games(db_session, io.StringIO("1. e4 e6 2. d4 d5 *"), line.id)
+
+    full = "KQRRBBNNPPPPPPPPvKQRRBBNNPPPPPPPP"
+    for limit, returned in [(-1, 1), (0, 1), (2, 2), (10_000, 4)]:
+        query = {"material": full, "line_id": line.id, "limit": limit}
+        body = client.get("/api/search/positions", query_string=query).get_json()
+        assert body["total"] == 4
+        assert len(body["nodes"]) == returned
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import text
+
+from ..db import build_engine, default_profile, engine_options, read_session
+from ..models import Opening
+
+
+def test_sqlite_profile_sets_wal_pragmas(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+
+def test_postgres_profile_tunes_the_pool():
+    assert default_profile("postgresql+psycopg2://db/chesslab") == "postgres"
+    options = engine_options("postgresql+psycopg2://db/chesslab")
+    assert options["pool_pre_ping"] and options["pool_size"] == 10 and options["max_overflow"] == 20
+    assert "connect_args" not in options
+    assert engine_options("postgresql+psycopg://db/chesslab")["connect_args"] == {"prepare_threshold": 5}
+    assert engine_options("sqlite:///chesslab.db") == {}
+    with pytest.raises(ValueError):
+        engine_options("sqlite:///chesslab.db", "oracle")
+
+
+def test_read_session_refuses_writes():
+    read_session.add(Opening(name="Scratch"))
+    with pytest.raises(RuntimeError):
+        read_session.flush()
+    read_session.rollback()
+
+
+def test_replica_version_is_mixed_into_etags(monkeypatch):
+    from ..app import create_app
+    from .. import sync
+
+    client = create_app(
+        {"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "SOCKETIO_MESSAGE_QUEUE": "", "RESPONSE_CACHE_REDIS": False}
+    ).test_client()
+    assert sync.read_revision() is None
+    # Pretend read_session reads a replica; here it shares the primary's connection.
+    monkeypatch.setattr(sync, "get_read_engine", lambda: object())
+
+    lagging = client.get("/api/openings")
+    # The replica applies a write whose scope bump the web process has already seen.
+    read_session.execute(text("UPDATE repertoire_version SET value = value + 1"))
+    caught_up = client.get("/api/openings", headers={"If-None-Match": lagging.headers["ETag"]})
+    assert caught_up.status_code == 200 and caught_up.headers["ETag"] != lagging.headers["ETag"]
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import chess
+
+from ..db import db_session
+from ..encoding import pack_pv, unpack_pv, zobrist_key
+from ..models import Eval
+from ..positions import get_or_create_position
+
+
+def test_pv_round_trip_is_two_bytes_per_move():
+    pv = "e2e4 e7e5 g1f3 b8c6 e7e8q a2a1n 0000"
+    packed = pack_pv(pv)
+    assert len(packed) == 14
+    assert unpack_pv(packed) == pv
+
+
+def test_zobrist_matches_polyglot_and_ignores_clocks():
+    assert zobrist_key(chess.STARTING_FEN) == 0x463B96181691FC9C
+    after_e4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+    assert zobrist_key(after_e4) == zobrist_key(after_e4.replace("0 1", "7 30"))
+    assert zobrist_key(after_e4) < 0  # 0x823c9b50fd114196 is stored as a signed BIGINT
+    assert zobrist_key("startpos") is None
+
+
+def test_eval_stores_packed_pv_with_text_fallback():
+    position = get_or_create_position(db_session, chess.STARTING_FEN)
+    packed = Eval(position_id=position.id, depth=10, multipv=1, pv_uci="e2e4 e7e5")
+    legacy = Eval(position_id=position.id, depth=10, multipv=2, pv_uci="not a move")
+    db_session.add_all([packed, legacy])
+    db_session.flush()
+
+    assert packed.pv_text is None and packed.pv_uci == "e2e4 e7e5"
+    assert legacy.pv_packed is None and legacy.pv_uci == "not a move"
+    assert position.zobrist == zobrist_key(chess.STARTING_FEN)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from ..engine.pool import EnginePool, EnginePoolExhausted
+
+
+class FakeEngine:
+    def __init__(self):
+        self.options = {}
+        self.closed = False
+        self.active = 0
+        self.max_active = 0
+
+    def set_option(self, name, value):
+        self.options[name] = value
+
+    def analyse(self, fen, *, depth=None, multipv=3):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.active -= 1
+        return [{"multipv": 1, "depth": depth}]
+
+    def close(self):
+        self.closed = True
+
+
+def test_checkout_is_exclusive_and_reuses_engines():
+    created = []
+
+    def factory():
+        engine = FakeEngine()
+        created.append(engine)
+        return engine
+
+    pool = EnginePool(size=2, threads=2, hash_mb=32, max_waiters=0, factory=factory)
+    first = pool.checkout()
+    second = pool.checkout()
+    assert first is not second
+    assert first.options == {"Threads": 2, "Hash": 32}
+
+    with pytest.raises(EnginePoolExhausted):
+        pool.checkout(timeout=0.01)
+
+    pool.checkin(first)
+    assert pool.checkout() is first
+    assert len(created) == 2
+
+
+def test_waiter_receives_engine_on_checkin():
+    pool = EnginePool(size=1, max_waiters=1, factory=FakeEngine)
+    held = pool.checkout()
+    received = []
+
+    waiter = threading.Thread(target=lambda: received.append(pool.checkout(timeout=2)))
+    waiter.start()
+    pool.checkin(held)
+    waiter.join(timeout=2)
+
+    assert received == [held]
+    assert pool.stats()["busy"] == 1
+
+
+def test_failed_session_discards_engine():
+    from ..engine.uci import UCIEngineError
+
+    pool = EnginePool(size=1, factory=FakeEngine)
+    with pytest.raises(UCIEngineError):
+        with pool.session() as engine:
+            raise UCIEngineError("boom")
+    assert engine.closed
+    assert pool.stats()["spawned"] == 0
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import json
 from unittest import mock
 
 import pytest
 
 from ..models import Eval, Node, Line, Opening
 from ..db import db_session
+from ..eval_cache import EvalCache
+from ..positions import get_or_create_position, position_for_node
 from ..socketio_server import emit_eval_update
 from ..worker import perform_analysis
 
@@ -14,7 +17,7 @@ class SocketRecorder:
     def __init__(self):
         self.messages = []
 
-    def __call__(self, node_id, payload):
+    def __call__(self, node_id, payload, line_id=None):
         self.messages.append((node_id, payload))
 
 
@@ -38,18 +41,173 @@ def test_server_job_writes_evals(monkeypatch):
     ]
 
     recorder = SocketRecorder()
+    partials = SocketRecorder()
     monkeypatch.setattr("chesslab.backend.worker.emit_eval_update", recorder)
-    monkeypatch.setattr("chesslab.backend.engine.pool.analyse", lambda fen, depth, multipv: fake_results)
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_partial", partials)
+    monkeypatch.setattr("chesslab.backend.engine.pool.analyse_stream", lambda fen, **kw: iter([fake_results[:1], fake_results]))
 
     payload = perform_analysis(node.id, node.fen, depth=12, multipv=3)
 
     assert len(payload) == 3
     stored = (
         db_session.query(Eval)
-        .filter(Eval.node_id == node.id)
+        .filter(Eval.position_id == node.position_id)
         .order_by(Eval.multipv)
         .all()
     )
     assert len(stored) == 3
     assert recorder.messages[0][0] == node.id
     assert recorder.messages[0][1][0]["bestmove_uci"] == "e2e4"
+    assert len(partials.messages[0][1]) == 1
+
+
+def test_transposed_position_reuses_stored_eval(monkeypatch):
+    line = Line(opening_id=1, title="Transpositions", is_main=True)
+    db_session.add(line)
+    db_session.flush()
+
+    # Same position reached via different move orders; only the clocks differ.
+    first = Node(line_id=line.id, parent_id=None, san="Nf3", ply=3, fen="8/8/8/8/8/8/8/K6k w - - 0 10")
+    second = Node(line_id=line.id, parent_id=None, san="Nc3", ply=5, fen="8/8/8/8/8/8/8/K6k w - - 4 12")
+    db_session.add_all([first, second])
+    db_session.flush()
+
+    calls = []
+
+    def fake_analyse(fen, **kwargs):
+        calls.append(fen)
+        yield [{"multipv": 1, "pv_uci": "a1b1", "score_cp": 0, "bestmove_uci": "a1b1"}]
+
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_update", SocketRecorder())
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_partial", SocketRecorder())
+    monkeypatch.setattr("chesslab.backend.engine.pool.analyse_stream", fake_analyse)
+
+    perform_analysis(first.id, first.fen, depth=12, multipv=1)
+    payload = perform_analysis(second.id, second.fen, depth=12, multipv=1)
+
+    assert len(calls) == 1
+    assert first.position_id == second.position_id
+    assert payload[0]["bestmove_uci"] == "a1b1"
+
+
+def test_deeper_eval_satisfies_shallower_request():
+    position = get_or_create_position(db_session, "8/8/8/8/8/8/8/K6k w - - 0 1")
+    for depth in (10, 22):
+        for multipv in (1, 2):
+            db_session.add(Eval(position_id=position.id, depth=depth, multipv=multipv, score_cp=depth, engine_mode="server"))
+    db_session.flush()
+
+    cache = EvalCache(max_entries=10)
+    rows = cache.lookup(db_session, position.id, depth=12, multipv=2)
+    assert [row["depth"] for row in rows] == [22, 22]
+
+    assert cache.lookup(db_session, position.id, depth=16, multipv=1)[0]["score_cp"] == 22
+    assert cache.lookup(db_session, position.id, depth=30, multipv=1) == []
+    stats = cache.stats()
+    assert (stats["db_hits"], stats["lru_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_settled_search_answers_up_to_its_requested_depth(monkeypatch):
+    opening = Opening(name="Settled", side="white")
+    db_session.add(opening)
+    db_session.flush()
+    line = Line(opening_id=opening.id, title="Settled line", is_main=True)
+    db_session.add(line)
+    db_session.flush()
+    node = Node(line_id=line.id, parent_id=None, san="Kb1", ply=1, fen="8/8/8/8/8/8/8/K5k1 w - - 0 1")
+    db_session.add(node)
+    db_session.flush()
+    position = position_for_node(db_session, node)
+    settled = [{"multipv": 1, "depth": 11, "pv_uci": "a1b1", "score_cp": 0, "bestmove_uci": "a1b1"}]
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_update", lambda *args, **kwargs: None)
+    monkeypatch.setattr("chesslab.backend.engine.pool.analyse_stream", lambda fen, **kw: iter([settled]))
+
+    payload = perform_analysis(node.id, node.fen, depth=20, multipv=1)
+    stored = db_session.query(Eval).filter(Eval.position_id == position.id).one()
+    assert (payload[0]["depth"], stored.depth, stored.requested_depth) == (11, 11, 20)
+
+    cache = EvalCache(max_entries=10)
+    assert cache.lookup(db_session, position.id, depth=20, multipv=1)[0]["depth"] == 11
+    assert cache.lookup(db_session, position.id, depth=18, multipv=1)[0]["depth"] == 11
+    assert cache.lookup(db_session, position.id, depth=22, multipv=1) == []
+    assert cache.stats()["lru_hits"] == 1
+
+
+def test_lru_evicts_and_invalidates():
+    positions = [get_or_create_position(db_session, f"8/8/8/8/8/8/8/K{idx}k w - - 0 1") for idx in range(1, 4)]
+    for position in positions:
+        db_session.add(Eval(position_id=position.id, depth=12, multipv=1, score_cp=0))
+    db_session.flush()
+
+    cache = EvalCache(max_entries=2)
+    for position in positions:
+        cache.lookup(db_session, position.id, depth=12, multipv=1)
+    assert cache.stats()["evictions"] == 1
+
+    cache.invalidate(positions[-1].id)
+    cache.lookup(db_session, positions[-1].id, depth=12, multipv=1)
+    assert cache.stats()["db_hits"] == 4
+
+
+class FakeRedis:
+    """A dict behind redis-py's get/set and WATCH/MULTI pipeline calls."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.writes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def watch(self, key):
+        pass
+
+    def unwatch(self):
+        pass
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def multi(self):
+        pass
+
+    def set(self, key, value, ex=None):
+        self.writes.append((key, value))
+
+    def execute(self):
+        self.redis.values.update(self.writes)
+
+
+def test_sql_fill_never_replaces_a_deeper_redis_entry():
+    position = get_or_create_position(db_session, "8/8/8/8/8/8/8/K2k4 w - - 0 1")
+    for multipv in (1, 2):
+        db_session.add(Eval(position_id=position.id, depth=12, multipv=multipv, score_cp=5))
+    db_session.flush()
+    cache = EvalCache(max_entries=0)
+    cache.redis = FakeRedis()
+    key = cache.redis_prefix + str(position.id)
+    # Cached by another process after this reader's SQL query ran.
+    deeper = {"depth": 24, "covers": 24, "evals": [{"multipv": 1, "depth": 24, "score_cp": 40}]}
+    cache.redis.values[key] = json.dumps(deeper).encode()
+
+    # The cached entry has one line, so a two-line request falls through to SQL.
+    assert len(cache.lookup(db_session, position.id, depth=12, multipv=2)) == 2
+    assert json.loads(cache.redis.values[key]) == deeper
+
+    del cache.redis.values[key]
+    cache.lookup(db_session, position.id, depth=12, multipv=2)
+    assert json.loads(cache.redis.values[key])["depth"] == 12
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pytest
+
+from ..app import create_app
+
+
+@pytest.fixture
+def client():
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SOCKETIO_MESSAGE_QUEUE": "",
+            "RESPONSE_CACHE_REDIS": False,
+            "METRICS_REDIS": False,
+        }
+    )
+    return app.test_client()
+
+
+def test_curve_follows_posted_evals(client, monkeypatch):
+    monkeypatch.setattr("chesslab.backend.api.evals.emit_eval_update", lambda *args, **kwargs: None)
+    opening = client.post("/api/openings", json={"name": "Scandinavian"}).get_json()
+    line_id = client.get(f"/api/openings/{opening['id']}/lines").get_json()[0]["id"]
+    e4 = client.post(f"/api/lines/{line_id}/nodes", json={"san": "e4"}).get_json()
+    d5 = client.post(f"/api/lines/{line_id}/nodes", json={"parent_id": e4["id"], "san": "d5"}).get_json()
+
+    client.post("/api/eval", json={"node_id": e4["id"], "evals": [{"depth": 16, "multipv": 1, "score_cp": 30}]})
+    first = client.get(f"/api/lines/{line_id}/eval-curve")
+    assert first.get_json() == [
+        {"node_id": e4["id"], "ply": 1, "depth": 16, "score_cp": 30, "score_mate": None},
+        {"node_id": d5["id"], "ply": 2, "depth": None, "score_cp": None, "score_mate": None},
+    ]
+
+    client.post("/api/eval", json={"node_id": d5["id"], "evals": [{"depth": 14, "multipv": 1, "score_cp": 55}]})
+    second = client.get(f"/api/lines/{line_id}/eval-curve", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200 and second.get_json()[1]["score_cp"] == 55
+    assert client.get(f"/api/lines/{line_id + 99}/eval-curve").status_code == 404
+
+
+def test_evals_elsewhere_keep_the_curve_etag(client, monkeypatch):
+    monkeypatch.setattr("chesslab.backend.api.evals.emit_eval_update", lambda *args, **kwargs: None)
+    lines = []
+    for name in ("French", "Caro-Kann"):
+        opening = client.post("/api/openings", json={"name": name}).get_json()
+        lines.append(client.get(f"/api/openings/{opening['id']}/lines").get_json()[0]["id"])
+    first = client.post(f"/api/lines/{lines[0]}/nodes", json={"san": "e4"}).get_json()
+    other = client.post(f"/api/lines/{lines[1]}/nodes", json={"san": "d4"}).get_json()
+    curve = client.get(f"/api/lines/{lines[0]}/eval-curve")
+
+    client.post("/api/eval", json={"node_id": other["id"], "evals": [{"depth": 12, "multipv": 1, "score_cp": 40}]})
+    unchanged = client.get(f"/api/lines/{lines[0]}/eval-curve", headers={"If-None-Match": curve.headers["ETag"]})
+    assert unchanged.status_code == 304
+
+    # The same position in another line shares its evals, so that curve changes too.
+    client.post(f"/api/lines/{lines[1]}/nodes", json={"san": "e4"})
+    curve = client.get(f"/api/lines/{lines[1]}/eval-curve")
+    client.post("/api/eval", json={"node_id": first["id"], "evals": [{"depth": 12, "multipv": 1, "score_cp": 35}]})
+    changed = client.get(f"/api/lines/{lines[1]}/eval-curve", headers={"If-None-Match": curve.headers["ETag"]})
+    assert changed.status_code == 200 and changed.get_json()[1]["score_cp"] == 35
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import chess
+
+from ..db import db_session
+from ..eval_store import eval_row, rebuild_summaries, upsert_evals
+from ..models import Eval, EvalSummary
+from ..positions import get_or_create_position
+
+
+def test_upsert_writes_many_positions_and_overwrites_on_conflict():
+    start = get_or_create_position(db_session, chess.STARTING_FEN)
+    after_e4 = get_or_create_position(db_session, "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+    rows = [
+        eval_row(start.id, 12, "server", {"multipv": 1, "pv_uci": "e2e4 e7e5", "score_cp": 30}),
+        eval_row(start.id, 12, "server", {"multipv": 2, "pv_uci": "d2d4", "score_cp": 25}),
+        eval_row(after_e4.id, 12, "server", {"multipv": 1, "pv_uci": "c7c5", "score_cp": -30}),
+    ]
+    first = upsert_evals(db_session, rows)
+    assert [(ev.position_id, ev.multipv) for ev in first] == [(start.id, 1), (start.id, 2), (after_e4.id, 1)]
+    assert first[0].pv_uci == "e2e4 e7e5"
+
+    again = upsert_evals(
+        db_session,
+        [
+            eval_row(start.id, 12, "server", {"multipv": 1, "pv_uci": "g1f3", "score_mate": 5}),
+            eval_row(start.id, 12, "server", {"multipv": 1, "pv_uci": "not a move", "score_cp": 1}),
+        ],
+    )
+    db_session.commit()
+    assert len(again) == 1 and again[0].id == first[0].id
+    assert db_session.query(Eval).count() == 3
+    stored = db_session.get(Eval, first[0].id)
+    assert (stored.pv_uci, stored.pv_packed, stored.score_cp, stored.score_mate) == ("not a move", None, 1, None)
+
+
+def test_summary_keeps_the_deepest_best_line():
+    start = get_or_create_position(db_session, chess.STARTING_FEN)
+    upsert_evals(db_session, [eval_row(start.id, 18, "server", {"multipv": 1, "score_cp": 35})])
+    upsert_evals(
+        db_session,
+        [
+            eval_row(start.id, 10, "client", {"multipv": 1, "score_cp": 80}),
+            eval_row(start.id, 20, "client", {"multipv": 2, "score_cp": -10}),
+        ],
+    )
+    summary = db_session.get(EvalSummary, start.id, populate_existing=True)
+    assert (summary.depth, summary.score_cp, summary.engine_mode) == (18, 35, "server")
+
+    upsert_evals(db_session, [eval_row(start.id, 22, "client", {"multipv": 1, "score_mate": 7})])
+    summary = db_session.get(EvalSummary, start.id, populate_existing=True)
+    assert (summary.depth, summary.score_cp, summary.score_mate) == (22, None, 7)
+
+    db_session.delete(summary)
+    db_session.flush()
+    assert rebuild_summaries(db_session) == 1
+    assert db_session.get(EvalSummary, start.id).depth == 22
+
+
+def test_requested_depth_never_drops_on_conflict():
+    position = get_or_create_position(db_session, "8/8/8/8/8/8/8/K1k5 w - - 0 1")
+    line = {"multipv": 1, "pv_uci": "a1a2", "score_cp": 0}
+    for requested in (20, 14, None, 22):
+        (stored,) = upsert_evals(db_session, [eval_row(position.id, 11, "server", line, requested_depth=requested)])
+        assert stored.requested_depth == (22 if requested == 22 else 20)
+
+    fresh = get_or_create_position(db_session, "8/8/8/8/8/8/8/K2k4 b - - 0 1")
+    (stored,) = upsert_evals(db_session, [eval_row(fresh.id, 11, "server", line)])
+    (stored,) = upsert_evals(db_session, [eval_row(fresh.id, 11, "server", line, requested_depth=16)])
+    assert stored.requested_depth == 16
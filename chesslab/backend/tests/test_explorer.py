@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import io
+
+import chess
+
+from ..db import db_session
+from ..encoding import zobrist_key
+from ..explorer import RepertoireIndex
+from ..models import Line, Node, Opening
+from ..pgn_import import import_games
+
+
+def _line(opening, title):
+    line = Line(opening_id=opening.id, title=title, is_main=False)
+    db_session.add(line)
+    db_session.flush()
+    return line
+
+
+def test_index_aggregates_moves_across_lines_and_updates_incrementally():
+    opening = Opening(name="Open games", side="white")
+    db_session.add(opening)
+    db_session.flush()
+    ruy = _line(opening, "Ruy")
+    italian = _line(opening, "Italian")
+    import_games(db_session, io.StringIO("1. e4 e5 2. Nf3 Nc6 3. Bb5 *"), ruy.id)
+    import_games(db_session, io.StringIO("1. e4 e5 2. Nf3 Nc6 3. Bc4 *"), italian.id)
+
+    index = RepertoireIndex()
+    start = index.moves(db_session, zobrist_key(chess.STARTING_FEN))
+    assert start["e4"].count == 2
+    assert start["e4"].line_ids == {ruy.id, italian.id}
+
+    after_nc6 = zobrist_key("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    assert set(index.moves(db_session, after_nc6)) == {"Bb5", "Bc4"}
+
+    import_games(db_session, io.StringIO("1. e4 e5 2. Nf3 Nc6 3. d4 *"), italian.id)
+    assert set(index.moves(db_session, after_nc6)) == {"Bb5", "Bc4", "d4"}
+    assert index.stats()["watermark"] > 0
+
+
+def test_refresh_follows_commit_order_not_ids():
+    opening = Opening(name="Flank", side="white")
+    db_session.add(opening)
+    db_session.flush()
+    line = _line(opening, "Flank")
+    start = zobrist_key(chess.STARTING_FEN)
+    base = (db_session.query(Node.id).order_by(Node.id.desc()).limit(1).scalar() or 0) + 1
+
+    index = RepertoireIndex()
+    db_session.add(Node(id=base + 100, line_id=line.id, san="c4", ply=1, fen="c4"))
+    db_session.commit()
+    assert index.moves(db_session, start)["c4"].count == 1
+
+    # A transaction that took a lower ID commits after the higher one was indexed.
+    late = Node(id=base, line_id=line.id, san="Nf3", ply=1, fen="Nf3")
+    db_session.add(late)
+    db_session.commit()
+    assert index.moves(db_session, start)["Nf3"].count == 1
+
+    # Updates restamp a node's version without adding another move.
+    late.comment = "Reti"
+    db_session.commit()
+    assert index.refresh(db_session) == 0
+    assert index.moves(db_session, start)["Nf3"].count == 1
+
+
+def test_returned_stats_are_detached_from_the_index():
+    opening = Opening(name="Queen's pawn", side="white")
+    db_session.add(opening)
+    db_session.flush()
+    first = _line(opening, "London")
+    import_games(db_session, io.StringIO("1. d4 d5 2. Bf4 *"), first.id)
+
+    index = RepertoireIndex()
+    start = zobrist_key(chess.STARTING_FEN)
+    snapshot = index.moves(db_session, start)["d4"]
+    count, line_ids = snapshot.count, set(snapshot.line_ids)
+
+    # A refresh mutates the index while the snapshot is still being serialized.
+    second = _line(opening, "Catalan")
+    import_games(db_session, io.StringIO("1. d4 Nf6 2. c4 *"), second.id)
+    assert index.moves(db_session, start)["d4"].count == count + 1
+    assert (snapshot.count, snapshot.line_ids) == (count, line_ids)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import pstats
+
+from ..app import create_app
+from ..metrics import Counter, Histogram, Registry
+
+
+def _app(tmp_path, **config):
+    return create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SOCKETIO_MESSAGE_QUEUE": "",
+            "RESPONSE_CACHE_REDIS": False,
+            "METRICS_REDIS": False,
+            "PROFILE_DIR": str(tmp_path),
+            **config,
+        }
+    )
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = Histogram(registry, "op_seconds", "Op latency.", ("op",), buckets=(0.1, 1.0))
+    calls = Counter(registry, "op_total", "Ops.", ("op",))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, op="read")
+    calls.inc(op="read")
+
+    text = registry.render()
+    assert 'op_seconds_bucket{op="read",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{op="read",le="1"} 2' in text
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 3' in text
+    assert 'op_seconds_sum{op="read"} 5.55' in text
+    assert 'op_total{op="read"} 1' in text
+
+
+def test_requests_are_counted_with_their_queries(tmp_path):
+    client = _app(tmp_path).test_client()
+    response = client.get("/api/openings")
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("app;dur=") and "queries" in timing
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'chesslab_http_requests_total{endpoint="/api/openings",method="GET",status="200"}' in text
+    assert 'chesslab_http_request_queries_count{endpoint="/api/openings"}' in text
+    assert "# TYPE chesslab_engine_search_seconds histogram" in text
+
+
+def test_profiling_is_opt_in(tmp_path):
+    assert "X-Profile-File" not in _app(tmp_path).test_client().get("/health", headers={"X-Profile": "1"}).headers
+
+    client = _app(tmp_path, REQUEST_PROFILING=True).test_client()
+    assert "X-Profile-File" not in client.get("/health").headers
+    path = client.get("/health", headers={"X-Profile": "1"}).headers["X-Profile-File"]
+    assert pstats.Stats(path).total_calls > 0
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import io
+
+from ..db import db_session
+from ..models import Line, Node, Position
+from ..pgn_import import import_games
+
+PGN = """[Event "One"]
+
+1. e4 e5 (1... c5 2. Nf3 {Open Sicilian} d6) 2. Nf3 Nc6 *
+
+[Event "Two"]
+
+1. e4 e5 2. Bc4 *
+"""
+
+
+def _line():
+    line = Line(opening_id=1, title="Imported", is_main=False)
+    db_session.add(line)
+    db_session.flush()
+    return line
+
+
+def test_import_keeps_variations_and_merges_games():
+    line = _line()
+    progress = []
+    stats = import_games(db_session, io.StringIO(PGN), line.id, batch_games=1, progress=progress.append)
+
+    nodes = db_session.query(Node).filter(Node.line_id == line.id).all()
+    by_path = {node.path: node for node in nodes}
+    sans = sorted(node.san for node in nodes)
+    assert sans == sorted(["e4", "e5", "c5", "Nf3", "d6", "Nf3", "Nc6", "Bc4"])
+    assert stats.games == 2
+    assert stats.nodes_created == 8
+    assert stats.max_ply == 4
+    assert len(progress) == 3
+
+    d6 = next(node for node in nodes if node.san == "d6")
+    nf3 = by_path[d6.path.rsplit("/", 2)[0] + "/"]
+    assert nf3.comment == "Open Sicilian"
+    assert nf3.position_id == db_session.query(Position.id).filter(Position.fen_key == " ".join(nf3.fen.split()[:4])).scalar()
+
+
+def test_reimport_creates_no_duplicates():
+    line = _line()
+    import_games(db_session, io.StringIO(PGN), line.id)
+    stats = import_games(db_session, io.StringIO(PGN), line.id)
+
+    assert stats.nodes_created == 0
+    assert db_session.query(Node).filter(Node.line_id == line.id).count() == 8
+
+
+def test_export_round_trips_every_variation():
+    import chess.pgn
+
+    from ..pgn_export import line_pgn
+
+    line = _line()
+    import_games(db_session, io.StringIO(PGN), line.id)
+    exported = "".join(line_pgn(db_session, line))
+
+    game = chess.pgn.read_game(io.StringIO(exported))
+    assert not game.errors
+    reimported = _line()
+    stats = import_games(db_session, io.StringIO(exported), reimported.id)
+    assert stats.nodes_created == 8
+    assert "{ Open Sicilian }" in exported
+
+
+def test_import_reports_games_from_a_set_up_position():
+    line = _line()
+    pgn = PGN + '\n[Event "Three"]\n[SetUp "1"]\n[FEN "4k3/8/8/8/8/8/4P3/4K3 w - - 0 1"]\n\n1. e4 *\n'
+    stats = import_games(db_session, io.StringIO(pgn), line.id)
+
+    assert stats.games == 2
+    assert stats.skipped == [{"game": 3, "reason": "starts from a set-up position (4k3/8/8/8/8/8/4P3/4K3 w - - 0 1)"}]
+    assert db_session.query(Node).filter(Node.line_id == line.id).count() == 8
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import chess
+from sqlalchemy import event
+
+from ..db import db_session
+from ..models import Position
+from ..positions import bulk_position_ids, normalize_fen
+
+AFTER_E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+
+def test_bulk_position_ids_tolerates_a_concurrent_insert():
+    connection = db_session.connection()
+    raced = normalize_fen(AFTER_E4)
+    pending = [raced]
+
+    def insert_first(conn, cursor, statement, parameters, context, executemany):
+        # Another writer commits the same position between our SELECT and INSERT.
+        if pending and statement.startswith("INSERT INTO positions"):
+            cursor.execute("INSERT INTO positions (fen_key, created_at) VALUES (?, CURRENT_TIMESTAMP)", (pending.pop(),))
+
+    event.listen(connection, "before_cursor_execute", insert_first)
+    try:
+        ids = bulk_position_ids(db_session, [chess.STARTING_FEN, AFTER_E4])
+    finally:
+        event.remove(connection, "before_cursor_execute", insert_first)
+
+    assert set(ids) == {normalize_fen(chess.STARTING_FEN), raced}
+    assert db_session.query(Position).filter(Position.fen_key == raced).one().id == ids[raced]
+    assert db_session.query(Position).filter(Position.fen_key.in_(list(ids))).count() == 2
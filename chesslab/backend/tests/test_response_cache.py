@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import pytest
+
+from ..app import create_app
+from ..response_cache import ResponseCache, response_cache
+
+
+@pytest.fixture
+def client():
+    app = create_app(
+        {"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "SOCKETIO_MESSAGE_QUEUE": "", "RESPONSE_CACHE_REDIS": False}
+    )
+    return app.test_client()
+
+
+def _line(client) -> int:
+    opening = client.post("/api/openings", json={"name": "Italian"}).get_json()
+    return client.get(f"/api/openings/{opening['id']}/lines").get_json()[0]["id"]
+
+
+def test_revalidation_returns_304_until_a_write(client):
+    first = client.get("/api/openings")
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    again = client.get("/api/openings", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+
+    client.post("/api/openings", json={"name": "Sicilian", "side": "black"})
+    changed = client.get("/api/openings", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert [op["name"] for op in changed.get_json()] == ["Sicilian"]
+
+
+def test_add_node_invalidates_line_nodes(client):
+    line_id = _line(client)
+    before = client.get(f"/api/lines/{line_id}/nodes")
+    client.post(f"/api/lines/{line_id}/nodes", json={"san": "e4"})
+
+    after = client.get(f"/api/lines/{line_id}/nodes", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert len(after.get_json()) == len(before.get_json()) + 1
+
+
+def test_node_list_keyset_pagination(client):
+    line_id = _line(client)
+    parent = None
+    for san in ["e4", "e5", "Nf3", "Nc6", "Bc4"]:
+        parent = client.post(f"/api/lines/{line_id}/nodes", json={"parent_id": parent, "san": san}).get_json()["id"]
+
+    seen, cursor = [], None
+    while True:
+        query = f"?limit=2&after={cursor}" if cursor else "?limit=2"
+        page = client.get(f"/api/lines/{line_id}/nodes{query}")
+        seen.extend(node["ply"] for node in page.get_json())
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [1, 2, 3, 4, 5]
+    assert client.get(f"/api/lines/{line_id}/nodes?after=bad").status_code == 400
+
+
+def test_cache_is_bounded_and_compresses_large_bodies():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", b"x")
+    cache.put("b", b"y" * 4096)
+    cache.put("c", b"z")
+    assert cache.get("a") is None
+    body, compressed, _ = cache.get("b")
+    assert compressed is not None and len(compressed) < len(body)
+    assert cache.stats()["evictions"] == 1
+    response_cache.clear()
+
+
+def test_eval_body_is_not_older_than_its_etag(client):
+    from ..db import db_session
+    from ..eval_store import eval_row, upsert_evals
+    from ..models import Node
+    from ..response_cache import position_scope
+
+    line_id = _line(client)
+    node_id = client.post(f"/api/lines/{line_id}/nodes", json={"san": "e4"}).get_json()["id"]
+    position_id = db_session.get(Node, node_id).position_id
+    upsert_evals(db_session, [eval_row(position_id, 12, "server", {"multipv": 1, "score_cp": 10})])
+    db_session.commit()
+    stale = client.get(f"/api/eval?node_id={node_id}&depth=12&multipv=1").get_json()
+    assert [ev["score_cp"] for ev in stale["evals"]] == [10]
+
+    # A worker in another process commits and bumps, but cannot clear this process's eval LRU.
+    upsert_evals(db_session, [eval_row(position_id, 14, "server", {"multipv": 1, "score_cp": 25})])
+    db_session.commit()
+    response_cache.bump(position_scope(position_id))
+
+    fresh = client.get(f"/api/eval?node_id={node_id}&depth=12&multipv=1").get_json()
+    assert [ev["score_cp"] for ev in fresh["evals"]] == [25]
+
+
+def test_server_mode_searches_when_fewer_lines_are_stored(client, monkeypatch):
+    from ..db import db_session
+    from ..eval_store import eval_row, upsert_evals
+    from ..models import Node
+
+    line_id = _line(client)
+    node_id = client.post(f"/api/lines/{line_id}/nodes", json={"san": "d4"}).get_json()["id"]
+    position_id = db_session.get(Node, node_id).position_id
+    upsert_evals(db_session, [eval_row(position_id, 16, "client", {"multipv": 1, "score_cp": 20})])
+    db_session.commit()
+    enqueued = []
+    monkeypatch.setattr("chesslab.backend.api.evals.get_queue", lambda priority: None)
+    monkeypatch.setattr(
+        "chesslab.backend.api.evals.enqueue_analysis",
+        lambda queue, node_id, fen, depth, multipv, client=None: enqueued.append(multipv) or ("job", False),
+    )
+
+    single = client.get(f"/api/eval?node_id={node_id}&depth=12&multipv=1&mode=server").get_json()
+    assert single["pending"] is False and len(single["evals"]) == 1
+    wider = client.get(f"/api/eval?node_id={node_id}&depth=12&multipv=3&mode=server").get_json()
+    assert wider["pending"] is True and enqueued == [3]
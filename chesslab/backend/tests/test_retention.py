@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from ..db import db_session
+from ..eval_cache import EvalCache
+from ..models import Eval
+from ..positions import get_or_create_position
+from ..retention import RetentionPolicy, compact_evals
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def _store(position_id, depth, lines, mode="client", created_at=None):
+    for multipv in range(1, lines + 1):
+        db_session.add(
+            Eval(
+                position_id=position_id,
+                depth=depth,
+                multipv=multipv,
+                pv_uci="e2e4",
+                score_cp=depth * 10 + multipv,
+                engine_mode=mode,
+                created_at=created_at or datetime.utcnow() - timedelta(minutes=1),
+            )
+        )
+    db_session.flush()
+
+
+def _depths(position_id):
+    return sorted({ev.depth for ev in db_session.query(Eval).filter(Eval.position_id == position_id)})
+
+
+def test_policy_keeps_depths_not_covered_by_deeper_ones():
+    widths = {8: 3, 10: 1, 12: 3, 14: 1, 16: 1}
+    assert sorted(RetentionPolicy(keep_depths=1).superseded(widths)) == [8, 10, 14]
+    assert sorted(RetentionPolicy(keep_depths=2).superseded(widths)) == [10]
+
+
+def test_compaction_preserves_lookup_answers():
+    position = get_or_create_position(db_session, START_FEN)
+    for depth in range(8, 19, 2):
+        _store(position.id, depth, 3 if depth <= 14 else 1)
+    _store(position.id, 14, 3, mode="server")
+
+    requests = [(depth, multipv) for depth in range(1, 21) for multipv in (1, 2, 3)]
+    before = [EvalCache()._db_get(db_session, position.id, d, m) for d, m in requests]
+    stats = compact_evals(db_session, RetentionPolicy(keep_depths=1), batch_positions=1)
+
+    assert _depths(position.id) == [14, 18]
+    assert stats.rows_deleted == 3 * 3 + 1 and stats.positions == 1 and stats.batches == 1
+    assert [EvalCache()._db_get(db_session, position.id, d, m) for d, m in requests] == before
+
+
+def test_rows_written_during_compaction_survive():
+    position = get_or_create_position(db_session, START_FEN)
+    _store(position.id, 20, 1)
+    _store(position.id, 12, 1, created_at=datetime.utcnow() + timedelta(minutes=1))
+
+    assert compact_evals(db_session, RetentionPolicy()).rows_deleted == 0
+    assert _depths(position.id) == [12, 20]
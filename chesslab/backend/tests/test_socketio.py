@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import time
+
+from ..app import create_app
+from ..socketio_server import UpdateCoalescer, emit_eval_update, socketio
+
+
+def test_updates_reach_only_subscribed_rooms():
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "SOCKETIO_MESSAGE_QUEUE": ""})
+    node_client = socketio.test_client(app)
+    line_client = socketio.test_client(app)
+    other_client = socketio.test_client(app)
+    node_client.emit("subscribe", {"node_id": 5})
+    line_client.emit("subscribe", {"line_id": 2})
+    other_client.emit("subscribe", {"node_id": 6})
+
+    emit_eval_update(5, [{"multipv": 1}], line_id=2)
+
+    assert [msg["args"][0]["node_id"] for msg in node_client.get_received()] == [5]
+    assert [msg["args"][0]["node_id"] for msg in line_client.get_received()] == [5]
+    assert other_client.get_received() == []
+
+    node_client.emit("unsubscribe", {"node_id": 5})
+    emit_eval_update(5, [], line_id=None)
+    assert node_client.get_received() == []
+
+
+def test_coalescer_sends_latest_update_per_node_once_per_window():
+    sent = []
+    coalescer = UpdateCoalescer(lambda node_id, payload: sent.append((node_id, payload)), window=0.05)
+    for depth in range(1, 6):
+        coalescer.submit(1, depth)
+    coalescer.submit(2, 1)
+    coalescer.submit(3, 1)
+    coalescer.discard(3)
+    time.sleep(0.2)
+    assert sorted(sent) == [(1, 5), (2, 1)]
+
+
+def test_posted_evals_reach_the_line_room():
+    app = create_app(
+        {"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "SOCKETIO_MESSAGE_QUEUE": "", "RESPONSE_CACHE_REDIS": False}
+    )
+    client = app.test_client()
+    opening = client.post("/api/openings", json={"name": "Dutch"}).get_json()
+    line_id = client.get(f"/api/openings/{opening['id']}/lines").get_json()[0]["id"]
+    node_id = client.post(f"/api/lines/{line_id}/nodes", json={"san": "d4"}).get_json()["id"]
+    line_client = socketio.test_client(app)
+    line_client.emit("subscribe", {"line_id": line_id})
+
+    client.post("/api/eval", json={"node_id": node_id, "evals": [{"depth": 10, "multipv": 1, "score_cp": 5}]})
+
+    assert [msg["args"][0]["node_id"] for msg in line_client.get_received()] == [node_id]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from ..app import create_app
+from ..db import db_session
+from ..models import Eval, Opening
+from ..pgn_import import import_games
+
+
+@pytest.fixture
+def client():
+    app = create_app(
+        {"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "SOCKETIO_MESSAGE_QUEUE": "", "RESPONSE_CACHE_REDIS": False}
+    )
+    return app.test_client()
+
+
+def test_snapshot_then_delta(client):
+    opening = client.post("/api/openings", json={"name": "Italian"}).get_json()
+    line_id = client.get(f"/api/openings/{opening['id']}/lines").get_json()[0]["id"]
+    e4 = client.post(f"/api/lines/{line_id}/nodes", json={"san": "e4"}).get_json()
+
+    snapshot = client.get("/api/repertoire").get_json()
+    assert snapshot["openings"]["name"] == ["Italian"]
+    assert snapshot["lines"]["id"] == [line_id]
+    assert snapshot["nodes"]["san"] == ["e4"]
+    version = snapshot["version"]
+
+    unchanged = client.get(f"/api/repertoire/changes?since={version}").get_json()
+    assert unchanged["version"] == version and unchanged["nodes"]["id"] == []
+
+    client.post(f"/api/lines/{line_id}/nodes", json={"parent_id": e4["id"], "san": "e5"})
+    import_games(db_session, io.StringIO("1. e4 e5 2. Nf3 *\n"), line_id)
+
+    delta = client.get(f"/api/repertoire/changes?since={version}").get_json()
+    assert delta["reset"] is False and delta["version"] > version
+    assert delta["openings"]["id"] == [] and delta["lines"]["id"] == []
+    assert delta["nodes"]["san"] == ["e5", "Nf3"]
+
+    stale = client.get(f"/api/repertoire/changes?since={delta['version'] + 10}").get_json()
+    assert stale["reset"] is True and stale["nodes"]["san"] == ["e4", "e5", "Nf3"]
+
+
+def test_only_repertoire_flushes_take_the_version_counter():
+    from sqlalchemy import event
+
+    from ..db import ReadSession
+    from ..positions import get_or_create_position
+    from ..sync import _stamp_versions, current_version
+
+    before = current_version(db_session)
+    position = get_or_create_position(db_session, "8/8/8/8/8/8/8/K5k1 b - - 0 1")
+    db_session.add(Eval(position_id=position.id, depth=10, multipv=1, score_cp=0))
+    db_session.flush()
+    assert "repertoire_version" not in db_session.info
+    assert current_version(db_session) == before
+
+    db_session.add(Opening(name="Stamped", side="white"))
+    db_session.flush()
+    assert current_version(db_session) == before + 1
+    assert not event.contains(ReadSession, "before_flush", _stamp_versions)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+from ..db import db_session
+from ..models import Line, Node
+from ..tree import assign_path, backfill_paths, path_ids, subtree_range
+
+
+def _add(line, parent, san, ply):
+    node = Node(line_id=line.id, parent_id=parent.id if parent else None, san=san, ply=ply, fen=san)
+    db_session.add(node)
+    assign_path(db_session, node, parent)
+    return node
+
+
+def test_subtree_range_and_ancestors():
+    line = Line(opening_id=1, title="Tree", is_main=True)
+    db_session.add(line)
+    db_session.flush()
+
+    e4 = _add(line, None, "e4", 1)
+    c5 = _add(line, e4, "c5", 2)
+    nf3 = _add(line, c5, "Nf3", 3)
+    e5 = _add(line, e4, "e5", 2)
+    d4 = _add(line, None, "d4", 1)
+    # Enough nodes for two-digit IDs that share a textual prefix with e4 and c5.
+    for idx in range(10):
+        _add(line, d4, f"m{idx}", 2)
+    db_session.flush()
+
+    assert path_ids(nf3.path) == [e4.id, c5.id, nf3.id]
+
+    low, high = subtree_range(e4.path)
+    subtree = db_session.query(Node).filter(Node.path >= low, Node.path < high).order_by(Node.path).all()
+    assert [node.san for node in subtree] == ["e4", "c5", "Nf3", "e5"]
+
+    low, high = subtree_range(c5.path)
+    assert db_session.query(Node).filter(Node.path >= low, Node.path < high).count() == 2
+
+
+def test_subtree_range_relies_on_byte_order():
+    low, high = subtree_range("/1/5/")
+    inside = ["/1/5/", "/1/5/9/", "/1/5/12/40/"]
+    outside = ["/1/50/", "/1/6/", "/1/", "/10/5/"]
+    assert all(low <= path < high for path in inside)
+    assert not any(low <= path < high for path in outside)
+    # Locale collations ignore '/' and would interleave "/1/5/..." with "/1/50/...".
+    assert sorted(["/1/50/", "/1/5/9/", "/1/5/"]) == ["/1/5/", "/1/5/9/", "/1/50/"]
+
+    pg_ddl = str(CreateTable(Node.__table__).compile(dialect=postgresql.dialect()))
+    assert 'path VARCHAR(1024) COLLATE "C"' in pg_ddl
+    assert "COLLATE" not in str(CreateTable(Node.__table__).compile(dialect=sqlite.dialect()))
+
+
+def test_backfill_paths_for_legacy_nodes():
+    line = Line(opening_id=1, title="Legacy", is_main=True)
+    db_session.add(line)
+    db_session.flush()
+    root = Node(line_id=line.id, parent_id=None, san="e4", ply=1, fen="x")
+    db_session.add(root)
+    db_session.flush()
+    child = Node(line_id=line.id, parent_id=root.id, san="e5", ply=2, fen="y")
+    db_session.add(child)
+    db_session.flush()
+
+    backfill_paths(db_session, line.id)
+    assert child.path == f"/{root.id}/{child.id}/"
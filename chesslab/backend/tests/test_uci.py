@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import sys
+import threading
+from queue import Queue
+
+from ..engine.parser import parse_bestmove, parse_info
+from ..engine.uci import UCIEngine
+
+
+TRANSCRIPT = [
+    b"info depth 1 seldepth 1 multipv 1 score cp 30 nodes 20 nps 20000 time 1 pv e2e4",
+    b"info depth 1 seldepth 1 multipv 2 score cp 20 nodes 40 nps 20000 time 2 pv d2d4",
+    b"info depth 2 seldepth 2 multipv 1 score cp 41 lowerbound nodes 70 nps 20000 time 3 pv e2e4",
+    b"info depth 2 seldepth 2 multipv 1 score cp 35 nodes 80 nps 20000 time 4 pv e2e4 e7e5",
+    b"info depth 2 seldepth 2 multipv 2 score mate 3 nodes 90 nps 20000 time 4 pv d2d4 d7d5",
+    b"bestmove e2e4 ponder e7e5",
+]
+
+
+class ScriptedEngine(UCIEngine):
+    """UCIEngine fed from a canned transcript instead of a subprocess."""
+
+    def __init__(self, lines):
+        self.sent = []
+        self.stdout_queue = Queue()
+        self._lines = list(lines)
+
+    def _send(self, command):
+        self.sent.append(command)
+        if command.startswith("go"):
+            for line in self._lines:
+                self.stdout_queue.put(line)
+        elif command == "stop" and not self._lines:
+            self.stdout_queue.put(b"bestmove e2e4")
+
+
+def test_stream_yields_per_depth_snapshots():
+    engine = ScriptedEngine(TRANSCRIPT)
+    snapshots = list(engine.analyse_stream("startpos", depth=2, multipv=2))
+
+    assert [[entry["depth"] for entry in snap] for snap in snapshots] == [[1, 1], [2, 2]]
+    assert snapshots[-1][0]["score_cp"] == 35
+    assert snapshots[-1][1]["score_mate"] == 3
+    assert engine.analyse("startpos", depth=2, multipv=2) == snapshots[-1]
+
+
+def test_stop_event_sends_stop():
+    engine = ScriptedEngine([])
+    stop_event = threading.Event()
+    stop_event.set()
+
+    assert list(engine.analyse_stream("startpos", depth=30, multipv=1, stop_event=stop_event)) == []
+    assert engine.sent[-1] == "stop"
+
+
+def test_parse_info_single_pass_fields():
+    info = parse_info(
+        b"info depth 24 seldepth 31 multipv 2 score cp -18 upperbound nodes 1200 nps 900 hashfull 12 time 1333 pv g1f3 d7d5 c2c4"
+    )
+    assert info == {
+        "depth": 24,
+        "multipv": 2,
+        "score_cp": -18,
+        "bound": "upper",
+        "nodes": 1200,
+        "nps": 900,
+        "time": 1333,
+        "pv_uci": "g1f3 d7d5 c2c4",
+        "bestmove_uci": "g1f3",
+    }
+
+
+def test_parse_info_skips_lines_without_pv():
+    assert parse_info(b"info depth 24 currmove e2e4 currmovenumber 1") is None
+    assert parse_info(b"info depth 24 seldepth 30 multipv 3 hashfull 120") is None
+    assert parse_info(b"info string NNUE evaluation using nn-xyz.nnue") is None
+    assert parse_bestmove(b"bestmove e2e4 ponder e7e5") == "e2e4"
+    assert parse_bestmove(b"readyok") is None
+
+
+def _iterations(moves_and_scores):
+    lines = [
+        f"info depth {depth} multipv 1 score cp {score} nodes {depth * 100} pv {move}".encode()
+        for depth, (move, score) in enumerate(moves_and_scores, start=1)
+    ]
+    return lines + [b"bestmove " + moves_and_scores[-1][0].encode()]
+
+
+def test_monitor_stops_search_once_best_line_settles():
+    from ..engine.adaptive import StabilityMonitor
+
+    settled = [("d2d4", 40), ("e2e4", 30), ("e2e4", 35), ("e2e4", 28), ("e2e4", 31), ("e2e4", 30)]
+    engine = ScriptedEngine(_iterations(settled))
+    monitor = StabilityMonitor(window_cp=10, iterations=3, min_depth=4)
+    list(engine.analyse_stream("startpos", depth=6, multipv=1, monitor=monitor))
+
+    assert monitor.stopped_at == 4
+    assert engine.sent.count("stop") == 1
+
+    volatile = [("e2e4", 30), ("d2d4", 32), ("e2e4", 80), ("e2e4", 20), ("c2c4", 25), ("c2c4", 60)]
+    engine = ScriptedEngine(_iterations(volatile))
+    monitor = StabilityMonitor(window_cp=10, iterations=3, min_depth=4)
+    list(engine.analyse_stream("startpos", depth=6, multipv=1, monitor=monitor))
+
+    assert not monitor.stable
+    assert "stop" not in engine.sent
+
+
+SILENT_ENGINE = """\
+import sys, time
+
+for command in sys.stdin:
+    command = command.strip()
+    if command == "uci":
+        print("uciok", flush=True)
+    elif command.startswith("go"):
+        # Only progress lines until well past the search timeout, as in a long MultiPV iteration.
+        for number in range(12):
+            print(f"info depth 20 currmove e2e4 currmovenumber {number + 1} nodes {number * 1000}", flush=True)
+            time.sleep(0.05)
+        print("info depth 20 multipv 1 score cp 15 nodes 20000 pv e2e4", flush=True)
+        print("bestmove e2e4", flush=True)
+    elif command == "quit":
+        break
+"""
+
+
+def test_progress_lines_keep_a_long_iteration_alive(tmp_path):
+    script = tmp_path / "silent_engine"
+    script.write_text(f"#!{sys.executable}\n{SILENT_ENGINE}")
+    script.chmod(0o755)
+    engine = UCIEngine(str(script))
+    engine.search_timeout = 0.3
+    try:
+        results = engine.analyse("startpos", depth=20, multipv=1)
+    finally:
+        engine.close()
+    assert results[0]["score_cp"] == 15
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from ..analysis_queue import PRIORITY_WEIGHTS, QUEUE_NAMES
+from ..models import Eval, EvalSummary, Line, Node
+from ..db import db_session
+from ..positions import get_or_create_position
+from ..worker import WeightedRoundRobin, perform_analysis, perform_batch_analysis, perform_eval_compaction
+
+
+class SocketRecorder:
+    def __init__(self):
+        self.messages = []
+
+    def __call__(self, node_id, payload, line_id=None):
+        self.messages.append((node_id, payload))
+
+
+class FakeEngine:
+    def __init__(self, delays=()):
+        self.calls = []
+        self.delays = list(delays)
+
+    def analyse_stream(self, fen, *, depth, multipv, new_game=True, stop_event=None, monitor=None):
+        self.calls.append((fen, new_game))
+        delay = self.delays[len(self.calls) - 1] if len(self.calls) <= len(self.delays) else 0.0
+        if stop_event is not None and stop_event.wait(delay):
+            return
+        yield [{"multipv": 1, "pv_uci": "a1b1", "score_cp": len(self.calls), "bestmove_uci": "a1b1"}]
+
+
+def test_batch_analysis_walks_tree_on_warm_engine(monkeypatch):
+    line = Line(opening_id=1, title="Batch", is_main=True)
+    db_session.add(line)
+    db_session.flush()
+    root = Node(line_id=line.id, parent_id=None, san="e4", ply=1, fen="fen-root w - - 0 1")
+    db_session.add(root)
+    db_session.flush()
+    side = Node(line_id=line.id, parent_id=root.id, san="c5", ply=2, fen="fen-side b - - 0 1")
+    main = Node(line_id=line.id, parent_id=root.id, san="e5", ply=2, fen="fen-main b - - 0 1")
+    db_session.add_all([side, main])
+    db_session.flush()
+    leaf = Node(line_id=line.id, parent_id=side.id, san="Nf3", ply=3, fen="fen-leaf w - - 0 2")
+    db_session.add(leaf)
+    db_session.flush()
+
+    engine = FakeEngine()
+
+    @contextmanager
+    def fake_session():
+        yield engine
+
+    progress = []
+    monkeypatch.setattr("chesslab.backend.engine.pool.engine_session", fake_session)
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_update", SocketRecorder())
+    monkeypatch.setattr(
+        "chesslab.backend.worker.emit_analysis_progress", lambda batch_id, **kw: progress.append(kw["done"])
+    )
+
+    summary = perform_batch_analysis(line_id=line.id, depth=12, multipv=1)
+
+    assert [fen for fen, _ in engine.calls] == [root.fen, side.fen, leaf.fen, main.fen]
+    assert [new_game for _, new_game in engine.calls] == [True, False, False, False]
+    assert summary["analysed"] == 4
+    assert progress == [0, 1, 2, 3, 4]
+
+
+def test_batch_yields_to_interactive_work_and_requeues(monkeypatch):
+    line = Line(opening_id=1, title="Preempted", is_main=True)
+    db_session.add(line)
+    db_session.flush()
+    first = Node(line_id=line.id, parent_id=None, san="e4", ply=1, fen="fen-a w - - 0 1")
+    db_session.add(first)
+    db_session.flush()
+    second = Node(line_id=line.id, parent_id=first.id, san="e5", ply=2, fen="fen-b b - - 0 1")
+    db_session.add(second)
+    db_session.flush()
+
+    # The second search runs long enough for the preemption watcher to interrupt it.
+    engine = FakeEngine(delays=[0.0, 2.0])
+
+    @contextmanager
+    def fake_session():
+        yield engine
+
+    requeued = []
+    job = SimpleNamespace(id="batch-line-1-12-1", connection=None)
+    monkeypatch.setattr("chesslab.backend.engine.pool.engine_session", fake_session)
+    monkeypatch.setattr("chesslab.backend.worker.get_current_job", lambda: job)
+    monkeypatch.setattr("chesslab.backend.worker.CANCEL_POLL_INTERVAL", 0.01)
+    # An interactive request arrives while the second node is being searched.
+    monkeypatch.setattr("chesslab.backend.worker.interactive_waiting", lambda redis: len(engine.calls) >= 2)
+    monkeypatch.setattr("chesslab.backend.worker.requeue_batch", lambda job: requeued.append(job) or "next")
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_update", SocketRecorder())
+    monkeypatch.setattr("chesslab.backend.worker.emit_analysis_progress", lambda batch_id, **kw: None)
+    summary = perform_batch_analysis(line_id=line.id, depth=12, multipv=1, batch_id="batch-line-1-12-1")
+
+    assert summary["preempted"] is True and summary["resumed_as"] == "next"
+    assert summary["analysed"] == 1
+    assert requeued == [job]
+    assert db_session.query(Eval).count() == 1
+
+
+def test_weighted_round_robin_shares_slots_by_priority():
+    names = [QUEUE_NAMES[name] for name in ("interactive", "prefetch", "bulk")]
+    schedule = WeightedRoundRobin(names, {QUEUE_NAMES[key]: value for key, value in PRIORITY_WEIGHTS.items()})
+    order = names
+    picks = []
+    for _ in range(10):
+        # Every queue is backed up, so the first queue in order supplies the next job.
+        picks.append(order[0])
+        order = schedule.order(order[0])
+    assert [picks.count(name) for name in names] == [6, 3, 1]
+    assert picks[:3] == [names[0], names[1], names[0]]
+
+
+def test_compaction_job_backfills_eval_summaries(monkeypatch):
+    position = get_or_create_position(db_session, "8/8/8/8/8/8/8/K4k2 w - - 0 1")
+    # Written directly, as evals stored before summaries existed were.
+    db_session.add(Eval(position_id=position.id, depth=16, multipv=1, score_cp=12, engine_mode="server"))
+    db_session.commit()
+    monkeypatch.setattr("chesslab.backend.worker.maintain", lambda engine, vacuum: None)
+
+    assert "summaries_rebuilt" not in perform_eval_compaction(vacuum=False)
+    assert db_session.get(EvalSummary, position.id) is None
+    stats = perform_eval_compaction(vacuum=False, summaries=True)
+    assert stats["summaries_rebuilt"] >= 1
+    assert db_session.get(EvalSummary, position.id).score_cp == 12
+
+
+def test_coalesced_waiters_are_notified_in_their_own_lines(monkeypatch):
+    lines = [Line(opening_id=1, title=title, is_main=True) for title in ("Requester", "Waiter")]
+    db_session.add_all(lines)
+    db_session.flush()
+    fen = "8/8/8/8/8/8/8/K3k3 w - - 0 1"
+    requester, waiter = (Node(line_id=line.id, parent_id=None, san="Kb1", ply=1, fen=fen) for line in lines)
+    db_session.add_all([requester, waiter])
+    db_session.flush()
+
+    sent = []
+    monkeypatch.setattr("chesslab.backend.worker.get_current_job", lambda: SimpleNamespace(id="job", connection=None))
+    monkeypatch.setattr("chesslab.backend.worker.is_cancelled", lambda redis, job_id: False)
+    monkeypatch.setattr("chesslab.backend.worker.waiters", lambda redis, job_id: {waiter.id})
+    monkeypatch.setattr("chesslab.backend.worker.release", lambda redis, job_id: {waiter.id})
+    monkeypatch.setattr("chesslab.backend.worker.emit_eval_partial", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        "chesslab.backend.worker.emit_eval_update",
+        lambda node_id, payload, line_id=None: sent.append((node_id, line_id)),
+    )
+    monkeypatch.setattr(
+        "chesslab.backend.engine.pool.analyse_stream",
+        lambda fen, **kw: iter([[{"multipv": 1, "pv_uci": "a1b1", "score_cp": 0, "bestmove_uci": "a1b1"}]]),
+    )
+
+    perform_analysis(requester.id, fen, depth=12, multipv=1)
+
+    assert sorted(sent) == sorted([(requester.id, lines[0].id), (waiter.id, lines[1].id)])
+
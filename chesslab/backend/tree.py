@@ -0,0 +1,48 @@
+"""Materialized-path helpers for the node tree.
+
+Every node stores ``path``: the slash-separated IDs from its root down to and
+including itself (``"/1/5/12/"``).  Ancestors are the IDs in the path, and a
+subtree is the contiguous index range of paths sharing a prefix, so neither
+needs a recursive walk.
+"""
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+from .models import Node
+
+
+def child_path(parent: Node | None, node_id: int) -> str:
+    return f"{parent.path if parent is not None else '/'}{node_id}/"
+
+
+def path_ids(path: str) -> list[int]:
+    return [int(part) for part in path.strip("/").split("/") if part]
+
+
+def subtree_range(path: str) -> tuple[str, str]:
+    """Half-open ``[low, high)`` range covering ``path`` and all its descendants.
+
+    ``'0'`` sorts directly after ``'/'`` in byte order, so ``"/1/5/"`` up to
+    (not including) ``"/1/50"`` spans exactly the paths beneath node 5.  The
+    comparison must therefore use a byte-order collation, which ``Node.path``
+    declares.
+    """
+    return path, path[:-1] + "0"
+
+
+def assign_path(session: Session, node: Node, parent: Node | None) -> None:
+    """Give a freshly added node its path; flushes to obtain the node's ID."""
+    if node.id is None:
+        session.flush()
+    node.path = child_path(parent, node.id)
+
+
+def backfill_paths(session: Session, line_id: int) -> None:
+    """Fill ``path`` for nodes of a line created before paths were stored."""
+    nodes = session.query(Node).filter(Node.line_id == line_id).order_by(Node.ply, Node.id).all()
+    by_id = {node.id: node for node in nodes}
+    for node in nodes:
+        if node.path is None:
+            node.path = child_path(by_id.get(node.parent_id), node.id)
+    session.flush()
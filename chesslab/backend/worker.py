@@ -2,66 +2,362 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
 
-from rq import Worker, Queue, Connection
+from rq import Worker, Queue, Connection, get_current_job
 from redis import Redis
 
-from .db import db_session
-from .socketio_server import emit_eval_update
-from .models import Eval
+from .analysis_queue import (
+    IMPORT_QUEUE_NAME,
+    MAINTENANCE_QUEUE_NAME,
+    PRIORITIES,
+    PRIORITY_WEIGHTS,
+    QUEUE_NAMES,
+    interactive_waiting,
+    is_cancelled,
+    release,
+    requeue_batch,
+    waiters,
+)
+from .db import db_session, get_engine, init_engine
+from .eval_cache import eval_cache
+from .eval_store import eval_row, rebuild_summaries, upsert_evals
+from . import metrics
+from .metrics import JOB_SECONDS, registry
+from .pgn_import import ImportStats, import_games
+from .retention import RetentionPolicy, compact_evals, maintain
+from .response_cache import line_scope, position_scope, response_cache
+from .socketio_server import (
+    configure_emitter,
+    emit_analysis_progress,
+    emit_eval_partial,
+    emit_eval_update,
+    emit_import_progress,
+)
+from .models import Eval, Line, Node
+from .positions import get_or_create_position, line_ids_at_position, position_for_node
+from .sync import install_version_stamping
 from .engine import pool
+from .engine.adaptive import make_monitor
 
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STREAM_EMIT_INTERVAL = float(os.getenv("ANALYSIS_STREAM_INTERVAL", "0.25"))
+CANCEL_POLL_INTERVAL = 0.25
 
 
+@JOB_SECONDS.time(kind="analysis")
 def perform_analysis(node_id: int, fen: str, depth: int, multipv: int, engine_mode: str = "server") -> list[dict]:
-    results = pool.analyse(fen, depth=depth, multipv=multipv)
-
-    eval_entries = []
-    for result in results:
-        eval_entry = (
-            db_session.query(Eval)
-            .filter(
-                Eval.node_id == node_id,
-                Eval.depth == depth,
-                Eval.multipv == result.get("multipv", 1),
-                Eval.engine_mode == engine_mode,
-            )
-            .one_or_none()
-        )
-        if not eval_entry:
-            eval_entry = Eval(
-                node_id=node_id,
-                depth=depth,
-                multipv=result.get("multipv", 1),
-                engine_mode=engine_mode,
-            )
-            db_session.add(eval_entry)
-        eval_entry.pv_uci = result.get("pv_uci")
-        eval_entry.score_cp = result.get("score_cp")
-        eval_entry.bestmove_uci = result.get("bestmove_uci")
-        eval_entries.append(eval_entry)
+    node = db_session.get(Node, node_id)
+    position = position_for_node(db_session, node) if node else get_or_create_position(db_session, fen)
+    line_id = node.line_id if node else None
+
+    # Transpositions share a position, and a deeper stored search answers a shallower
+    # request, so another line may already have paid for this one.
+    existing = eval_cache.lookup(db_session, position.id, depth, multipv)
+    if len(existing) >= multipv:
+        db_session.commit()
+        payload = [{key: row[key] for key in _RESULT_FIELDS} for row in existing]
+        _notify(node_id, payload, line_id)
+        return payload
+
+    job = get_current_job()
+    stop_event = threading.Event()
+    done = threading.Event()
+    if job is not None:
+        cancelled = lambda: is_cancelled(job.connection, job.id)  # noqa: E731
+        threading.Thread(target=_watch, args=(cancelled, stop_event, done), daemon=True).start()
+
+    results: list[dict] = []
+    last_emit = 0.0
+    try:
+        monitor = make_monitor()
+        for results in pool.analyse_stream(fen, depth=depth, multipv=multipv, stop_event=stop_event, monitor=monitor):
+            now = time.monotonic()
+            if now - last_emit >= STREAM_EMIT_INTERVAL:
+                last_emit = now
+                _notify_partial(node_id, job, results, line_id)
+    finally:
+        done.set()
+
+    if stop_event.is_set():
+        # Cancelled searches stop short of the requested depth, so nothing is stored.
+        db_session.commit()
+        if job is not None:
+            release(job.connection, job.id)
+        return []
+
+    eval_entries = _store_results(position.id, depth, results, engine_mode)
     db_session.commit()
+    eval_cache.invalidate(position.id)
+    response_cache.bump(
+        position_scope(position.id),
+        *(line_scope(line_id) for line_id in line_ids_at_position(db_session, position.id)),
+    )
 
-    payload = [
-        {
-            "multipv": ev.multipv,
-            "depth": ev.depth,
-            "pv_uci": ev.pv_uci,
-            "score_cp": ev.score_cp,
-            "bestmove_uci": ev.bestmove_uci,
-        }
-        for ev in eval_entries
-    ]
-    emit_eval_update(node_id, payload)
+    payload = [_serialize_result(ev) for ev in eval_entries]
+    _notify(node_id, payload, line_id)
     return payload
 
 
+def _watch(check, stop_event: threading.Event, done: threading.Event) -> None:
+    """Poll ``check`` until the search is done, setting ``stop_event`` once it is true."""
+    while not done.wait(CANCEL_POLL_INTERVAL):
+        if check():
+            stop_event.set()
+            return
+
+
+def _notify_partial(node_id: int, job, results: list[dict], line_id: int | None = None) -> None:
+    node_ids = {node_id}
+    if job is not None:
+        node_ids |= waiters(job.connection, job.id)
+    payload = [{field: entry.get(field) for field in _RESULT_FIELDS} for entry in results]
+    for waiting_id, waiting_line in _line_ids(node_ids, node_id, line_id).items():
+        emit_eval_partial(waiting_id, payload, line_id=waiting_line)
+
+
+def _notify(node_id: int, payload: list[dict], line_id: int | None = None) -> None:
+    """Emit to the requesting node and every node that attached to this job."""
+    node_ids = {node_id}
+    job = get_current_job()
+    if job is not None:
+        node_ids |= release(job.connection, job.id)
+    for waiting_id, waiting_line in _line_ids(node_ids, node_id, line_id).items():
+        emit_eval_update(waiting_id, payload, line_id=waiting_line)
+
+
+def _line_ids(node_ids: set[int], node_id: int, line_id: int | None) -> dict[int, int | None]:
+    """Map each node to its own line, so coalesced waiters reach their line rooms too."""
+    lines: dict[int, int | None] = {waiting_id: None for waiting_id in sorted(node_ids)}
+    lines[node_id] = line_id
+    others = [waiting_id for waiting_id in node_ids if waiting_id != node_id]
+    if others:
+        lines.update(db_session.query(Node.id, Node.line_id).filter(Node.id.in_(others)).all())
+    return lines
+
+
+@JOB_SECONDS.time(kind="batch")
+def perform_batch_analysis(
+    *,
+    line_id: int | None = None,
+    opening_id: int | None = None,
+    depth: int,
+    multipv: int,
+    engine_mode: str = "server",
+    batch_id: str | None = None,
+) -> dict:
+    """Analyse every node of a line or opening on one warm engine.
+
+    Nodes are visited in tree order so each search follows its parent
+    position, and the engine hash is only reset once for the whole batch.
+    Results are committed per node so progress survives a failed job.
+
+    Batches are bulk work: when an interactive job is waiting and no other
+    worker is idle to take it, the running search is stopped, the batch is
+    re-enqueued to resume from the nodes not yet stored, and the worker is
+    freed.
+    """
+    query = db_session.query(Node)
+    if line_id is not None:
+        query = query.filter(Node.line_id == line_id)
+    elif opening_id is not None:
+        query = query.join(Line).filter(Line.opening_id == opening_id)
+    else:
+        raise ValueError("line_id or opening_id required")
+    nodes = tree_order(query.order_by(Node.line_id, Node.ply, Node.id).all())
+
+    job = get_current_job()
+    batch_id = batch_id or (job.id if job is not None else f"batch-{line_id or opening_id}")
+    total = len(nodes)
+    analysed = skipped = settled = 0
+    emit_analysis_progress(batch_id, done=0, total=total)
+
+    preempt = threading.Event()
+    finished = threading.Event()
+    if job is not None:
+        waiting = lambda: interactive_waiting(job.connection)  # noqa: E731
+        threading.Thread(target=_watch, args=(waiting, preempt, finished), daemon=True).start()
+
+    try:
+        with pool.engine_session() as engine:
+            new_game = True
+            for done, node in enumerate(nodes, start=1):
+                position = position_for_node(db_session, node)
+                existing = eval_cache.lookup(db_session, position.id, depth, multipv)
+                if len(existing) >= multipv:
+                    db_session.commit()
+                    skipped += 1
+                    emit_analysis_progress(batch_id, done=done, total=total, node_id=node.id)
+                    continue
+                results: list[dict] = []
+                monitor = make_monitor()
+                if not preempt.is_set():
+                    for results in engine.analyse_stream(
+                        node.fen, depth=depth, multipv=multipv, new_game=new_game, stop_event=preempt, monitor=monitor
+                    ):
+                        pass
+                if preempt.is_set():
+                    # The interrupted search is incomplete; the continuation redoes this node.
+                    db_session.commit()
+                    resumed_as = requeue_batch(job)
+                    return {
+                        "batch_id": batch_id,
+                        "total": total,
+                        "analysed": analysed,
+                        "skipped": skipped,
+                        "settled_early": settled,
+                        "preempted": True,
+                        "resumed_as": resumed_as,
+                    }
+                new_game = False
+                if monitor is not None and monitor.stable:
+                    settled += 1
+                eval_entries = _store_results(position.id, depth, results, engine_mode)
+                db_session.commit()
+                eval_cache.invalidate(position.id)
+                response_cache.bump(
+                    position_scope(position.id),
+                    *(line_scope(line_id) for line_id in line_ids_at_position(db_session, position.id)),
+                )
+                emit_eval_update(node.id, [_serialize_result(ev) for ev in eval_entries], line_id=node.line_id)
+                analysed += 1
+                emit_analysis_progress(batch_id, done=done, total=total, node_id=node.id)
+    finally:
+        finished.set()
+
+    return {"batch_id": batch_id, "total": total, "analysed": analysed, "skipped": skipped, "settled_early": settled}
+
+
+@JOB_SECONDS.time(kind="import")
+def perform_pgn_import(path: str, line_id: int) -> dict:
+    """Import an uploaded PGN file game by game, then delete the spooled file."""
+    job = get_current_job()
+    job_id = job.id if job is not None else f"import-{line_id}"
+
+    def progress(stats: ImportStats) -> None:
+        # Progress is reported after each committed batch of games.
+        response_cache.bump(line_scope(line_id))
+        emit_import_progress(job_id, line_id=line_id, games=stats.games, nodes_created=stats.nodes_created)
+
+    try:
+        with open(path, encoding="utf-8", errors="replace") as stream:
+            stats = import_games(db_session, stream, line_id, progress=progress)
+    finally:
+        os.remove(path)
+    response_cache.bump(line_scope(line_id))
+    return {
+        "line_id": line_id,
+        "games": stats.games,
+        "nodes_created": stats.nodes_created,
+        "ply_count": stats.max_ply,
+        "skipped": stats.skipped,
+    }
+
+
+@JOB_SECONDS.time(kind="compaction")
+def perform_eval_compaction(keep_depths: int | None = None, vacuum: bool = True, summaries: bool = False) -> dict:
+    """Delete superseded eval rows batch by batch, then vacuum and analyze.
+
+    With ``summaries``, eval summaries are first rebuilt from the stored evals,
+    which backfills positions evaluated before summaries existed.
+    """
+    rebuilt = {}
+    if summaries:
+        rebuilt["summaries_rebuilt"] = rebuild_summaries(db_session)
+        db_session.commit()
+        response_cache.bump(*(line_scope(line_id) for (line_id,) in db_session.query(Line.id)))
+    policy = RetentionPolicy(keep_depths=keep_depths) if keep_depths else RetentionPolicy.from_env()
+    stats = compact_evals(db_session, policy)
+    maintain(get_engine(), vacuum=vacuum)
+    return {**stats.as_dict(), **rebuilt}
+
+
+def tree_order(nodes: list[Node]) -> list[Node]:
+    """Depth-first order so every node directly follows its parent's subtree path."""
+    children: dict[int | None, list[Node]] = {}
+    ids = {node.id for node in nodes}
+    for node in nodes:
+        parent_id = node.parent_id if node.parent_id in ids else None
+        children.setdefault(parent_id, []).append(node)
+    ordered: list[Node] = []
+    stack = list(reversed(children.get(None, [])))
+    while stack:
+        node = stack.pop()
+        ordered.append(node)
+        stack.extend(reversed(children.get(node.id, [])))
+    return ordered
+
+
+def _store_results(position_id: int, depth: int, results: list[dict], engine_mode: str) -> list[Eval]:
+    """Store a finished search at the depth it reached, recording the ``depth`` it was asked for.
+
+    Adaptive searches stop once settled, possibly well short of ``depth``;
+    ``requested_depth`` lets them still answer requests up to it.
+    """
+    reached = min((result.get("depth", depth) for result in results), default=depth)
+    rows = [eval_row(position_id, reached, engine_mode, result, requested_depth=depth) for result in results]
+    return upsert_evals(db_session, rows)
+
+
+_RESULT_FIELDS = ("multipv", "depth", "pv_uci", "score_cp", "score_mate", "bestmove_uci")
+
+
+def _serialize_result(ev: Eval) -> dict:
+    return {field: getattr(ev, field) for field in _RESULT_FIELDS}
+
+
+class WeightedRoundRobin:
+    """Smooth weighted round-robin over queue names.
+
+    After every job each queue earns its weight in credit and the queue the
+    job came from pays the total.  With every queue backed up, interactive,
+    prefetch and bulk work therefore run in a 6:3:1 ratio, and an empty
+    high-priority queue never blocks the ones after it.
+    """
+
+    def __init__(self, names: list[str], weights: dict[str, int]) -> None:
+        self.names = list(names)
+        self.weights = {name: weights.get(name, 1) for name in self.names}
+        self.credit = {name: 0 for name in self.names}
+
+    def order(self, picked: str) -> list[str]:
+        """Record a job taken from ``picked``; return the order to poll queues next."""
+        total = sum(self.weights.values())
+        for name in self.names:
+            self.credit[name] += self.weights[name]
+        self.credit[picked] -= total
+        # Ties keep the configured order, which lists higher priorities first.
+        return sorted(self.names, key=lambda name: -self.credit[name])
+
+
+class WeightedWorker(Worker):
+    """RQ worker that polls its queues in :class:`WeightedRoundRobin` order."""
+
+    weights = {QUEUE_NAMES[priority]: PRIORITY_WEIGHTS[priority] for priority in PRIORITIES}
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._schedule = WeightedRoundRobin([queue.name for queue in self.queues], self.weights)
+
+    def reorder_queues(self, reference_queue: Queue) -> None:
+        by_name = {queue.name: queue for queue in self.queues}
+        self._ordered_queues = [by_name[name] for name in self._schedule.order(reference_queue.name)]
+
+
 def run_worker() -> None:  # pragma: no cover - entry point
+    init_engine(os.getenv("DATABASE_URL", "sqlite:///chesslab.db"), profile=os.getenv("DB_PROFILE") or None)
+    install_version_stamping()
+    metrics.instrument_engine(get_engine())
+    eval_cache.configure(redis_url=REDIS_URL)
+    response_cache.configure(redis_url=REDIS_URL)
+    registry.configure(redis_url=REDIS_URL)
+    configure_emitter(os.getenv("SOCKETIO_MESSAGE_QUEUE", REDIS_URL))
     redis_conn = Redis.from_url(REDIS_URL)
     with Connection(redis_conn):
-        worker = Worker([Queue("analysis")])
+        queues = [Queue(QUEUE_NAMES[priority]) for priority in PRIORITIES] + [Queue(IMPORT_QUEUE_NAME), Queue(MAINTENANCE_QUEUE_NAME)]
+        worker = WeightedWorker(queues)
         worker.work()
 
 
@@ -19,13 +19,65 @@ export const fetchNodes = async (lineId: number) => {
   return data;
 };
 
-export const requestEval = async (params: { nodeId: number; depth: number; multipv: number; mode: string }) => {
+export type EvalCurvePoint = {
+  node_id: number;
+  ply: number;
+  depth: number | null;
+  score_cp: number | null;
+  score_mate: number | null;
+};
+
+export const fetchEvalCurve = async (lineId: number): Promise<EvalCurvePoint[]> => {
+  const { data } = await apiClient.get(`/lines/${lineId}/eval-curve`);
+  return data;
+};
+
+// Column-wise table: one array per field, all of the same length.
+export type Columns<T> = { [K in keyof T]: T[K][] };
+
+export type RepertoireTables<O, L, N> = {
+  version: number;
+  reset?: boolean;
+  openings: Columns<O>;
+  lines: Columns<L>;
+  nodes: Columns<N>;
+};
+
+export const rowsFromColumns = <T>(columns: Columns<T>): T[] => {
+  const keys = Object.keys(columns) as Array<keyof T>;
+  const count = keys.length ? columns[keys[0]].length : 0;
+  return Array.from({ length: count }, (_, index) => {
+    const row = {} as T;
+    keys.forEach((key) => {
+      row[key] = columns[key][index];
+    });
+    return row;
+  });
+};
+
+export const fetchRepertoire = async <O, L, N>(since: number | null): Promise<RepertoireTables<O, L, N>> => {
+  const { data } = since === null
+    ? await apiClient.get('/repertoire')
+    : await apiClient.get('/repertoire/changes', { params: { since } });
+  return data;
+};
+
+export type AnalysisPriority = 'interactive' | 'prefetch' | 'bulk';
+
+export const requestEval = async (params: {
+  nodeId: number;
+  depth: number;
+  multipv: number;
+  mode: string;
+  priority?: AnalysisPriority;
+}) => {
   const { data } = await apiClient.get('/eval', {
     params: {
       node_id: params.nodeId,
       depth: params.depth,
       multipv: params.multipv,
       mode: params.mode,
+      priority: params.priority ?? 'interactive',
     },
   });
   return data;
@@ -43,3 +95,22 @@ export const postEval = async (payload: {
   });
   return data;
 };
+
+export const startBatchAnalysis = async (params: { lineId?: number; openingId?: number; depth: number; multipv: number }) => {
+  const { data } = await apiClient.post('/analysis/batch', {
+    line_id: params.lineId,
+    opening_id: params.openingId,
+    depth: params.depth,
+    multipv: params.multipv,
+  });
+  return data;
+};
+
+export const cancelEval = async (params: { nodeId: number; depth: number; multipv: number }) => {
+  const { data } = await apiClient.post('/analysis/cancel', {
+    node_id: params.nodeId,
+    depth: params.depth,
+    multipv: params.multipv,
+  });
+  return data;
+};
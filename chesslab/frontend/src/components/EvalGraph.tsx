@@ -1,28 +1,55 @@
-import React, { useMemo } from 'react';
+import React, { useEffect, useMemo, useState } from 'react';
 import { LineChart, Line, XAxis, YAxis, Tooltip, ResponsiveContainer } from 'recharts';
 import { useChessStore } from '../store';
+import { EvalCurvePoint, fetchEvalCurve } from '../api';
+
+const SCORE_LIMIT = 500;
+
+const plotScore = (scoreCp: number | null, scoreMate: number | null) => {
+  if (scoreMate !== null && scoreMate !== undefined) {
+    return scoreMate > 0 ? SCORE_LIMIT : -SCORE_LIMIT;
+  }
+  return Math.max(-SCORE_LIMIT, Math.min(SCORE_LIMIT, scoreCp ?? 0));
+};
 
 const EvalGraph: React.FC = () => {
   const { selectedLineId, nodes, evals } = useChessStore();
+  const [curve, setCurve] = useState<EvalCurvePoint[]>([]);
+  const nodeCount = selectedLineId ? (nodes[selectedLineId] || []).length : 0;
 
-  const data = useMemo(() => {
-    if (!selectedLineId) return [];
-    return (nodes[selectedLineId] || []).map((node) => {
-      const entry = (evals[node.id] || [])[0];
-      const score = entry?.score_cp ?? 0;
-      return {
-        ply: node.ply,
-        score,
-      };
+  useEffect(() => {
+    if (!selectedLineId) {
+      setCurve([]);
+      return;
+    }
+    let cancelled = false;
+    fetchEvalCurve(selectedLineId).then((points) => {
+      if (!cancelled) setCurve(points);
     });
-  }, [selectedLineId, nodes, evals]);
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedLineId, nodeCount]);
+
+  const data = useMemo(
+    () =>
+      curve.map((point) => {
+        // Evals streamed in since the curve was fetched take precedence when at least as deep.
+        const live = (evals[point.node_id] || []).find((entry) => entry.multipv === 1);
+        if (live && (point.depth === null || live.depth >= point.depth)) {
+          return { ply: point.ply, score: plotScore(live.score_cp, live.score_mate ?? null) };
+        }
+        return { ply: point.ply, score: plotScore(point.score_cp, point.score_mate) };
+      }),
+    [curve, evals],
+  );
 
   return (
     <div className="eval-graph">
       <ResponsiveContainer width="100%" height={200}>
         <LineChart data={data}>
           <XAxis dataKey="ply" />
-          <YAxis domain={[-500, 500]} />
+          <YAxis domain={[-SCORE_LIMIT, SCORE_LIMIT]} />
           <Tooltip />
           <Line type="monotone" dataKey="score" stroke="#8884d8" dot={false} />
         </LineChart>
@@ -1,6 +1,6 @@
 import create from 'zustand';
 import { io, Socket } from 'socket.io-client';
-import { fetchOpenings, fetchLines, fetchNodes, requestEval } from './api';
+import { cancelEval, fetchLines, fetchNodes, fetchRepertoire, requestEval, rowsFromColumns } from './api';
 
 type EngineMode = 'client' | 'server' | 'auto';
 
@@ -9,6 +9,7 @@ type EvalEntry = {
   multipv: number;
   pv_uci: string | null;
   score_cp: number | null;
+  score_mate?: number | null;
   bestmove_uci: string | null;
 };
 
@@ -47,6 +48,8 @@ type ChessState = {
   depth: number;
   multipv: number;
   socket: Socket | null;
+  repertoireVersion: number | null;
+  syncRepertoire: () => Promise<void>;
   loadOpenings: () => Promise<void>;
   selectOpening: (openingId: number) => Promise<void>;
   selectLine: (lineId: number) => Promise<void>;
@@ -68,15 +71,37 @@ export const useChessStore = create<ChessState>((set, get) => ({
   depth: 12,
   multipv: 3,
   socket: null,
+  repertoireVersion: null,
+  syncRepertoire: async () => {
+    // First load fetches a snapshot; later calls only fetch rows changed since.
+    const tables = await fetchRepertoire<Opening, Line, Node>(get().repertoireVersion);
+    set((state) => {
+      const fresh = state.repertoireVersion === null || tables.reset;
+      const openings = new Map(fresh ? [] : state.openings.map((opening) => [opening.id, opening]));
+      rowsFromColumns(tables.openings).forEach((opening) => openings.set(opening.id, opening));
+      const lines: Record<number, Line[]> = fresh ? {} : { ...state.lines };
+      rowsFromColumns(tables.lines).forEach((line) => {
+        lines[line.opening_id] = [...(lines[line.opening_id] ?? []).filter((l) => l.id !== line.id), line];
+      });
+      const nodes: Record<number, Node[]> = fresh ? {} : { ...state.nodes };
+      rowsFromColumns(tables.nodes).forEach((node) => {
+        nodes[node.line_id] = [...(nodes[node.line_id] ?? []).filter((n) => n.id !== node.id), node];
+      });
+      Object.values(nodes).forEach((lineNodes) => lineNodes.sort((a, b) => a.ply - b.ply || a.id - b.id));
+      // Newest first, as /openings lists them.
+      const ordered = Array.from(openings.values()).sort((a, b) => b.id - a.id);
+      return { openings: ordered, lines, nodes, repertoireVersion: tables.version };
+    });
+  },
   loadOpenings: async () => {
-    const openings = await fetchOpenings();
-    set({ openings });
+    await get().syncRepertoire();
+    const { openings } = get();
     if (openings.length > 0) {
       await get().selectOpening(openings[0].id);
     }
   },
   selectOpening: async (openingId: number) => {
-    const openingLines = await fetchLines(openingId);
+    const openingLines = get().lines[openingId] ?? (await fetchLines(openingId));
     set((state) => ({
       selectedOpeningId: openingId,
       lines: { ...state.lines, [openingId]: openingLines },
@@ -86,7 +111,14 @@ export const useChessStore = create<ChessState>((set, get) => ({
     }
   },
   selectLine: async (lineId: number) => {
-    const lineNodes = await fetchNodes(lineId);
+    const lineNodes = get().nodes[lineId] ?? (await fetchNodes(lineId));
+    const { socket, selectedLineId } = get();
+    if (socket && selectedLineId !== lineId) {
+      if (selectedLineId !== null) {
+        socket.emit('unsubscribe', { line_id: selectedLineId });
+      }
+      socket.emit('subscribe', { line_id: lineId });
+    }
     set((state) => ({
       nodes: { ...state.nodes, [lineId]: lineNodes },
       selectedLineId: lineId,
@@ -94,6 +126,17 @@ export const useChessStore = create<ChessState>((set, get) => ({
     }));
   },
   selectNode: (nodeId: number) => {
+    const { selectedNodeId, engineMode, depth, multipv, socket } = get();
+    if (engineMode === 'server' && selectedNodeId !== null && selectedNodeId !== nodeId) {
+      // Free engine time for the node the user is actually looking at.
+      cancelEval({ nodeId: selectedNodeId, depth, multipv }).catch(() => undefined);
+    }
+    if (socket && selectedNodeId !== nodeId) {
+      if (selectedNodeId !== null) {
+        socket.emit('unsubscribe', { node_id: selectedNodeId });
+      }
+      socket.emit('subscribe', { node_id: nodeId });
+    }
     set({ selectedNodeId: nodeId });
   },
   ensureSocket: () => {
@@ -102,9 +145,21 @@ export const useChessStore = create<ChessState>((set, get) => ({
       return;
     }
     const newSocket = io('http://localhost:5000');
+    newSocket.on('connect', () => {
+      // Rooms do not survive a reconnect, so rejoin the current selection.
+      const { selectedLineId, selectedNodeId } = get();
+      newSocket.emit('subscribe', { line_id: selectedLineId, node_id: selectedNodeId });
+      // Catch up on anything written while disconnected.
+      if (get().repertoireVersion !== null) {
+        get().syncRepertoire().catch(() => undefined);
+      }
+    });
     newSocket.on('eval_update', (payload: { node_id: number; evals: EvalEntry[] }) => {
       receiveEvalUpdate(payload.node_id, payload.evals);
     });
+    newSocket.on('eval_partial', (payload: { node_id: number; evals: EvalEntry[] }) => {
+      receiveEvalUpdate(payload.node_id, payload.evals);
+    });
     set({ socket: newSocket });
   },
   receiveEvalUpdate: (nodeId: number, entries: EvalEntry[]) => {
@@ -0,0 +1,24 @@
+"""Serve the backend on eventlet green threads.
+
+``python -m chesslab.serve`` monkey-patches the standard library before the
+backend package is imported, so Socket.IO connections, engine pipes and the
+engine pool's locks all cooperate on one event loop.  An idle client then
+costs a green thread rather than an OS thread.
+"""
+import eventlet
+
+eventlet.monkey_patch()
+
+import os  # noqa: E402
+
+# Any other mode would serve on OS threads despite the monkey-patching above.
+if os.environ.setdefault("SOCKETIO_ASYNC_MODE", "eventlet") != "eventlet":
+    raise SystemExit(
+        f"chesslab.serve requires SOCKETIO_ASYNC_MODE=eventlet, not {os.environ['SOCKETIO_ASYNC_MODE']!r}; "
+        "unset it or use python -m chesslab.backend.app"
+    )
+
+from .backend.app import main  # noqa: E402
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()